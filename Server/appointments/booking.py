@@ -0,0 +1,57 @@
+from django.db import IntegrityError, transaction
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+class SlotUnavailable(APIException):
+    status_code    = status.HTTP_409_CONFLICT
+    default_detail = "Khung giờ này đã có người đặt, vui lòng chọn giờ khác."
+    default_code   = 'slot_unavailable'
+
+
+def save_appointment(serializer, **kwargs):
+    """
+    Lưu appointment qua serializer. Tính duy nhất của slot do partial unique
+    index `unique_active_appointment_per_slot` đảm bảo: hai request đồng thời
+    vào cùng slot thì request thua nhận IntegrityError và được trả về 409,
+    không cần khoá toàn cục. IntegrityError khác (FK, NOT NULL...) được ném lại.
+
+    Trước khi ghi có đúng một SELECT: slot có đang được giữ cho người trong
+    danh sách chờ không (appointments.waitlist).
+    """
+    data = serializer.validated_data
+    if 'doctor' in data or 'timeslot' in data:
+        from .waitlist import slot_is_held
+        instance = serializer.instance
+        doctor = data.get('doctor') or instance.doctor
+        patient = kwargs.get('patient') or getattr(instance, 'patient', None)
+        # slot đang được giữ cho người trong danh sách chờ
+        if slot_is_held(doctor.pk, data.get('timeslot') or instance.timeslot, getattr(patient, 'pk', None)):
+            raise SlotUnavailable()
+    try:
+        # savepoint riêng để lỗi không làm hỏng transaction bên ngoài (ATOMIC_REQUESTS, test)
+        with transaction.atomic():
+            return serializer.save(**kwargs)
+    except IntegrityError:
+        if not _slot_taken(serializer, kwargs):
+            raise
+        raise SlotUnavailable()
+
+
+def _slot_taken(serializer, kwargs):
+    """
+    Sau IntegrityError: slot đã có lịch còn hiệu lực khác chưa, tức lỗi đến từ
+    unique_active_appointment_per_slot. Tên constraint không có trong thông báo
+    lỗi của mọi backend (SQLite chỉ ghi tên cột) nên kiểm tra lại bằng exists().
+    """
+    from .models import Appointment
+    data = {**serializer.validated_data, **kwargs}
+    instance = serializer.instance
+    doctor = data.get('doctor') or getattr(instance, 'doctor', None)
+    timeslot = data.get('timeslot') or getattr(instance, 'timeslot', None)
+    if doctor is None or timeslot is None:
+        return False
+    others = Appointment.objects.filter(doctor=doctor, timeslot=timeslot).exclude(status='cancelled')
+    if instance is not None:
+        others = others.exclude(pk=instance.pk)
+    return others.exists()
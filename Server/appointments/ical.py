@@ -0,0 +1,143 @@
+import hashlib
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models import Count, Max
+from django.utils import timezone
+
+from doctors.slots import get_slot_length
+from .models import Appointment
+
+# status lịch hẹn -> STATUS của VEVENT (RFC 5545)
+EVENT_STATUS = {
+    'pending': 'TENTATIVE',
+    'confirmed': 'CONFIRMED',
+    'cancelled': 'CANCELLED',
+}
+CHUNK_SIZE = 500
+
+
+def escape(text):
+    return (
+        (text or '').replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+        .replace('\r\n', '\\n').replace('\n', '\\n')
+    )
+
+
+def fold(line):
+    """Gấp dòng dài hơn 75 byte như RFC 5545 (dòng tiếp theo bắt đầu bằng một dấu cách)."""
+    data = line.encode()
+    if len(data) <= 75:
+        return line + '\r\n'
+    parts, start, limit = [], 0, 75
+    while start < len(data):
+        end = min(start + limit, len(data))
+        # không cắt giữa một ký tự UTF-8
+        while end < len(data) and (data[end] & 0xC0) == 0x80:
+            end -= 1
+        parts.append(data[start:end].decode())
+        start, limit = end, 74
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def format_dt(value):
+    return value.astimezone(dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+class AppointmentFeed:
+    """
+    Lịch hẹn của một bác sĩ hoặc bệnh nhân dưới dạng iCalendar.
+
+    Chỉ lấy lịch trong cửa sổ [hôm nay - ICAL_FEED_PAST_DAYS, hôm nay + ICAL_FEED_FUTURE_DAYS)
+    theo index (doctor|patient, timeslot, id). Nội dung được sinh dần từng VEVENT
+    từ iterator của queryset nên bộ nhớ không tăng theo số lịch hẹn.
+    """
+
+    def __init__(self, user, host, today=None):
+        self.user = user
+        self.host = host
+        self.slot_length = get_slot_length()
+        today = today or timezone.localdate()
+        tz = timezone.get_current_timezone()
+        start = today - timedelta(days=getattr(settings, 'ICAL_FEED_PAST_DAYS', 30))
+        end = today + timedelta(days=getattr(settings, 'ICAL_FEED_FUTURE_DAYS', 365))
+        self.window = (
+            timezone.make_aware(datetime.combine(start, time.min), tz),
+            timezone.make_aware(datetime.combine(end, time.min), tz),
+        )
+        # user được nạp kèm profile (select_related) nên không tốn thêm query
+        if user.user_type == 'doctor':
+            profile = getattr(user, 'doctor_profile', None)
+            self.lookup, self.other = 'doctor_id', 'patient__user__'
+        else:
+            profile = getattr(user, 'patient_profile', None)
+            self.lookup, self.other = 'patient_id', 'doctor__user__'
+        self.profile_id = profile.id if profile else None
+
+    def queryset(self):
+        if self.profile_id is None:
+            return Appointment.objects.none()
+        return Appointment.objects.filter(**{
+            self.lookup: self.profile_id,
+            'timeslot__gte': self.window[0],
+            'timeslot__lt': self.window[1],
+        })
+
+    def version(self):
+        """
+        (etag, last_modified) tính bằng một câu aggregate, không render feed.
+        Số lịch hẹn nằm trong etag vì xoá lịch hoặc lịch trượt khỏi cửa sổ
+        không làm tăng max(updated_at).
+        """
+        row = self.queryset().aggregate(last_modified=Max('updated_at'), count=Count('id'))
+        last_modified = row['last_modified']
+        raw = f"{self.user.id}:{self.window[0].isoformat()}:{last_modified and last_modified.isoformat()}:{row['count']}"
+        return hashlib.sha256(raw.encode()).hexdigest()[:32], last_modified
+
+    def rows(self):
+        fields = [
+            'id', 'timeslot', 'reason', 'status', 'created_at', 'updated_at',
+            f'{self.other}first_name', f'{self.other}last_name', f'{self.other}username',
+        ]
+        return self.queryset().order_by('timeslot', 'id').values_list(*fields)
+
+    def header(self):
+        name = 'Lịch khám' if self.user.user_type == 'doctor' else 'Lịch hẹn khám bệnh'
+        return ''.join(fold(line) for line in [
+            'BEGIN:VCALENDAR',
+            'VERSION:2.0',
+            'PRODID:-//Healthcare Booking//Appointments//VI',
+            'CALSCALE:GREGORIAN',
+            'METHOD:PUBLISH',
+            f'X-WR-CALNAME:{escape(name)}',
+        ])
+
+    def footer(self):
+        return 'END:VCALENDAR\r\n'
+
+    def event(self, row):
+        appt_id, timeslot, reason, status, created_at, updated_at, first_name, last_name, username = row
+        other = f'{first_name} {last_name}'.strip() or username
+        if self.user.user_type == 'doctor':
+            summary = f'Khám: {other}'
+        else:
+            summary = f'Khám với bác sĩ {other}'
+        return ''.join(fold(line) for line in [
+            'BEGIN:VEVENT',
+            f'UID:appointment-{appt_id}@{self.host}',
+            f'DTSTAMP:{format_dt(updated_at)}',
+            f'CREATED:{format_dt(created_at)}',
+            f'LAST-MODIFIED:{format_dt(updated_at)}',
+            f'DTSTART:{format_dt(timeslot)}',
+            f'DTEND:{format_dt(timeslot + self.slot_length)}',
+            f'SUMMARY:{escape(summary)}',
+            f'DESCRIPTION:{escape(reason)}',
+            f'STATUS:{EVENT_STATUS.get(status, "TENTATIVE")}',
+            'END:VEVENT',
+        ])
+
+    def __iter__(self):
+        yield self.header()
+        for row in self.rows().iterator(chunk_size=CHUNK_SIZE):
+            yield self.event(row)
+        yield self.footer()
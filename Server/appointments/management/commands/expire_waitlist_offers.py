@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from appointments.waitlist import expire_offers
+
+
+class Command(BaseCommand):
+    help = "Đóng các chỗ giữ trong danh sách chờ đã hết hạn và chuyển slot cho người kế tiếp."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=30,
+                            help="Số giây giữa hai lần quét.")
+        parser.add_argument('--once', action='store_true',
+                            help="Quét một lần rồi thoát.")
+
+    def handle(self, *args, **options):
+        total_expired = total_reoffered = 0
+        try:
+            while True:
+                expired, reoffered = expire_offers()
+                total_expired += expired
+                total_reoffered += reoffered
+                if expired:
+                    self.stdout.write(f"expired={expired} reoffered={reoffered}")
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(
+            f"Tổng cộng: expired={total_expired} reoffered={total_reoffered}"
+        ))
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.4 on 2026-10-18 07:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0001_initial'),
+        ('doctors', '0003_availability'),
+        ('patients', '0003_remove_patientprofile_medical_history'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='appointment',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'cancelled'), _negated=True), fields=('doctor', 'timeslot'), name='unique_active_appointment_per_slot'),
+        ),
+    ]
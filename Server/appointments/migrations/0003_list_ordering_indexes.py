@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-18 07:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0002_appointment_unique_active_slot'),
+        ('doctors', '0003_availability'),
+        ('patients', '0003_remove_patientprofile_medical_history'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['patient', 'timeslot', 'id'], name='appt_patient_timeslot_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['doctor', 'timeslot', 'id'], name='appt_doctor_timeslot_idx'),
+        ),
+    ]
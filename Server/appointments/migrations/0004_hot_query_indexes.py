@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-18 07:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0003_list_ordering_indexes'),
+        ('doctors', '0004_doctorprofile_search_fields'),
+        ('patients', '0003_remove_patientprofile_medical_history'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['doctor', 'status', 'timeslot', 'id'], name='appt_doctor_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['patient', 'status', 'timeslot', 'id'], name='appt_patient_status_idx'),
+        ),
+    ]
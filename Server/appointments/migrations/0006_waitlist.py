@@ -0,0 +1,38 @@
+# Generated by Django 5.2.4 on 2026-10-18 08:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0005_calendar_feed'),
+        ('doctors', '0005_availability_override'),
+        ('patients', '0003_remove_patientprofile_medical_history'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WaitlistEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_date', models.DateField()),
+                ('end_date', models.DateField()),
+                ('reason', models.TextField()),
+                ('priority', models.PositiveSmallIntegerField(default=0)),
+                ('status', models.CharField(choices=[('waiting', 'Đang chờ'), ('offered', 'Đang giữ chỗ'), ('booked', 'Đã đặt'), ('declined', 'Từ chối'), ('expired', 'Hết hạn giữ chỗ'), ('left', 'Đã rời')], default='waiting', max_length=10)),
+                ('offered_timeslot', models.DateTimeField(blank=True, null=True)),
+                ('hold_until', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('appointment', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='appointments.appointment')),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waitlist_entries', to='doctors.doctorprofile')),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waitlist_entries', to='patients.patientprofile')),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('status', 'waiting')), fields=['doctor', '-priority', 'created_at', 'id'], name='waitlist_queue_idx'), models.Index(condition=models.Q(('status', 'offered')), fields=['hold_until'], name='waitlist_offer_hold_idx'), models.Index(fields=['patient', 'status'], name='waitlist_patient_status_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('status__in', ['waiting', 'offered'])), fields=('patient', 'doctor'), name='unique_open_waitlist_entry'), models.UniqueConstraint(condition=models.Q(('status', 'offered')), fields=('doctor', 'offered_timeslot'), name='unique_waitlist_offer_per_slot')],
+            },
+        ),
+    ]
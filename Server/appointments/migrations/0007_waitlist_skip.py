@@ -0,0 +1,54 @@
+# Generated by Django 5.2.4 on 2026-10-18 08:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def requeue_declined_and_expired(apps, schema_editor):
+    # trước đây từ chối / hết hạn giữ chỗ là rời hàng đợi: đưa lại về waiting, chỉ bỏ qua slot đã giữ
+    WaitlistEntry = apps.get_model('appointments', 'WaitlistEntry')
+    WaitlistSkip = apps.get_model('appointments', 'WaitlistSkip')
+    closed = WaitlistEntry.objects.filter(status__in=['declined', 'expired'])
+    open_pairs = set(
+        WaitlistEntry.objects.filter(status__in=['waiting', 'offered']).values_list('patient_id', 'doctor_id')
+    )
+    for entry in closed.order_by('-created_at', '-id').iterator(chunk_size=1000):
+        pair = (entry.patient_id, entry.doctor_id)
+        if pair in open_pairs:
+            # bệnh nhân đã vào lại hàng đợi bằng entry khác
+            entry.status = 'left'
+        else:
+            open_pairs.add(pair)
+            entry.status = 'waiting'
+            if entry.offered_timeslot is not None:
+                WaitlistSkip.objects.get_or_create(entry=entry, timeslot=entry.offered_timeslot)
+        entry.offered_timeslot = None
+        entry.hold_until = None
+        entry.save(update_fields=['status', 'offered_timeslot', 'hold_until'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0006_waitlist'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='waitlistentry',
+            name='status',
+            field=models.CharField(choices=[('waiting', 'Đang chờ'), ('offered', 'Đang giữ chỗ'), ('booked', 'Đã đặt'), ('left', 'Đã rời')], default='waiting', max_length=10),
+        ),
+        migrations.CreateModel(
+            name='WaitlistSkip',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timeslot', models.DateTimeField()),
+                ('entry', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='skips', to='appointments.waitlistentry')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('entry', 'timeslot'), name='unique_waitlist_skip')],
+            },
+        ),
+        migrations.RunPython(requeue_declined_and_expired, migrations.RunPython.noop),
+    ]
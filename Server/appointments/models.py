@@ -1,3 +1,6 @@
+import secrets
+
+from django.conf import settings
 from django.db import models
 from django.utils import timezone
 
@@ -19,5 +22,134 @@ class Appointment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # danh sách lịch hẹn theo bệnh nhân / bác sĩ, phân trang theo (timeslot, id)
+            models.Index(fields=['patient', 'timeslot', 'id'], name='appt_patient_timeslot_idx'),
+            models.Index(fields=['doctor', 'timeslot', 'id'], name='appt_doctor_timeslot_idx'),
+            # lọc theo status (dashboard, ?status=, bộ đếm pending) vẫn giữ được thứ tự (timeslot, id)
+            models.Index(fields=['doctor', 'status', 'timeslot', 'id'], name='appt_doctor_status_idx'),
+            models.Index(fields=['patient', 'status', 'timeslot', 'id'], name='appt_patient_status_idx'),
+        ]
+        constraints = [
+            # Mỗi slot của bác sĩ chỉ có tối đa 1 lịch còn hiệu lực;
+            # lịch đã huỷ không chiếm slot nên được loại khỏi index.
+            models.UniqueConstraint(
+                fields=['doctor', 'timeslot'],
+                condition=~models.Q(status='cancelled'),
+                name='unique_active_appointment_per_slot',
+            ),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # nhớ status lúc đọc để signal biết status có thay đổi khi save (xem appointments.signals)
+        instance._loaded_status = instance.__dict__.get('status')
+        return instance
+
+    def __str__(self):
+        return f"{self.patient.user.username} -> {self.doctor.user.username} at {self.timeslot}"
+
+def generate_feed_token():
+    return secrets.token_urlsafe(32)
+
+
+class CalendarFeed(models.Model):
+    """
+    Token bí mật để ứng dụng lịch (Google Calendar, Outlook...) đọc feed .ics
+    của user mà không cần JWT. Đổi token là vô hiệu hoá link cũ.
+    """
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='calendar_feed')
+    token = models.CharField(max_length=64, unique=True, default=generate_feed_token)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def rotate(self):
+        self.token = generate_feed_token()
+        self.save(update_fields=['token'])
+
+
+class WaitlistEntry(models.Model):
+    """
+    Bệnh nhân chờ chỗ trống của một bác sĩ trong khoảng ngày [start_date, end_date].
+    Khi một lịch bị huỷ, slot được giữ (status offered) cho entry đứng đầu hàng đợi
+    tới hold_until; hết hạn hoặc từ chối thì entry quay lại hàng đợi (giữ nguyên vị trí,
+    chỉ bỏ qua slot đó) và slot chuyển cho entry kế tiếp (xem appointments.waitlist).
+    """
+    WAITING = 'waiting'
+    OFFERED = 'offered'
+    BOOKED  = 'booked'
+    LEFT    = 'left'
+    STATUS_CHOICES = [
+        (WAITING, 'Đang chờ'),
+        (OFFERED, 'Đang giữ chỗ'),
+        (BOOKED,  'Đã đặt'),
+        (LEFT,    'Đã rời'),
+    ]
+    OPEN_STATUSES = (WAITING, OFFERED)
+
+    patient = models.ForeignKey(
+        'patients.PatientProfile', on_delete=models.CASCADE, related_name='waitlist_entries'
+    )
+    doctor = models.ForeignKey(
+        'doctors.DoctorProfile', on_delete=models.CASCADE, related_name='waitlist_entries'
+    )
+    start_date = models.DateField()
+    end_date = models.DateField()
+    reason = models.TextField()
+    # lớn hơn được ưu tiên trước; cùng priority thì ai vào trước được trước
+    priority = models.PositiveSmallIntegerField(default=0)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=WAITING)
+    offered_timeslot = models.DateTimeField(null=True, blank=True)
+    hold_until = models.DateTimeField(null=True, blank=True)
+    appointment = models.ForeignKey(
+        Appointment, on_delete=models.SET_NULL, null=True, blank=True, related_name='+'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # hàng đợi ưu tiên: entry kế tiếp của bác sĩ là phần tử đầu của index, không quét cả danh sách
+            models.Index(
+                fields=['doctor', '-priority', 'created_at', 'id'],
+                condition=models.Q(status='waiting'),
+                name='waitlist_queue_idx',
+            ),
+            # quét các chỗ giữ đã hết hạn (expire_waitlist_offers)
+            models.Index(
+                fields=['hold_until'],
+                condition=models.Q(status='offered'),
+                name='waitlist_offer_hold_idx',
+            ),
+            models.Index(fields=['patient', 'status'], name='waitlist_patient_status_idx'),
+        ]
+        constraints = [
+            # mỗi bệnh nhân chỉ có một entry còn mở với mỗi bác sĩ
+            models.UniqueConstraint(
+                fields=['patient', 'doctor'],
+                condition=models.Q(status__in=['waiting', 'offered']),
+                name='unique_open_waitlist_entry',
+            ),
+            # một slot chỉ được giữ cho một entry tại một thời điểm
+            models.UniqueConstraint(
+                fields=['doctor', 'offered_timeslot'],
+                condition=models.Q(status='offered'),
+                name='unique_waitlist_offer_per_slot',
+            ),
+        ]
+
     def __str__(self):
-        return f"{self.patient.user.username} -> {self.doctor.user.username} at {self.timeslot}"
\ No newline at end of file
+        return f"{self.patient_id} chờ bác sĩ {self.doctor_id} ({self.start_date} – {self.end_date}, {self.status})"
+
+
+class WaitlistSkip(models.Model):
+    """Slot mà entry đã từ chối hoặc để hết hạn giữ chỗ: không giữ lại slot đó cho entry này nữa."""
+    entry = models.ForeignKey(WaitlistEntry, on_delete=models.CASCADE, related_name='skips')
+    timeslot = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            # cũng là index cho NOT EXISTS trong appointments.waitlist.next_entry
+            models.UniqueConstraint(fields=['entry', 'timeslot'], name='unique_waitlist_skip'),
+        ]
@@ -7,8 +7,28 @@
 #         fields = ['id', 'patient', 'doctor', 'timeslot', 'reason', 'status', 'created_at', 'updated_at']
 #         read_only_fields = ['patient', 'created_at', 'updated_at']
 
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import models
+from django.utils import timezone
 from rest_framework import serializers
-from .models import Appointment
+
+from doctors.availability import is_within_hours
+from doctors.profile_cache import profile_cache
+from doctors.slots import get_slot_length
+from .models import Appointment, WaitlistEntry
+
+
+class AppointmentListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        items = data.all() if isinstance(data, models.manager.BaseManager) else data
+        if 'doctor_profiles' not in self.context:
+            # profile bác sĩ của cả trang: một lần tra cache, id còn thiếu nạp bằng một query;
+            # child đọc lại từ context (get_doctor_name) thay vì tra cache cho từng lịch hẹn
+            self.context['doctor_profiles'] = profile_cache.get_many(item.doctor_id for item in items)
+        return super().to_representation(items)
+
 
 class AppointmentSerializer(serializers.ModelSerializer):
     patient_name = serializers.SerializerMethodField(read_only=True)
@@ -29,9 +49,94 @@ class AppointmentSerializer(serializers.ModelSerializer):
             'created_at',
             'updated_at'
         ]
+        # Không dùng validator unique tự sinh từ constraint: DB là nơi quyết định
+        # slot còn trống hay không (xem appointments.booking.save_appointment).
+        validators = []
+        list_serializer_class = AppointmentListSerializer
+
+    def validate(self, attrs):
+        # chỉ kiểm tra khi đổi bác sĩ / giờ; 2 query nhỏ (lịch tuần của thứ đó + override của ngày đó)
+        if getattr(settings, 'APPOINTMENT_REQUIRE_AVAILABILITY', False) and (
+                'doctor' in attrs or 'timeslot' in attrs):
+            doctor = attrs.get('doctor') or getattr(self.instance, 'doctor', None)
+            timeslot = attrs.get('timeslot') or getattr(self.instance, 'timeslot', None)
+            if doctor is not None and timeslot is not None and not is_within_hours(
+                    doctor.pk, timeslot, timeslot + get_slot_length()):
+                raise serializers.ValidationError({'timeslot': "Bác sĩ không làm việc vào thời điểm này."})
+        return attrs
 
     def get_patient_name(self, obj):
         return obj.patient.user.get_full_name() if obj.patient else None
 
     def get_doctor_name(self, obj):
-        return obj.doctor.user.get_full_name() if obj.doctor else None
\ No newline at end of file
+        # lấy từ profile đã nạp cho cả danh sách, hoặc từ cache profile thay vì join doctor -> user
+        if obj.doctor_id is None:
+            return None
+        profile = self.context.get('doctor_profiles', {}).get(obj.doctor_id)
+        if profile is None:
+            profile = profile_cache.get_many([obj.doctor_id])[obj.doctor_id]
+        return profile['fullname']
+
+class AppointmentBatchActionSerializer(serializers.Serializer):
+    """
+    Chọn lịch hẹn cho thao tác hàng loạt, dùng đúng một trong các cách:
+    - ids: danh sách id
+    - date: một ngày (theo múi giờ hiện tại), vd. "2026-11-03"
+    - start + end: khoảng thời gian [start, end), dài tối đa MAX_RANGE
+    Mỗi lần chọn được tối đa MAX_IDS lịch hẹn, kể cả theo ngày / khoảng (xem _batch_transition).
+    """
+    MAX_IDS   = 500
+    MAX_RANGE = timedelta(days=31)
+
+    ids   = serializers.ListField(child=serializers.IntegerField(), required=False,
+                                  allow_empty=False, max_length=MAX_IDS)
+    date  = serializers.DateField(required=False)
+    start = serializers.DateTimeField(required=False)
+    end   = serializers.DateTimeField(required=False)
+
+    def validate(self, attrs):
+        modes = [
+            'ids' in attrs,
+            'date' in attrs,
+            'start' in attrs or 'end' in attrs,
+        ]
+        if sum(modes) != 1:
+            raise serializers.ValidationError("Cần đúng một trong: ids, date, hoặc start/end.")
+        if modes[2]:
+            if 'start' not in attrs or 'end' not in attrs:
+                raise serializers.ValidationError("Cần cả start và end.")
+            if attrs['start'] >= attrs['end']:
+                raise serializers.ValidationError("start phải trước end.")
+            if attrs['end'] - attrs['start'] > self.MAX_RANGE:
+                raise serializers.ValidationError(f"Khoảng thời gian tối đa {self.MAX_RANGE.days} ngày.")
+        return attrs
+
+
+class WaitlistEntrySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = WaitlistEntry
+        fields = [
+            'id', 'patient', 'doctor', 'start_date', 'end_date', 'reason', 'priority',
+            'status', 'offered_timeslot', 'hold_until', 'appointment', 'created_at',
+        ]
+        read_only_fields = [
+            'patient', 'priority', 'status', 'offered_timeslot', 'hold_until', 'appointment', 'created_at',
+        ]
+        # unique_open_waitlist_entry do DB quyết định (xem WaitlistViewSet.perform_create)
+        validators = []
+
+    def validate(self, attrs):
+        # partial update: ngày không gửi lên thì lấy từ entry hiện có
+        start_date = attrs.get('start_date') or getattr(self.instance, 'start_date', None)
+        end_date = attrs.get('end_date') or getattr(self.instance, 'end_date', None)
+        if start_date is None or end_date is None:
+            return attrs
+        if start_date > end_date:
+            raise serializers.ValidationError("start_date phải trước hoặc bằng end_date.")
+        if 'end_date' in attrs and end_date < timezone.localdate():
+            raise serializers.ValidationError("Khoảng ngày chờ đã qua.")
+        return attrs
+
+
+class WaitlistPrioritySerializer(serializers.Serializer):
+    priority = serializers.IntegerField(min_value=0, max_value=32767)
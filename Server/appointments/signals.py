@@ -0,0 +1,42 @@
+from django.core.exceptions import ObjectDoesNotExist
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from doctors import dashboard
+from users.counters import apply_deltas
+from .models import Appointment
+from .waitlist import offer_slot
+
+
+def _apply_pending_delta(appointment, delta):
+    if not delta:
+        return
+    try:
+        user_ids = [appointment.patient.user_id, appointment.doctor.user_id]
+    except ObjectDoesNotExist:
+        # profile đang bị xoá theo cascade
+        return
+    apply_deltas('pending_appointments', dict.fromkeys(user_ids, delta))
+
+
+@receiver(post_save, sender=Appointment)
+def update_pending_counter_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    dashboard.invalidate([instance.doctor_id])
+    old_status = None if created else getattr(instance, '_loaded_status', None)
+    if not created and old_status is None:
+        # không biết status trước đó (vd. field bị defer): để reconcile_counters xử lý
+        return
+    instance._loaded_status = instance.status
+    if instance.status == 'cancelled' and old_status not in (None, 'cancelled'):
+        # slot vừa trống: giữ cho người kế tiếp trong danh sách chờ
+        offer_slot(instance.doctor_id, instance.timeslot, exclude_patient_ids=[instance.patient_id])
+    _apply_pending_delta(instance, (instance.status == 'pending') - (old_status == 'pending'))
+
+
+@receiver(post_delete, sender=Appointment)
+def update_pending_counter_on_delete(sender, instance, **kwargs):
+    dashboard.invalidate([instance.doctor_id])
+    if getattr(instance, '_loaded_status', instance.status) == 'pending':
+        _apply_pending_delta(instance, -1)
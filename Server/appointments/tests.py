@@ -1,3 +1,591 @@
-from django.test import TestCase
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from email.utils import format_datetime
+from unittest import mock
 
-# Create your tests here.
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient, APITestCase
+
+from config.query_plans import QueryPlanAssertionsMixin
+from config.testing import ProfileCacheTestMixin, benchmark, make_doctor, make_patient
+from doctors.profile_cache import profile_cache
+from notifications.models import Notification
+from users.models import User
+from .booking import SlotUnavailable, save_appointment
+from .ical import fold
+from .models import Appointment, CalendarFeed, WaitlistEntry
+from .serializers import AppointmentBatchActionSerializer, AppointmentSerializer, WaitlistEntrySerializer
+from .waitlist import expire_offers, next_entry, offer_slot
+
+SLOT = datetime(2099, 11, 2, 9, 0, tzinfo=dt_timezone.utc)
+
+
+class SlotConstraintTests(TestCase):
+    def setUp(self):
+        self.doctor = make_doctor()
+        self.patient = make_patient()
+
+    def test_second_active_appointment_on_slot_is_rejected(self):
+        Appointment.objects.create(patient=self.patient, doctor=self.doctor, timeslot=SLOT, reason='a')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Appointment.objects.create(patient=self.patient, doctor=self.doctor, timeslot=SLOT,
+                                       reason='b', status='confirmed')
+
+    def test_cancelled_appointments_do_not_hold_the_slot(self):
+        Appointment.objects.create(patient=self.patient, doctor=self.doctor, timeslot=SLOT,
+                                   reason='a', status='cancelled')
+        Appointment.objects.create(patient=self.patient, doctor=self.doctor, timeslot=SLOT,
+                                   reason='b', status='cancelled')
+        Appointment.objects.create(patient=self.patient, doctor=self.doctor, timeslot=SLOT, reason='c')
+        self.assertEqual(Appointment.objects.count(), 3)
+
+
+class BookingConflictTests(APITestCase):
+    def setUp(self):
+        self.doctor = make_doctor()
+        self.first = make_patient('p1')
+        self.second = make_patient('p2')
+
+    def book(self, patient, url='/api/patients/booking/'):
+        self.client.force_authenticate(patient.user)
+        return self.client.post(url, {'doctor': self.doctor.id, 'timeslot': SLOT.isoformat(), 'reason': 'khám'})
+
+    def test_taken_slot_returns_409(self):
+        self.assertEqual(self.book(self.first).status_code, 201)
+        response = self.book(self.second)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['detail'].code, 'slot_unavailable')
+        response = self.book(self.second, url='/api/appointments/')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(Appointment.objects.count(), 1)
+
+    def test_other_integrity_errors_are_not_reported_as_taken_slot(self):
+        serializer = mock.Mock(instance=None, validated_data={'doctor': self.doctor, 'timeslot': SLOT})
+        serializer.save.side_effect = IntegrityError('NOT NULL constraint failed: appointments_appointment.reason')
+        with self.assertRaises(IntegrityError):
+            save_appointment(serializer, patient=self.first)
+
+        Appointment.objects.create(patient=self.second, doctor=self.doctor, timeslot=SLOT, reason='x')
+        serializer.save.side_effect = IntegrityError('UNIQUE constraint failed')
+        with self.assertRaises(SlotUnavailable):
+            save_appointment(serializer, patient=self.first)
+
+    def test_booking_writes_both_notifications_in_one_insert(self):
+        for url in ('/api/patients/booking/', '/api/appointments/'):
+            Appointment.objects.all().delete()
+            Notification.objects.all().delete()
+            with CaptureQueriesContext(connection) as ctx:
+                self.assertEqual(self.book(self.first, url=url).status_code, 201)
+            inserts = [q['sql'] for q in ctx.captured_queries
+                       if q['sql'].startswith('INSERT INTO "notifications_notification"')]
+            self.assertEqual(len(inserts), 1)
+            self.assertEqual(
+                set(Notification.objects.values_list('recipient_id', flat=True)),
+                {self.first.user.id, self.doctor.user.id},
+            )
+
+    def test_slot_can_be_rebooked_after_cancel(self):
+        self.book(self.first)
+        Appointment.objects.update(status='cancelled')
+        self.assertEqual(self.book(self.second).status_code, 201)
+
+
+class AppointmentListQueryTests(ProfileCacheTestMixin, APITestCase):
+    ENDPOINTS = {
+        'patient': ['/api/appointments/', '/api/patients/appointments/'],
+        'doctor': ['/api/appointments/', '/api/doctors/appointments/'],
+    }
+
+    def setUp(self):
+        super().setUp()
+        self.doctor = make_doctor()
+        self.patient = make_patient()
+        self.created = 0
+
+    def add_appointments(self, total):
+        Appointment.objects.bulk_create([
+            Appointment(patient=self.patient, doctor=self.doctor, reason='x',
+                        timeslot=SLOT + timedelta(minutes=30 * i))
+            for i in range(self.created, total)
+        ])
+        self.created = total
+
+    def query_counts(self):
+        counts = {}
+        for role, urls in self.ENDPOINTS.items():
+            self.client.force_authenticate(getattr(self, role).user)
+            for url in urls:
+                # đo trường hợp xấu nhất: cache profile bác sĩ còn trống
+                profile_cache.clear()
+                with CaptureQueriesContext(connection) as ctx:
+                    response = self.client.get(url, {'page_size': 100})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.data['results']), min(self.created, 100))
+                self.assertTrue(response.data['results'][0]['doctor_name'] is not None)
+                counts[(role, url)] = len(ctx.captured_queries)
+        return counts
+
+    def test_query_count_does_not_grow_with_appointments(self):
+        self.add_appointments(10)
+        baseline = self.query_counts()
+        for total in (100, 1000):
+            self.add_appointments(total)
+            with self.subTest(total=total):
+                self.assertEqual(self.query_counts(), baseline)
+        # một query cho trang kết quả (đã join user) + một query nạp profile bác sĩ
+        self.assertTrue(all(count <= 2 for count in baseline.values()), baseline)
+
+    def test_doctor_names_read_from_batched_lookup(self):
+        self.add_appointments(5)
+        with mock.patch.object(profile_cache, 'get_many', wraps=profile_cache.get_many) as get_many:
+            data = AppointmentSerializer(Appointment.objects.all(), many=True).data
+        self.assertEqual(get_many.call_count, 1)
+        self.assertEqual(len(data), 5)
+
+    def test_warm_profile_cache_skips_doctor_lookup(self):
+        self.add_appointments(10)
+        self.client.force_authenticate(self.patient.user)
+        profile_cache.clear()
+        with CaptureQueriesContext(connection) as cold:
+            self.client.get('/api/appointments/')
+        with CaptureQueriesContext(connection) as warm:
+            response = self.client.get('/api/appointments/')
+        self.assertEqual(len(warm.captured_queries), len(cold.captured_queries) - 1)
+        self.assertEqual(response.data['results'][0]['doctor_name'], self.doctor.user.fullname)
+
+
+class BatchActionTests(APITestCase):
+    def setUp(self):
+        self.doctor = make_doctor()
+        self.other_doctor = make_doctor('doc2')
+        self.patient = make_patient()
+        self.client.force_authenticate(self.doctor.user)
+
+    def make(self, hours, status='pending', doctor=None):
+        return Appointment.objects.create(patient=self.patient, doctor=doctor or self.doctor, reason='x',
+                                          timeslot=SLOT + timedelta(hours=hours), status=status)
+
+    def test_batch_cancel_by_ids_reports_per_id_outcomes(self):
+        pending = self.make(0)
+        confirmed = self.make(1, status='confirmed')
+        foreign = self.make(2, doctor=self.other_doctor)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post('/api/appointments/batch-cancel/',
+                                        {'ids': [pending.id, confirmed.id, foreign.id, 999999]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['updated'], 1)
+        self.assertEqual({r['id']: r['outcome'] for r in response.data['results']}, {
+            pending.id: 'cancelled',
+            confirmed.id: 'skipped_confirmed',
+            foreign.id: 'not_found',
+            999999: 'not_found',
+        })
+        updates = [q for q in ctx.captured_queries if q['sql'].startswith('UPDATE "appointments_appointment"')]
+        self.assertEqual(len(updates), 1)
+        pending.refresh_from_db()
+        foreign.refresh_from_db()
+        self.assertEqual((pending.status, foreign.status), ('cancelled', 'pending'))
+        self.assertEqual(Notification.objects.filter(recipient=self.patient.user).count(), 1)
+
+    def test_batch_cancel_whole_day(self):
+        same_day = [self.make(h) for h in (0, 3, 8)]
+        next_day = self.make(24)
+        response = self.client.post('/api/doctors/appointments/batch-cancel/',
+                                    {'date': SLOT.date().isoformat()}, format='json')
+        self.assertEqual(response.data['updated'], 3)
+        self.assertEqual(
+            set(Appointment.objects.filter(status='cancelled').values_list('id', flat=True)),
+            {a.id for a in same_day},
+        )
+        next_day.refresh_from_db()
+        self.assertEqual(next_day.status, 'pending')
+
+    def test_batch_confirm_by_range(self):
+        inside = self.make(1)
+        outside = self.make(5)
+        response = self.client.post('/api/appointments/batch-confirm/', {
+            'start': SLOT.isoformat(), 'end': (SLOT + timedelta(hours=2)).isoformat(),
+        }, format='json')
+        self.assertEqual(response.data['results'], [{'id': inside.id, 'outcome': 'confirmed'}])
+        outside.refresh_from_db()
+        self.assertEqual(outside.status, 'pending')
+
+    def test_requires_exactly_one_selector(self):
+        url = '/api/appointments/batch-cancel/'
+        self.assertEqual(self.client.post(url, {}, format='json').status_code, 400)
+        self.assertEqual(self.client.post(url, {'ids': [1], 'date': '2099-11-02'}, format='json').status_code, 400)
+        self.assertEqual(self.client.post(url, {'start': SLOT.isoformat()}, format='json').status_code, 400)
+
+    def test_range_and_row_count_are_capped(self):
+        url = '/api/appointments/batch-cancel/'
+        response = self.client.post(url, {
+            'start': SLOT.isoformat(), 'end': (SLOT + timedelta(days=32)).isoformat(),
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        appointments = [self.make(h) for h in (0, 1, 2)]
+        with mock.patch.object(AppointmentBatchActionSerializer, 'MAX_IDS', 2):
+            response = self.client.post(url, {'date': SLOT.date().isoformat()}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Appointment.objects.filter(id__in=[a.id for a in appointments], status='cancelled').exists())
+
+    def test_patients_cannot_batch(self):
+        self.client.force_authenticate(self.patient.user)
+        response = self.client.post('/api/appointments/batch-cancel/', {'ids': [1]}, format='json')
+        self.assertEqual(response.status_code, 403)
+
+
+@benchmark
+class BookingStormBenchmark(TransactionTestCase):
+    """Nhiều bệnh nhân cùng lúc bắn request vào một slot: chỉ đúng 1 request thành công."""
+    REQUESTS = 200
+    WORKERS  = 16
+
+    def setUp(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest("SQLite in-memory khoá cả bảng khi ghi đồng thời; chạy với PostgreSQL hoặc DB_TEST_NAME")
+        self.doctor = make_doctor()
+        self.patients = [make_patient(f'storm{i}') for i in range(self.REQUESTS)]
+
+    def _book(self, patient):
+        client = APIClient()
+        client.force_authenticate(patient.user)
+        try:
+            return client.post('/api/patients/booking/', {
+                'doctor': self.doctor.id, 'timeslot': SLOT.isoformat(), 'reason': 'storm',
+            }).status_code
+        finally:
+            connection.close()
+
+    def test_parallel_booking_storm(self):
+        with ThreadPoolExecutor(max_workers=self.WORKERS) as pool:
+            codes = list(pool.map(self._book, self.patients))
+        self.assertEqual(codes.count(201), 1)
+        self.assertEqual(codes.count(409), self.REQUESTS - 1)
+        self.assertEqual(Appointment.objects.filter(doctor=self.doctor, timeslot=SLOT).count(), 1)
+
+
+class AppointmentQueryPlanTests(QueryPlanAssertionsMixin, APITestCase):
+    """Các endpoint lịch hẹn hay dùng không được rơi về quét tuần tự."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctors = [make_doctor(f'doc{i}') for i in range(3)]
+        cls.patients = [make_patient(f'pat{i}') for i in range(3)]
+        statuses = ['pending', 'confirmed', 'cancelled']
+        Appointment.objects.bulk_create([
+            Appointment(
+                patient=cls.patients[i % 3], doctor=cls.doctors[(i // 3) % 3],
+                timeslot=SLOT + timedelta(hours=i), reason='x', status=statuses[i % 3],
+            )
+            for i in range(60)
+        ])
+
+    def test_doctor_list_filtered_by_status(self):
+        self.client.force_authenticate(self.doctors[0].user)
+        with self.assertNoSequentialScans():
+            self.client.get('/api/appointments/', {'status': 'pending'})
+
+    def test_patient_lists(self):
+        self.client.force_authenticate(self.patients[0].user)
+        with self.assertNoSequentialScans():
+            self.client.get('/api/appointments/')
+            self.client.get('/api/patients/appointments/')
+
+    def test_pending_counter_recompute(self):
+        from users.counters import compute
+        with self.assertNoSequentialScans():
+            compute([self.doctors[0].user_id, self.patients[0].user_id])
+
+
+class CalendarFeedTests(QueryPlanAssertionsMixin, APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = make_doctor()
+        cls.doctor.user.first_name, cls.doctor.user.last_name = 'Lan', 'Trần'
+        cls.doctor.user.save()
+        cls.patient = make_patient()
+        cls.patient.user.first_name = 'Minh'
+        cls.patient.user.save()
+        now = timezone.now().replace(minute=0, second=0, microsecond=0)
+        cls.soon = Appointment.objects.create(
+            patient=cls.patient, doctor=cls.doctor, timeslot=now + timedelta(days=1), reason='Đau đầu; sốt, ho',
+            status='confirmed',
+        )
+        Appointment.objects.create(patient=cls.patient, doctor=cls.doctor, timeslot=now + timedelta(days=2), reason='x')
+        # ngoài cửa sổ của feed
+        Appointment.objects.create(patient=cls.patient, doctor=cls.doctor, timeslot=now + timedelta(days=800), reason='x')
+
+    def feed_url(self, user):
+        self.client.force_authenticate(user)
+        url = self.client.get('/api/appointments/calendar/').data['url']
+        self.client.force_authenticate(None)
+        return url
+
+    def read(self, response):
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_doctor_feed(self):
+        response = self.client.get(self.feed_url(self.doctor.user))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/calendar; charset=utf-8')
+        body = self.read(response)
+        self.assertTrue(body.startswith('BEGIN:VCALENDAR\r\n'))
+        self.assertTrue(body.endswith('END:VCALENDAR\r\n'))
+        self.assertEqual(body.count('BEGIN:VEVENT'), 2)
+        self.assertIn(f'UID:appointment-{self.soon.id}@testserver', body)
+        self.assertIn('SUMMARY:Khám: Minh', body)
+        self.assertIn('DESCRIPTION:Đau đầu\\; sốt\\, ho', body)
+        self.assertIn('STATUS:CONFIRMED', body)
+        self.assertIn('STATUS:TENTATIVE', body)
+
+    def test_patient_feed(self):
+        body = self.read(self.client.get(self.feed_url(self.patient.user)))
+        self.assertIn('SUMMARY:Khám với bác sĩ Lan Trần', body)
+
+    def test_conditional_get(self):
+        url = self.feed_url(self.doctor.user)
+        response = self.client.get(url)
+        etag, last_modified = response['ETag'], response['Last-Modified']
+        self.read(response)
+
+        with self.assertNumQueries(2):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+        self.soon.reason = 'Tái khám'
+        self.soon.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertIn('Tái khám', self.read(response))
+
+    def test_deleted_appointment_changes_etag(self):
+        url = self.feed_url(self.doctor.user)
+        etag = self.client.get(url)['ETag']
+        Appointment.objects.filter(status='pending').delete()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_rotate_token(self):
+        old = self.feed_url(self.doctor.user)
+        self.client.force_authenticate(self.doctor.user)
+        new = self.client.post('/api/appointments/calendar/').data['url']
+        self.client.force_authenticate(None)
+        self.assertNotEqual(old, new)
+        self.assertEqual(self.client.get(old).status_code, 404)
+        self.assertEqual(self.client.get(new).status_code, 200)
+
+    def test_inactive_user_feed_is_gone(self):
+        url = self.feed_url(self.doctor.user)
+        User.objects.filter(pk=self.doctor.user.pk).update(is_active=False)
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    async def test_streams_async_iterator_under_asgi(self):
+        feed = await CalendarFeed.objects.acreate(user_id=self.doctor.user_id)
+        response = await self.async_client.get(f'/api/appointments/calendar/{feed.token}.ics')
+        self.assertTrue(response.is_async)
+        body = b''.join([chunk async for chunk in response.streaming_content]).decode()
+        self.assertEqual(body.count('BEGIN:VEVENT'), 2)
+
+    def test_fold_long_lines(self):
+        line = 'DESCRIPTION:' + 'ệ' * 40
+        folded = fold(line)
+        self.assertTrue(all(len(part.encode()) <= 75 for part in folded.split('\r\n')))
+        self.assertEqual(folded.replace('\r\n ', '').rstrip('\r\n'), line)
+
+    def test_feed_queries_use_indexes(self):
+        url = self.feed_url(self.doctor.user)
+        with self.assertNoSequentialScans():
+            self.read(self.client.get(url))
+
+
+class LargeCalendarFeedTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = make_doctor()
+        patient = make_patient()
+        start = timezone.now().replace(minute=0, second=0, microsecond=0) + timedelta(days=1)
+        Appointment.objects.bulk_create([
+            Appointment(patient=patient, doctor=cls.doctor, timeslot=start + timedelta(minutes=30 * i), reason='x' * 200)
+            for i in range(5000)
+        ])
+        cls.feed = CalendarFeed.objects.create(user=cls.doctor.user)
+
+    def test_feed_streams_every_event(self):
+        with override_settings(ICAL_FEED_FUTURE_DAYS=200):
+            response = self.client.get(f'/api/appointments/calendar/{self.feed.token}.ics')
+        self.assertTrue(response.streaming)
+        self.assertEqual(sum(chunk.count(b'BEGIN:VEVENT') for chunk in response.streaming_content), 5000)
+
+
+@benchmark
+class CalendarFeedMemoryBenchmark(LargeCalendarFeedTests):
+    def peak(self, future_days):
+        with override_settings(ICAL_FEED_FUTURE_DAYS=future_days):
+            tracemalloc.start()
+            response = self.client.get(f'/api/appointments/calendar/{self.feed.token}.ics')
+            for _ in response.streaming_content:
+                pass
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        return peak
+
+    def test_memory_is_flat(self):
+        # bộ nhớ chỉ phụ thuộc chunk size của iterator, không phụ thuộc số sự kiện
+        small, large = self.peak(21), self.peak(200)
+        self.assertLess(large, small * 1.5)
+
+
+class WaitlistTests(QueryPlanAssertionsMixin, APITestCase):
+    DAY = date(2099, 11, 2)
+
+    def setUp(self):
+        self.doctor = make_doctor()
+        self.booked = make_patient('booked')
+        self.appointment = Appointment.objects.create(patient=self.booked, doctor=self.doctor,
+                                                      timeslot=SLOT, reason='x')
+        self.early, self.urgent, self.late, self.other_week = (
+            make_patient(name) for name in ('early', 'urgent', 'late', 'other_week'))
+        self.entries = {}
+        for patient, start, priority in [
+            (self.other_week, self.DAY + timedelta(days=3), 9),
+            (self.early, self.DAY, 0),
+            (self.urgent, self.DAY - timedelta(days=1), 5),
+            (self.late, self.DAY, 0),
+        ]:
+            self.entries[patient.id] = WaitlistEntry.objects.create(
+                patient=patient, doctor=self.doctor, start_date=start, end_date=start + timedelta(days=7),
+                reason='chờ', priority=priority)
+
+    def entry(self, patient):
+        return WaitlistEntry.objects.get(pk=self.entries[patient.id].pk)
+
+    def cancel(self):
+        self.client.force_authenticate(self.doctor.user)
+        response = self.client.post(f'/api/appointments/{self.appointment.id}/cancel/')
+        self.assertEqual(response.status_code, 200, response.data)
+
+    def test_cancel_offers_slot_by_priority(self):
+        self.cancel()
+        urgent = self.entry(self.urgent)
+        self.assertEqual(urgent.status, WaitlistEntry.OFFERED)
+        self.assertEqual(urgent.offered_timeslot, SLOT)
+        self.assertTrue(Notification.objects.filter(recipient=self.urgent.user, message__contains='Có chỗ trống').exists())
+        self.assertEqual(self.entry(self.other_week).status, WaitlistEntry.WAITING)
+        self.assertEqual(self.entry(self.early).status, WaitlistEntry.WAITING)
+
+    def test_held_slot_then_accept(self):
+        self.cancel()
+        self.client.force_authenticate(self.early.user)
+        response = self.client.post('/api/patients/booking/', {
+            'doctor': self.doctor.id, 'timeslot': SLOT.isoformat(), 'reason': 'khám'})
+        self.assertEqual(response.status_code, 409)
+
+        entry = self.entry(self.urgent)
+        self.client.force_authenticate(self.early.user)
+        self.assertEqual(self.client.post(f'/api/appointments/waitlist/{entry.id}/accept/').status_code, 404)
+        self.client.force_authenticate(self.urgent.user)
+        response = self.client.post(f'/api/appointments/waitlist/{entry.id}/accept/')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data['timeslot'], SLOT.isoformat().replace('+00:00', 'Z'))
+        entry.refresh_from_db()
+        self.assertEqual(entry.status, WaitlistEntry.BOOKED)
+        self.assertEqual(entry.appointment.patient, self.urgent)
+        self.assertEqual(self.client.post(f'/api/appointments/waitlist/{entry.id}/accept/').status_code, 409)
+
+    def test_decline_and_expiry_fall_through(self):
+        self.cancel()
+        self.client.force_authenticate(self.urgent.user)
+        response = self.client.post(f'/api/appointments/waitlist/{self.entries[self.urgent.id].id}/decline/')
+        # từ chối một slot: vẫn ở hàng đợi, vị trí giữ nguyên
+        self.assertEqual(response.data['status'], WaitlistEntry.WAITING)
+        self.assertEqual(self.entry(self.urgent).created_at, self.entries[self.urgent.id].created_at)
+        # cùng priority thì ai vào trước được trước
+        early = self.entry(self.early)
+        self.assertEqual(early.status, WaitlistEntry.OFFERED)
+
+        self.assertEqual(expire_offers(now=early.hold_until - timedelta(seconds=1)), (0, 0))
+        self.assertEqual(expire_offers(now=early.hold_until), (1, 1))
+        self.assertEqual(self.entry(self.early).status, WaitlistEntry.WAITING)
+        self.assertEqual(self.entry(self.late).status, WaitlistEntry.OFFERED)
+
+        self.client.force_authenticate(self.late.user)
+        self.client.delete(f'/api/appointments/waitlist/{self.entries[self.late.id].id}/')
+        self.assertEqual(self.entry(self.late).status, WaitlistEntry.LEFT)
+        # ai còn chờ cũng đã bỏ qua slot này: slot trống lại, ai cũng đặt được
+        self.assertFalse(WaitlistEntry.objects.filter(status=WaitlistEntry.OFFERED).exists())
+
+        # slot khác trống ra: entry đã từ chối vẫn đứng đầu hàng đợi
+        second = Appointment.objects.create(patient=self.booked, doctor=self.doctor,
+                                            timeslot=SLOT + timedelta(hours=1), reason='x', status='cancelled')
+        self.assertEqual(offer_slot(self.doctor.id, second.timeslot).patient, self.urgent)
+
+    def test_accept_after_slot_taken_requeues_entry(self):
+        self.cancel()
+        # booking thường commit cùng lúc với việc giữ chỗ
+        Appointment.objects.create(patient=self.early, doctor=self.doctor, timeslot=SLOT, reason='x')
+        entry = self.entry(self.urgent)
+        self.client.force_authenticate(self.urgent.user)
+        response = self.client.post(f'/api/appointments/waitlist/{entry.id}/accept/')
+        self.assertEqual(response.status_code, 409)
+        entry.refresh_from_db()
+        self.assertEqual(entry.status, WaitlistEntry.WAITING)
+        self.assertIsNone(entry.offered_timeslot)
+        self.assertIsNone(entry.hold_until)
+
+    def test_patient_cancel_and_batch_cancel_offer_slots(self):
+        self.client.force_authenticate(self.booked.user)
+        response = self.client.patch(f'/api/appointments/{self.appointment.id}/', {'status': 'cancelled'})
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(self.entry(self.urgent).status, WaitlistEntry.OFFERED)
+
+        second = Appointment.objects.create(patient=self.booked, doctor=self.doctor,
+                                            timeslot=SLOT + timedelta(hours=1), reason='x')
+        self.client.force_authenticate(self.doctor.user)
+        self.client.post('/api/doctors/appointments/batch-cancel/', {'ids': [second.id]}, format='json')
+        self.assertEqual(self.entry(self.early).offered_timeslot, second.timeslot)
+
+    def test_join_and_doctor_priority(self):
+        self.client.force_authenticate(self.early.user)
+        payload = {'doctor': self.doctor.id, 'start_date': '2099-12-01', 'end_date': '2099-12-05', 'reason': 'x'}
+        self.assertEqual(self.client.post('/api/appointments/waitlist/', payload).status_code, 400)
+        newcomer = make_patient('newcomer')
+        self.client.force_authenticate(newcomer.user)
+        self.assertEqual(self.client.post('/api/appointments/waitlist/',
+                                          {**payload, 'end_date': '2099-11-30'}).status_code, 400)
+        response = self.client.post('/api/appointments/waitlist/', {**payload, 'priority': 9})
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data['priority'], 0)
+
+        self.client.force_authenticate(self.doctor.user)
+        self.assertEqual(len(self.client.get('/api/appointments/waitlist/').data['results']), 5)
+        response = self.client.post(f"/api/appointments/waitlist/{response.data['id']}/priority/", {'priority': 3})
+        self.assertEqual(response.data['priority'], 3)
+
+    def test_partial_update_validates_against_instance(self):
+        entry = self.entry(self.early)
+        self.assertTrue(WaitlistEntrySerializer(entry, data={'reason': 'đổi lý do'}, partial=True).is_valid())
+        serializer = WaitlistEntrySerializer(entry, data={'end_date': self.DAY - timedelta(days=1)}, partial=True)
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('start_date phải trước', str(serializer.errors))
+
+    def test_queue_lookup_is_indexed_and_constant(self):
+        crowd = [make_patient(f'crowd{i}') for i in range(200)]
+        WaitlistEntry.objects.bulk_create([
+            WaitlistEntry(patient=patient, doctor=self.doctor, start_date=self.DAY, end_date=self.DAY,
+                          reason='x') for patient in crowd
+        ])
+        with self.assertNoSequentialScans():
+            self.assertEqual(next_entry(self.doctor.id, SLOT).patient, self.urgent)
+
+        Appointment.objects.filter(pk=self.appointment.pk).update(status='cancelled')
+        # savepoint, slot còn trống?, entry kế tiếp, giữ chỗ (savepoint + UPDATE), profile bác sĩ,
+        # notification + bộ đếm; không phụ thuộc độ dài hàng đợi
+        with self.assertNumQueries(10):
+            entry = offer_slot(self.doctor.id, SLOT)
+        self.assertEqual(entry.patient, self.urgent)
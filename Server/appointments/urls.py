@@ -1,10 +1,15 @@
 from rest_framework.routers import DefaultRouter
 from django.urls import path, include
-from .views import AppointmentViewSet
+from .views import AppointmentViewSet, CalendarFeedTokenView, CalendarFeedView, WaitlistViewSet
 
 router = DefaultRouter()
+# đăng ký trước prefix rỗng để 'waitlist/' không bị hiểu là pk của lịch hẹn
+router.register(r'waitlist', WaitlistViewSet, basename='waitlist')
 router.register(r'', AppointmentViewSet, basename='appointments')
 
 urlpatterns = [
+    # đặt trước router: route detail của router nhận mọi chuỗi làm pk
+    path('calendar/', CalendarFeedTokenView.as_view(), name='appointment-calendar'),
+    path('calendar/<str:token>.ics', CalendarFeedView.as_view(), name='appointment-calendar-feed'),
     path('', include(router.urls)),
 ]
\ No newline at end of file
@@ -84,21 +84,45 @@
 #         return Response(self.get_serializer(appt).data)
 
 # appointments/views.py
-from rest_framework import viewsets, permissions, status, serializers
+from collections import Counter
+from datetime import datetime, time, timedelta
+
+from django.db import IntegrityError, transaction
+from django.http import Http404
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from django.views import View
+from rest_framework import mixins, viewsets, permissions, status, serializers
 from rest_framework.exceptions import PermissionDenied
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
-from .models import Appointment
-from .serializers import AppointmentSerializer
+from .ical import AppointmentFeed
+from .models import Appointment, CalendarFeed, WaitlistEntry
+from .serializers import (
+    AppointmentSerializer, AppointmentBatchActionSerializer, WaitlistEntrySerializer, WaitlistPrioritySerializer,
+)
+from .booking import SlotUnavailable, save_appointment
+from .waitlist import OfferUnavailable, accept_offer, offer_slot, release_offer
 from users.permissions import IsPatient, IsDoctor
-from notifications.models import Notification
+from notifications.services import notify, notify_many
+from users.counters import apply_deltas
+from config.async_views import AsyncListModelMixin, AsyncViewSetMixin
+from config.streaming import streaming_response
+from doctors.dashboard import invalidate as invalidate_dashboard
+from doctors.profile_cache import profile_cache
 
 
-class AppointmentViewSet(viewsets.ModelViewSet):
-    queryset         = Appointment.objects.select_related('patient', 'doctor').all()
+class AppointmentViewSet(AsyncViewSetMixin, AsyncListModelMixin, viewsets.ModelViewSet):
+    # patient_name đọc qua user nên join luôn; doctor_name lấy từ cache profile bác sĩ
+    queryset         = Appointment.objects.select_related('patient__user').all()
     serializer_class = AppointmentSerializer
     permission_classes = [permissions.IsAuthenticated]
+    ordering = ('timeslot', 'id')
 
     def get_queryset(self):
         user = self.request.user
@@ -116,6 +140,10 @@ class AppointmentViewSet(viewsets.ModelViewSet):
             qs = qs.filter(status=status_param)
         return qs
 
+    async def aprepare_objects(self, objects):
+        # serializer đọc doctor_name từ context; nạp trước bằng async ORM cho cả trang
+        return {'doctor_profiles': await profile_cache.aget_many(appt.doctor_id for appt in objects)}
+
     def create(self, request, *args, **kwargs):
         # Chỉ patient mới tạo được
         if request.user.user_type != 'patient':
@@ -124,23 +152,18 @@ class AppointmentViewSet(viewsets.ModelViewSet):
 
     def perform_create(self, serializer):
         # Lưu appointment
-        appt = serializer.save(patient=self.request.user.patient_profile)
-        # Thông báo cho bác sĩ
-        Notification.objects.create(
-            recipient=appt.doctor.user,
-            message=(
+        appt = save_appointment(serializer, patient=self.request.user.patient_profile)
+        # Thông báo cho bác sĩ và bệnh nhân trong cùng một INSERT
+        notify_many([
+            (appt.doctor.user, (
                 f"Bạn có cuộc hẹn mới từ "
                 f"{appt.patient.user.get_full_name()} vào {appt.timeslot:%Y-%m-%d %H:%M} (pending)."
-            )
-        )
-        # Thông báo cho bệnh nhân
-        Notification.objects.create(
-            recipient=self.request.user,
-            message=(
+            )),
+            (self.request.user, (
                 f"Cuộc hẹn với bác sĩ "
                 f"{appt.doctor.user.get_full_name()} đã được tạo và đang chờ xác nhận."
-            )
-        )
+            )),
+        ])
 
     def update(self, request, *args, **kwargs):
         appt = self.get_object()
@@ -162,9 +185,11 @@ class AppointmentViewSet(viewsets.ModelViewSet):
         # Bệnh nhân chỉ được huỷ
         if user.user_type == 'patient':
             if data.get('status') == 'cancelled':
-                # Bệnh nhân huỷ: tạo notification cho bác sĩ
-                appt = serializer.save()
-                Notification.objects.create(
+                # Bệnh nhân huỷ: tạo notification cho bác sĩ; slot được giữ cho
+                # người kế tiếp trong danh sách chờ trong cùng transaction (signal)
+                with transaction.atomic():
+                    appt = serializer.save()
+                notify(
                     recipient=appt.doctor.user,
                     message=(
                         f"Bệnh nhân {user.get_full_name()} đã huỷ cuộc hẹn "
@@ -177,8 +202,8 @@ class AppointmentViewSet(viewsets.ModelViewSet):
 
         # Nếu đến đây và status có thay đổi thành confirmed (qua PUT/PATCH)
         if data.get('status') == 'confirmed':
-            appt = serializer.save()
-            Notification.objects.create(
+            appt = save_appointment(serializer)
+            notify(
                 recipient=appt.patient.user,
                 message=(
                     f"Cuộc hẹn ngày {appt.timeslot:%Y-%m-%d %H:%M} "
@@ -188,7 +213,7 @@ class AppointmentViewSet(viewsets.ModelViewSet):
             return
 
         # Trường hợp update khác (ví dụ only reason/time):
-        serializer.save()
+        save_appointment(serializer)
 
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated, IsDoctor])
     def confirm(self, request, pk=None):
@@ -201,7 +226,7 @@ class AppointmentViewSet(viewsets.ModelViewSet):
         appt.status = 'confirmed'
         appt.save()
         # Tạo notification cho bệnh nhân
-        Notification.objects.create(
+        notify(
             recipient=appt.patient.user,
             message=(
                 f"Cuộc hẹn ngày {appt.timeslot:%Y-%m-%d %H:%M} "
@@ -219,9 +244,11 @@ class AppointmentViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         appt.status = 'cancelled'
-        appt.save()
+        with transaction.atomic():
+            # signal giữ slot cho người kế tiếp trong danh sách chờ
+            appt.save()
         # Tạo notification cho bệnh nhân
-        Notification.objects.create(
+        notify(
             recipient=appt.patient.user,
             message=(
                 f"Cuộc hẹn ngày {appt.timeslot:%Y-%m-%d %H:%M} "
@@ -229,3 +256,221 @@ class AppointmentViewSet(viewsets.ModelViewSet):
             )
         )
         return Response(self.get_serializer(appt).data)
+
+    # Thao tác hàng loạt cho bác sĩ (vd. nghỉ ốm: huỷ toàn bộ lịch một ngày)
+    def _batch_transition(self, request, new_status, message_template):
+        """
+        Chuyển các lịch `pending` được chọn sang new_status bằng một câu UPDATE
+        có điều kiện, trả về kết quả theo từng id và tạo notification hàng loạt.
+        """
+        params = AppointmentBatchActionSerializer(data=request.data)
+        params.is_valid(raise_exception=True)
+        data = params.validated_data
+
+        qs = Appointment.objects.filter(doctor__user=request.user)
+        if 'ids' in data:
+            qs = qs.filter(id__in=data['ids'])
+        elif 'date' in data:
+            tz = timezone.get_current_timezone()
+            start = timezone.make_aware(datetime.combine(data['date'], time.min), tz)
+            qs = qs.filter(timeslot__gte=start, timeslot__lt=start + timedelta(days=1))
+        else:
+            qs = qs.filter(timeslot__gte=data['start'], timeslot__lt=data['end'])
+
+        with transaction.atomic():
+            # khoá các lịch được chọn để kết quả trả về khớp với câu UPDATE
+            limit = AppointmentBatchActionSerializer.MAX_IDS
+            candidates = list(
+                qs.select_related('patient__user')
+                .select_for_update(of=('self',))
+                .order_by('timeslot', 'id')[:limit + 1]
+            )
+            if len(candidates) > limit:
+                raise serializers.ValidationError(
+                    f"Chọn quá {limit} lịch hẹn, hãy thu hẹp ngày / khoảng thời gian.")
+            pending_ids = [appt.id for appt in candidates if appt.status == 'pending']
+            updated = 0
+            if pending_ids:
+                updated = Appointment.objects.filter(id__in=pending_ids, status='pending').update(
+                    status=new_status, updated_at=timezone.now()
+                )
+
+            doctor_name = request.user.get_full_name()
+            notify_many(
+                (appt.patient.user, message_template.format(timeslot=appt.timeslot, doctor=doctor_name))
+                for appt in candidates if appt.status == 'pending'
+            )
+
+            # .update() không phát signal nên tự trừ bộ đếm lịch pending
+            deltas = Counter(appt.patient.user_id for appt in candidates if appt.status == 'pending')
+            deltas = {user_id: -n for user_id, n in deltas.items()}
+            deltas[request.user.id] = -len(pending_ids)
+            apply_deltas('pending_appointments', deltas)
+            if pending_ids:
+                invalidate_dashboard({appt.doctor_id for appt in candidates})
+            if new_status == 'cancelled':
+                # .update() không phát signal nên tự giữ các slot vừa trống cho danh sách chờ
+                for appt in candidates:
+                    if appt.status == 'pending':
+                        offer_slot(appt.doctor_id, appt.timeslot, exclude_patient_ids=[appt.patient_id])
+
+        results = [
+            {'id': appt.id, 'outcome': new_status if appt.status == 'pending' else f'skipped_{appt.status}'}
+            for appt in candidates
+        ]
+        if 'ids' in data:
+            found = {appt.id for appt in candidates}
+            results += [
+                {'id': appt_id, 'outcome': 'not_found'}
+                for appt_id in dict.fromkeys(data['ids']) if appt_id not in found
+            ]
+        return Response({'updated': updated, 'results': results})
+
+    @action(detail=False, methods=['post'], url_path='batch-confirm',
+            permission_classes=[permissions.IsAuthenticated, IsDoctor])
+    def batch_confirm(self, request):
+        return self._batch_transition(
+            request, 'confirmed',
+            "Cuộc hẹn ngày {timeslot:%Y-%m-%d %H:%M} đã được xác nhận bởi bác sĩ {doctor}."
+        )
+
+    @action(detail=False, methods=['post'], url_path='batch-cancel',
+            permission_classes=[permissions.IsAuthenticated, IsDoctor])
+    def batch_cancel(self, request):
+        return self._batch_transition(
+            request, 'cancelled',
+            "Cuộc hẹn ngày {timeslot:%Y-%m-%d %H:%M} đã bị huỷ bởi bác sĩ {doctor}."
+        )
+
+
+class WaitlistViewSet(mixins.ListModelMixin, mixins.CreateModelMixin, mixins.RetrieveModelMixin,
+                      mixins.DestroyModelMixin, viewsets.GenericViewSet):
+    """
+    Danh sách chờ chỗ trống (xem appointments.waitlist).
+    - Bệnh nhân: GET/POST /api/appointments/waitlist/, DELETE .../<id>/ để rời,
+      POST .../<id>/accept/ hoặc .../<id>/decline/ khi được giữ chỗ
+    - Bác sĩ: GET các entry còn mở của mình, POST .../<id>/priority/ để xếp ưu tiên
+    """
+    serializer_class   = WaitlistEntrySerializer
+    permission_classes = [permissions.IsAuthenticated]
+    ordering = ('created_at', 'id')
+
+    def get_permissions(self):
+        if self.action in ('create', 'destroy', 'accept', 'decline'):
+            return [permissions.IsAuthenticated(), IsPatient()]
+        if self.action == 'priority':
+            return [permissions.IsAuthenticated(), IsDoctor()]
+        return super().get_permissions()
+
+    def get_queryset(self):
+        user = self.request.user
+        if user.user_type == 'patient':
+            return WaitlistEntry.objects.filter(patient__user=user)
+        if user.user_type == 'doctor':
+            return WaitlistEntry.objects.filter(doctor__user=user, status__in=WaitlistEntry.OPEN_STATUSES)
+        return WaitlistEntry.objects.none()
+
+    def get_locked_object(self):
+        # khoá entry trong transaction đang mở để giữ chỗ / nhận chỗ không chạy chồng nhau
+        return get_object_or_404(self.get_queryset().select_for_update(), pk=self.kwargs['pk'])
+
+    def perform_create(self, serializer):
+        try:
+            with transaction.atomic():
+                serializer.save(patient=self.request.user.patient_profile)
+        except IntegrityError:
+            raise serializers.ValidationError("Bạn đã có trong danh sách chờ của bác sĩ này.")
+
+    def destroy(self, request, *args, **kwargs):
+        with transaction.atomic():
+            entry = self.get_locked_object()
+            if entry.status == WaitlistEntry.OFFERED:
+                release_offer(entry, leave=True)
+            elif entry.status == WaitlistEntry.WAITING:
+                entry.status = WaitlistEntry.LEFT
+                entry.save(update_fields=['status', 'updated_at'])
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @action(detail=True, methods=['post'])
+    def accept(self, request, pk=None):
+        with transaction.atomic():
+            appointment = accept_offer(self.get_locked_object())
+        if appointment is None:
+            # entry đã được đưa lại hàng đợi trong transaction trên
+            raise SlotUnavailable()
+        return Response(AppointmentSerializer(appointment).data, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['post'])
+    def decline(self, request, pk=None):
+        with transaction.atomic():
+            entry = self.get_locked_object()
+            if entry.status != WaitlistEntry.OFFERED:
+                raise OfferUnavailable()
+            release_offer(entry)
+        return Response(self.get_serializer(entry).data)
+
+    @action(detail=True, methods=['post'])
+    def priority(self, request, pk=None):
+        params = WaitlistPrioritySerializer(data=request.data)
+        params.is_valid(raise_exception=True)
+        entry = self.get_object()
+        entry.priority = params.validated_data['priority']
+        entry.save(update_fields=['priority', 'updated_at'])
+        return Response(self.get_serializer(entry).data)
+
+
+class CalendarFeedTokenView(APIView):
+    """
+    GET  /api/appointments/calendar/  link feed .ics của user (tạo nếu chưa có)
+    POST /api/appointments/calendar/  đổi token, link cũ hết hiệu lực
+    """
+    permission_classes = [permissions.IsAuthenticated, IsDoctor | IsPatient]
+
+    def get(self, request):
+        feed, _ = CalendarFeed.objects.get_or_create(user_id=request.user.id)
+        return Response(self.payload(request, feed))
+
+    def post(self, request):
+        feed, created = CalendarFeed.objects.get_or_create(user_id=request.user.id)
+        if not created:
+            feed.rotate()
+        return Response(self.payload(request, feed))
+
+    def payload(self, request, feed):
+        url = reverse('appointment-calendar-feed', kwargs={'token': feed.token})
+        return {'token': feed.token, 'url': request.build_absolute_uri(url)}
+
+
+class CalendarFeedView(View):
+    """
+    GET /api/appointments/calendar/<token>.ics
+    Feed iCalendar cho ứng dụng lịch, xác thực bằng token trong URL.
+
+    Ứng dụng lịch poll vài phút một lần: ETag/Last-Modified lấy từ updated_at
+    nên feed không đổi thì trả 304 mà không render. Nội dung được stream
+    (async iterator khi chạy dưới ASGI) nên bộ nhớ không phụ thuộc số lịch hẹn.
+    """
+
+    def get(self, request, token):
+        feed = (
+            CalendarFeed.objects.select_related('user__doctor_profile', 'user__patient_profile')
+            .filter(token=token, user__is_active=True).first()
+        )
+        if feed is None:
+            raise Http404
+
+        calendar = AppointmentFeed(feed.user, request.get_host())
+        etag, last_modified = calendar.version()
+        etag = quote_etag(etag)
+        # HTTP date chỉ chính xác tới giây
+        last_modified = int(last_modified.timestamp()) if last_modified else None
+
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = streaming_response(request, calendar, content_type='text/calendar; charset=utf-8')
+            response.headers['Content-Disposition'] = 'inline; filename="appointments.ics"'
+        response.headers['ETag'] = etag
+        if last_modified is not None:
+            response.headers['Last-Modified'] = http_date(last_modified)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
@@ -0,0 +1,164 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from doctors.profile_cache import profile_cache
+from notifications.services import notify, notify_many
+from .models import Appointment, WaitlistEntry, WaitlistSkip
+
+
+class OfferUnavailable(APIException):
+    status_code    = status.HTTP_409_CONFLICT
+    default_detail = "Chỗ giữ này đã hết hạn hoặc không còn hiệu lực."
+    default_code   = 'offer_unavailable'
+
+
+def get_hold_length():
+    return timedelta(minutes=getattr(settings, 'WAITLIST_HOLD_MINUTES', 30))
+
+
+def slot_is_held(doctor_id, timeslot, patient_id, now=None):
+    """Slot đang được giữ cho một bệnh nhân khác trong waitlist (chưa hết hạn)."""
+    return held_timeslots(doctor_id, now).filter(offered_timeslot=timeslot).exclude(patient_id=patient_id).exists()
+
+
+def held_timeslots(doctor_id, now=None):
+    """Các chỗ giữ còn hiệu lực của bác sĩ (theo unique_waitlist_offer_per_slot)."""
+    return WaitlistEntry.objects.filter(
+        doctor_id=doctor_id, status=WaitlistEntry.OFFERED, hold_until__gt=now or timezone.now(),
+    )
+
+
+def next_entry(doctor_id, timeslot, exclude_patient_ids=()):
+    """
+    Entry đứng đầu hàng đợi của bác sĩ còn nhận ngày của `timeslot` và chưa bỏ qua
+    slot này: đi theo index waitlist_queue_idx (priority giảm dần, vào trước ra trước)
+    và dừng ở entry hợp lệ đầu tiên; slot đã bỏ qua tra bằng unique_waitlist_skip.
+    Trên PostgreSQL entry đang bị transaction khác khoá thì bỏ qua.
+    """
+    day = timezone.localtime(timeslot).date()
+    queue = WaitlistEntry.objects.filter(
+        doctor_id=doctor_id, status=WaitlistEntry.WAITING, start_date__lte=day, end_date__gte=day,
+    ).exclude(patient_id__in=exclude_patient_ids).exclude(
+        Exists(WaitlistSkip.objects.filter(entry=OuterRef('pk'), timeslot=timeslot))
+    ).order_by('-priority', 'created_at', 'id')
+    return queue.select_related('patient__user').select_for_update(of=('self',), skip_locked=True).first()
+
+
+def offer_slot(doctor_id, timeslot, exclude_patient_ids=(), now=None):
+    """
+    Giữ slot vừa trống cho entry kế tiếp trong hàng đợi và báo cho bệnh nhân.
+    Gọi trong transaction của thao tác huỷ để việc huỷ và giữ chỗ cùng commit.
+    Trả về entry được giữ chỗ, hoặc None nếu không có ai / slot không còn trống.
+    """
+    now = now or timezone.now()
+    if timeslot <= now:
+        return None
+    with transaction.atomic():
+        if Appointment.objects.filter(doctor_id=doctor_id, timeslot=timeslot).exclude(status='cancelled').exists():
+            return None
+        entry = next_entry(doctor_id, timeslot, exclude_patient_ids)
+        if entry is None:
+            return None
+        entry.status = WaitlistEntry.OFFERED
+        entry.offered_timeslot = timeslot
+        entry.hold_until = now + get_hold_length()
+        try:
+            with transaction.atomic():
+                entry.save(update_fields=['status', 'offered_timeslot', 'hold_until', 'updated_at'])
+        except IntegrityError:
+            # slot đã được giữ cho entry khác (unique_waitlist_offer_per_slot)
+            return None
+        doctor_name = profile_cache.get_many([doctor_id])[doctor_id]['fullname']
+        notify(
+            recipient=entry.patient.user,
+            message=(
+                f"Có chỗ trống với bác sĩ {doctor_name} vào {timeslot:%Y-%m-%d %H:%M}. "
+                f"Chỗ được giữ cho bạn đến {entry.hold_until:%Y-%m-%d %H:%M}."
+            ),
+        )
+    return entry
+
+
+def _requeue(entry, skip=True):
+    """Đưa entry đang giữ chỗ về hàng đợi, giữ nguyên vị trí; skip=True thì không giữ lại slot này cho entry."""
+    if skip:
+        WaitlistSkip.objects.get_or_create(entry=entry, timeslot=entry.offered_timeslot)
+    entry.status = WaitlistEntry.WAITING
+    entry.offered_timeslot = None
+    entry.hold_until = None
+    entry.save(update_fields=['status', 'offered_timeslot', 'hold_until', 'updated_at'])
+
+
+def release_offer(entry, leave=False, now=None):
+    """
+    Kết thúc chỗ giữ của entry rồi chuyển slot cho entry kế tiếp. Từ chối / hết hạn
+    (leave=False): entry quay lại hàng đợi ở vị trí cũ, chỉ bỏ qua slot này.
+    leave=True: bệnh nhân rời danh sách chờ.
+    """
+    timeslot = entry.offered_timeslot
+    with transaction.atomic():
+        if leave:
+            entry.status = WaitlistEntry.LEFT
+            entry.save(update_fields=['status', 'updated_at'])
+        else:
+            _requeue(entry)
+        return offer_slot(entry.doctor_id, timeslot, exclude_patient_ids=[entry.patient_id], now=now)
+
+
+def accept_offer(entry, now=None):
+    """
+    Bệnh nhân nhận chỗ đang giữ: tạo lịch hẹn pending và đóng entry.
+    `entry` phải được đọc bằng select_for_update trong transaction của người gọi.
+
+    Trả về None nếu slot đã bị người khác đặt (booking chạy đồng thời với lúc giữ
+    chỗ): entry được đưa lại hàng đợi, người gọi commit rồi báo 409.
+    """
+    now = now or timezone.now()
+    if entry.status != WaitlistEntry.OFFERED or entry.hold_until <= now:
+        raise OfferUnavailable()
+    try:
+        with transaction.atomic():
+            appointment = Appointment.objects.create(
+                patient_id=entry.patient_id, doctor_id=entry.doctor_id,
+                timeslot=entry.offered_timeslot, reason=entry.reason,
+            )
+    except IntegrityError:
+        _requeue(entry, skip=False)
+        return None
+    entry.status = WaitlistEntry.BOOKED
+    entry.appointment = appointment
+    entry.save(update_fields=['status', 'appointment', 'updated_at'])
+    notify_many([
+        (appointment.doctor.user, (
+            f"Bạn có cuộc hẹn mới từ danh sách chờ: "
+            f"{appointment.patient.user.get_full_name()} vào {appointment.timeslot:%Y-%m-%d %H:%M} (pending)."
+        )),
+    ])
+    return appointment
+
+
+def expire_offers(now=None, batch_size=100):
+    """
+    Đóng các chỗ giữ đã quá hold_until và chuyển slot cho entry kế tiếp.
+    Trả về (số chỗ hết hạn, số chỗ được giữ lại cho người khác).
+    """
+    now = now or timezone.now()
+    expired = reoffered = 0
+    while True:
+        with transaction.atomic():
+            batch = list(
+                WaitlistEntry.objects.filter(status=WaitlistEntry.OFFERED, hold_until__lte=now)
+                .order_by('hold_until').select_for_update(skip_locked=True)[:batch_size]
+            )
+            for entry in batch:
+                expired += 1
+                if release_offer(entry, now=now) is not None:
+                    reoffered += 1
+        if len(batch) < batch_size:
+            return expired, reoffered
@@ -0,0 +1,117 @@
+import functools
+from inspect import iscoroutinefunction
+
+from asgiref.sync import sync_to_async
+from django.utils.decorators import classonlymethod
+from django.utils.functional import classproperty
+from rest_framework import exceptions
+from rest_framework.response import Response
+
+
+class AsyncAPIViewMixin:
+    """
+    Cho APIView chạy handler `async def` thẳng trên event loop khi chạy dưới ASGI.
+
+    DRF chưa hỗ trợ view async nên dispatch được viết lại: xác thực qua
+    `aauthenticate` của authenticator (nếu có), permission/throttle chạy như cũ
+    (không đọc DB, xem users.authentication), rồi await handler. Handler sync
+    (POST/PUT của ViewSet, OPTIONS...) vẫn đi đường dispatch của DRF qua
+    sync_to_async. Handler async không được chạm ORM sync: đọc bằng async ORM
+    (`aget`, `afirst`, `async for`...).
+    """
+
+    @classproperty
+    def view_is_async(cls):
+        return True
+
+    async def dispatch(self, request, *args, **kwargs):
+        method = request.method.lower()
+        handler = getattr(self, method, None) if method in self.http_method_names else None
+        if not iscoroutinefunction(handler):
+            return await sync_to_async(super().dispatch)(request, *args, **kwargs)
+
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await self.aperform_authentication(request)
+            self.initial(request, *args, **kwargs)
+            response = await handler(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+    async def aperform_authentication(self, request):
+        # giống Request._authenticate, nhưng await aauthenticate thay vì gọi authenticate sync
+        for authenticator in request.authenticators:
+            aauthenticate = getattr(authenticator, 'aauthenticate', None)
+            try:
+                if aauthenticate is not None:
+                    user_auth_tuple = await aauthenticate(request)
+                else:
+                    user_auth_tuple = await sync_to_async(authenticator.authenticate)(request)
+            except exceptions.APIException:
+                request._not_authenticated()
+                raise
+
+            if user_auth_tuple is not None:
+                request._authenticator = authenticator
+                request.user, request.auth = user_auth_tuple
+                return
+        request._not_authenticated()
+
+
+class AsyncViewSetMixin(AsyncAPIViewMixin):
+    """
+    AsyncAPIViewMixin cho ViewSet: as_view của ViewSetMixin trả về hàm sync nên
+    Django không nhận ra là view async; bọc lại bằng một hàm `async def`.
+    """
+
+    @classonlymethod
+    def as_view(cls, actions=None, **initkwargs):
+        view = super().as_view(actions, **initkwargs)
+
+        @functools.wraps(view)
+        async def async_view(request, *args, **kwargs):
+            return await view(request, *args, **kwargs)
+
+        return async_view
+
+
+class AsyncListModelMixin:
+    """`list` bằng async ORM, dùng cùng AsyncAPIViewMixin/AsyncViewSetMixin."""
+
+    async def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+
+        page = await self.apaginate_queryset(queryset)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True, context=await self.aget_serializer_context(page))
+            return self.get_paginated_response(serializer.data)
+
+        objects = [obj async for obj in queryset]
+        serializer = self.get_serializer(objects, many=True, context=await self.aget_serializer_context(objects))
+        return Response(serializer.data)
+
+    async def aget_serializer_context(self, objects):
+        # serialize chạy trên event loop: mọi dữ liệu cần I/O phải nằm sẵn trong context
+        return {**self.get_serializer_context(), **(await self.aprepare_objects(objects) or {})}
+
+    async def apaginate_queryset(self, queryset):
+        if self.paginator is None:
+            return None
+        apaginate = getattr(self.paginator, 'apaginate_queryset', None)
+        if apaginate is None:
+            return await sync_to_async(self.paginator.paginate_queryset)(queryset, self.request, view=self)
+        return await apaginate(queryset, self.request, view=self)
+
+    async def aprepare_objects(self, objects):
+        """
+        Nạp trước dữ liệu serializer cần (cache...) và trả về dict được thêm vào
+        serializer context, để bước serialize không phải I/O.
+        """
@@ -0,0 +1,151 @@
+import json
+
+from django.db import connections
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, Cursor, _reverse_ordering
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor pagination theo bộ khoá đầy đủ (vd. `created_at, id`).
+
+    Khác với CursorPagination mặc định của DRF (chỉ lọc theo field đầu tiên
+    rồi dùng offset cho các giá trị trùng), cursor ở đây lưu giá trị của
+    mọi field trong ordering và lọc bằng so sánh tuple, nên trang thứ N
+    tốn đúng một index range scan như trang đầu.
+
+    View khai báo `ordering`, field cuối cùng phải là khoá duy nhất (id).
+    Field có thể NULL được lưu trong cursor là null và lọc bằng `__isnull`,
+    theo vị trí NULL trong ORDER BY mặc định của backend (không đổi ORDER BY
+    để vẫn đi theo index).
+    """
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-id',)
+
+    def get_ordering(self, request, queryset, view):
+        self.ordering = getattr(view, 'ordering', None) or self.ordering
+        ordering = super().get_ordering(request, queryset, view)
+        assert ordering[-1].lstrip('-') in ('id', 'pk'), (
+            'KeysetPagination cần field cuối của ordering là khoá duy nhất (id).'
+        )
+        return ordering
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        page_queryset = self._page_queryset(queryset, request, view)
+        return self._set_page(list(page_queryset))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """Như paginate_queryset nhưng đọc trang bằng async ORM (dùng cho view async)."""
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        page_queryset = self._page_queryset(queryset, request, view)
+        return self._set_page([obj async for obj in page_queryset])
+
+    def _page_queryset(self, queryset, request, view):
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self._nulls_largest = connections[queryset.db].features.nulls_order_largest
+
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            self._reverse, self._current_position = False, None
+        else:
+            _, self._reverse, self._current_position = self.cursor
+
+        if self._reverse:
+            queryset = queryset.order_by(*_reverse_ordering(self.ordering))
+        else:
+            queryset = queryset.order_by(*self.ordering)
+
+        if self._current_position is not None:
+            queryset = queryset.filter(self._keyset_filter(self._current_position, self._reverse))
+
+        # lấy dư một row để biết còn trang sau hay không
+        return queryset[:self.page_size + 1]
+
+    def _set_page(self, results):
+        reverse, current_position = self._reverse, self._current_position
+        self.page = list(results[:self.page_size])
+
+        if len(results) > len(self.page):
+            has_following_position = True
+            following_position = self._get_position_from_instance(results[-1], self.ordering)
+        else:
+            has_following_position = False
+            following_position = None
+
+        if reverse:
+            self.page = list(reversed(self.page))
+            self.has_next = current_position is not None
+            self.has_previous = has_following_position
+            if self.has_next:
+                self.next_position = current_position
+            if self.has_previous:
+                self.previous_position = following_position
+        else:
+            self.has_next = has_following_position
+            self.has_previous = current_position is not None
+            if self.has_next:
+                self.next_position = following_position
+            if self.has_previous:
+                self.previous_position = current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+    def _keyset_filter(self, position, reverse):
+        """
+        (a, b, c) > (x, y, z)  <=>  a > x  OR  (a = x AND b > y)  OR  (a = x AND b = y AND c > z)
+        với chiều so sánh của từng field lấy theo ordering (và đảo lại khi đi lùi).
+
+        NULL không so sánh được bằng >/<: "a = NULL" là `a IS NULL`, còn "a > x" thêm
+        hoặc bớt nhánh `a IS NULL` tuỳ NULL đứng sau hay trước x theo chiều đang đi
+        (PostgreSQL coi NULL lớn nhất, SQLite coi NULL nhỏ nhất).
+        """
+        try:
+            values = json.loads(position)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+
+        condition = Q()
+        equal = Q()
+        for order, value in zip(self.ordering, values):
+            field = order.lstrip('-')
+            lookup = 'lt' if order.startswith('-') != reverse else 'gt'
+            nulls_after = (lookup == 'gt') == self._nulls_largest
+            if value is None:
+                # sau NULL không còn gì, trừ khi NULL đứng đầu
+                if not nulls_after:
+                    condition |= equal & Q(**{f'{field}__isnull': False})
+                equal &= Q(**{f'{field}__isnull': True})
+            else:
+                after = Q(**{f'{field}__{lookup}': value})
+                if nulls_after:
+                    after |= Q(**{f'{field}__isnull': True})
+                condition |= equal & after
+                equal &= Q(**{field: value})
+        return condition
+
+    def _get_position_from_instance(self, instance, ordering):
+        values = []
+        for order in ordering:
+            field = order.lstrip('-')
+            attr = instance[field] if isinstance(instance, dict) else getattr(instance, field)
+            values.append(None if attr is None else str(attr))
+        return json.dumps(values)
+
+    def encode_cursor(self, cursor):
+        # vị trí đã là duy nhất nên không cần offset
+        return super().encode_cursor(Cursor(offset=0, reverse=cursor.reverse, position=cursor.position))
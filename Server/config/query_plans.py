@@ -0,0 +1,88 @@
+import re
+import unittest
+from contextlib import contextmanager
+
+from django.db import connections
+
+# SQLite: "SCAN appointments_appointment" (không có USING INDEX) là quét cả bảng;
+# "SCAN CONSTANT ROW" / "SCAN (subquery-1)" không phải bảng thật nên bỏ qua;
+# bảng ảo (FTS5) có "VIRTUAL TABLE INDEX n:<ràng buộc>" là đang dùng index của nó
+_SQLITE_TABLE_SCAN = re.compile(r'^SCAN (?!CONSTANT ROW)(?!\()(\S+)(?!.*\bUSING\b)(?!.*VIRTUAL TABLE INDEX \d+:\S)')
+_PG_SEQ_SCAN = re.compile(r'Seq Scan on (\S+)')
+
+
+class QueryPlanCapture:
+    """
+    Ghi lại các câu SELECT chạy trong khối `with`, sau đó lấy EXPLAIN của từng câu.
+
+        with QueryPlanCapture() as capture:
+            client.get('/api/notifications/')
+        capture.sequential_scans()  # [(sql, bảng bị quét tuần tự), ...]
+
+    Trên PostgreSQL plan được lấy với `enable_seqscan = off`: dữ liệu test nhỏ
+    nên planner thường chọn Seq Scan dù có index; tắt đi thì Seq Scan còn lại
+    nghĩa là không có index nào dùng được cho câu đó. Backend khác thì test bị skip.
+    """
+
+    def __init__(self, using='default'):
+        self.connection = connections[using]
+        self.queries = []
+        self.plans = []
+
+    def __call__(self, execute, sql, params, many, context):
+        if not many and sql.lstrip().upper().startswith('SELECT'):
+            self.queries.append((sql, params))
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        self._wrapper = self.connection.execute_wrapper(self)
+        self._wrapper.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._wrapper.__exit__(exc_type, exc_value, traceback)
+        if exc_type is None:
+            self.plans = [(sql, self.explain(sql, params)) for sql, params in self.queries]
+
+    def explain(self, sql, params):
+        vendor = self.connection.vendor
+        with self.connection.cursor() as cursor:
+            if vendor == 'sqlite':
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+                return [row[-1] for row in cursor.fetchall()]
+            if vendor == 'postgresql':
+                cursor.execute('SET enable_seqscan = off')
+                try:
+                    cursor.execute('EXPLAIN ' + sql, params)
+                    return [row[0] for row in cursor.fetchall()]
+                finally:
+                    cursor.execute('RESET enable_seqscan')
+        # backend khác (MySQL, Oracle...): bỏ qua test thay vì báo lỗi
+        raise unittest.SkipTest(f'Chưa hỗ trợ EXPLAIN cho {vendor}')
+
+    def sequential_scans(self):
+        pattern = _PG_SEQ_SCAN if self.connection.vendor == 'postgresql' else _SQLITE_TABLE_SCAN
+        found = []
+        for sql, plan in self.plans:
+            for line in plan:
+                match = pattern.search(line.strip())
+                if match:
+                    found.append((sql, match.group(1)))
+        return found
+
+
+class QueryPlanAssertionsMixin:
+    """Mixin cho TestCase: fail nếu có câu SELECT nào trong khối bị quét tuần tự."""
+
+    @contextmanager
+    def assertNoSequentialScans(self, using='default'):
+        with QueryPlanCapture(using) as capture:
+            yield capture
+        self.assertTrue(capture.queries, 'Không có câu SELECT nào được ghi lại')
+        scans = capture.sequential_scans()
+        if scans:
+            plans = dict(capture.plans)
+            details = '\n'.join(
+                f'- {table}: {sql}\n    ' + '\n    '.join(plans[sql]) for sql, table in scans
+            )
+            self.fail(f'{len(scans)} câu truy vấn bị quét tuần tự:\n{details}')
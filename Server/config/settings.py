@@ -70,13 +70,22 @@ ROOT_URLCONF = 'config.urls'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # không đọc bảng User mỗi request, xem users/authentication.py
+        'users.authentication.ClaimsJWTAuthentication',
     ),
     'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend'],
+    'DEFAULT_PAGINATION_CLASS': 'config.pagination.KeysetPagination',
+    'PAGE_SIZE': env.int('API_PAGE_SIZE', default=20),
 }
 
 AUTH_USER_MODEL = 'users.User'
 
+SIMPLE_JWT = {
+    # token mang sẵn user_type + profile id để xác thực không cần query
+    'TOKEN_OBTAIN_SERIALIZER': 'users.serializers.ClaimsTokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'users.serializers.ClaimsTokenRefreshSerializer',
+}
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -112,6 +121,9 @@ DATABASES = {
         'PASSWORD': env('DB_PASSWORD'),
         'HOST':     env('DB_HOST'),
         'PORT':     env('DB_PORT'),
+        'TEST': {
+            'NAME': env('DB_TEST_NAME', default=None),
+        },
     }
 }
 
@@ -157,3 +169,53 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Độ dài một slot khám (phút), dùng cho việc tính slot trống
+APPOINTMENT_SLOT_MINUTES = env.int('APPOINTMENT_SLOT_MINUTES', default=30)
+
+# Outbox notification (xem notifications/outbox.py)
+NOTIFICATION_DISPATCH_BATCH_SIZE   = env.int('NOTIFICATION_DISPATCH_BATCH_SIZE', default=100)
+NOTIFICATION_MAX_DELIVERY_ATTEMPTS = env.int('NOTIFICATION_MAX_DELIVERY_ATTEMPTS', default=5)
+NOTIFICATION_RETRY_SECONDS         = env.int('NOTIFICATION_RETRY_SECONDS', default=2)
+# batch dispatcher đã nhận nhưng chưa ghi kết quả (vd. process chết) được nhận lại sau số giây này
+NOTIFICATION_DISPATCH_LEASE_SECONDS = env.int('NOTIFICATION_DISPATCH_LEASE_SECONDS', default=60)
+
+# Cache (locmem mặc định, vd. CACHE_URL=redis://redis_server:6379/1 khi chạy nhiều worker).
+# Với locmem, ClaimsJWTAuthentication hỏi DB trạng thái user mỗi request thay vì dấu thu hồi trong cache
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://'),
+}
+
+# Thời gian giữ bộ đếm dashboard trong cache (giây)
+DASHBOARD_COUNTER_CACHE_SECONDS = env.int('DASHBOARD_COUNTER_CACHE_SECONDS', default=300)
+
+# Cache profile bác sĩ đã render (xem doctors/profile_cache.py): LRU trong mỗi worker,
+# bật DOCTOR_PROFILE_SHARED_CACHE để dùng thêm cache chung (CACHE_URL)
+DOCTOR_PROFILE_CACHE_SIZE    = env.int('DOCTOR_PROFILE_CACHE_SIZE', default=1000)
+DOCTOR_PROFILE_CACHE_SECONDS = env.int('DOCTOR_PROFILE_CACHE_SECONDS', default=60)
+DOCTOR_PROFILE_SHARED_CACHE  = env.bool('DOCTOR_PROFILE_SHARED_CACHE', default=False)
+
+# Số notification tối đa gửi lại khi websocket kết nối lại với last_seen_id
+NOTIFICATION_REPLAY_LIMIT = env.int('NOTIFICATION_REPLAY_LIMIT', default=200)
+
+# Chính sách dọn notification cũ (xem notifications/retention.py, manage.py purge_notifications).
+# Số ngày = 0 nghĩa là giữ lại; ACTION là delete hoặc archive
+NOTIFICATION_RETENTION_READ_DAYS   = env.int('NOTIFICATION_RETENTION_READ_DAYS', default=90)
+NOTIFICATION_RETENTION_UNREAD_DAYS = env.int('NOTIFICATION_RETENTION_UNREAD_DAYS', default=0)
+NOTIFICATION_RETENTION_ACTION      = env('NOTIFICATION_RETENTION_ACTION', default='delete')
+NOTIFICATION_RETENTION_DIGEST      = env.bool('NOTIFICATION_RETENTION_DIGEST', default=False)
+NOTIFICATION_RETENTION_BATCH_SIZE  = env.int('NOTIFICATION_RETENTION_BATCH_SIZE', default=1000)
+
+# Cache dashboard bác sĩ (giây), bị xoá khi lịch hẹn của bác sĩ thay đổi
+DOCTOR_DASHBOARD_CACHE_SECONDS = env.int('DOCTOR_DASHBOARD_CACHE_SECONDS', default=30)
+
+# Cửa sổ lịch hẹn trong feed .ics (xem appointments/ical.py), tính theo ngày từ hôm nay
+ICAL_FEED_PAST_DAYS   = env.int('ICAL_FEED_PAST_DAYS', default=30)
+ICAL_FEED_FUTURE_DAYS = env.int('ICAL_FEED_FUTURE_DAYS', default=365)
+
+# Chỉ cho đặt lịch trong giờ làm thực tế của bác sĩ (lịch tuần + override theo ngày, xem doctors/availability.py)
+APPOINTMENT_REQUIRE_AVAILABILITY = env.bool('APPOINTMENT_REQUIRE_AVAILABILITY', default=False)
+
+# Thời gian giữ slot vừa trống cho người đứng đầu danh sách chờ (phút), hết hạn thì chuyển
+# cho người kế tiếp khi chạy manage.py expire_waitlist_offers
+WAITLIST_HOLD_MINUTES = env.int('WAITLIST_HOLD_MINUTES', default=30)
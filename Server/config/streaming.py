@@ -0,0 +1,32 @@
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+
+CHUNK_SIZE = 500
+
+
+async def iterate_in_thread(iterator, chunk_size=CHUNK_SIZE):
+    """
+    Duyệt một iterator sync (có đọc DB) từ event loop: mỗi lần kéo chunk_size
+    phần tử qua sync_to_async, nên bộ nhớ chỉ giữ một chunk.
+    """
+    iterator = iter(iterator)
+    next_chunk = sync_to_async(lambda: list(islice(iterator, chunk_size)))
+    while chunk := await next_chunk():
+        for item in chunk:
+            yield item
+
+
+def streaming_response(request, content, **kwargs):
+    """
+    StreamingHttpResponse cho `content` là iterator sync.
+
+    Dưới ASGI, Django đọc hết iterator sync vào bộ nhớ rồi mới gửi; khi đó bọc
+    lại bằng iterate_in_thread để vẫn stream từng phần. `request` có thể là
+    request của DRF.
+    """
+    if isinstance(getattr(request, '_request', request), ASGIRequest):
+        content = iterate_in_thread(content)
+    return StreamingHttpResponse(content, **kwargs)
@@ -0,0 +1,51 @@
+import os
+import unittest
+from unittest import mock
+
+from django.test import tag
+
+from doctors.models import DoctorProfile
+from doctors.profile_cache import profile_cache
+from patients.models import PatientProfile
+from users.models import User
+
+
+def make_doctor(username='doc', first_name='', last_name=''):
+    user = User.objects.create_user(username=username, user_type='doctor', first_name=first_name, last_name=last_name)
+    return DoctorProfile.objects.create(user=user, specialty='Nội khoa')
+
+
+def make_patient(username='pat', first_name=''):
+    user = User.objects.create_user(username=username, user_type='patient', first_name=first_name)
+    return PatientProfile.objects.create(user=user)
+
+
+class ProfileCacheTestMixin:
+    """
+    Test đụng tới cache profile bác sĩ (LRU trong process): bắt đầu với cache rỗng
+    và dọn lại sau test. DB được rollback nên id bị dùng lại, còn cache thì không.
+    """
+
+    def setUp(self):
+        super().setUp()
+        profile_cache.clear()
+        self.addCleanup(profile_cache.clear)
+
+
+def shared_revocation_cache():
+    """
+    Test chạy trong một process nên cache locmem coi như dùng chung:
+    kiểm tra đường dấu thu hồi trong cache (không đọc DB) như khi chạy với Redis.
+    Dùng làm decorator cho class/test hoặc `with`.
+    """
+    return mock.patch('users.authentication.revocation_is_shared', new=lambda: True)
+
+
+def benchmark(test_class):
+    """
+    Đánh dấu class benchmark (tag `benchmark`): mặc định bị bỏ qua, chỉ chạy khi
+    đặt biến môi trường RUN_BENCHMARKS, vd. `RUN_BENCHMARKS=1 manage.py test --tag benchmark`.
+    Các assert về số query và hành vi nằm ở test thường, không đặt trong benchmark.
+    """
+    skip = unittest.skipUnless(os.environ.get('RUN_BENCHMARKS'), 'benchmark: đặt RUN_BENCHMARKS=1 để chạy')
+    return tag('benchmark')(skip(test_class))
@@ -0,0 +1,258 @@
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Availability, AvailabilityOverride
+
+DAY_ORDER = {value: index for index, (value, _) in enumerate(Availability.DAYS_OF_WEEK)}
+# date.weekday() -> giá trị day_of_week của Availability (0 = Monday)
+WEEKDAY_NAMES = [value for value, _ in Availability.DAYS_OF_WEEK]
+
+
+@dataclass
+class TemplatePlan:
+    """Kết quả so khớp template với các khung hiện có; errors[i] là lỗi của window thứ i."""
+    errors: list
+    to_create: list = field(default_factory=list)
+    to_update: list = field(default_factory=list)
+    to_delete: list = field(default_factory=list)
+    unchanged: list = field(default_factory=list)
+
+    @property
+    def valid(self):
+        return not any(self.errors)
+
+
+def _label(window):
+    return f"{window['day_of_week']} {window['start_time']:%H:%M}-{window['end_time']:%H:%M}"
+
+
+def find_overlaps(entries):
+    """
+    entries: [(day_of_week, start_time, end_time, ref)]. Sắp xếp theo (ngày, giờ bắt đầu)
+    rồi quét một lượt, giữ khung kết thúc muộn nhất của ngày đang xét: khung sau bắt
+    đầu trước thời điểm đó là chồng lắp. O(n log n). Trả về [(ref, ref_bị_chồng)].
+    """
+    overlaps = []
+    latest = None
+    for day, start, end, ref in sorted(entries, key=lambda e: (DAY_ORDER[e[0]], e[1], e[2])):
+        if latest is not None and latest[0] == day and start < latest[1]:
+            overlaps.append((ref, latest[2]))
+        if latest is None or latest[0] != day or end > latest[1]:
+            latest = (day, end, ref)
+    return overlaps
+
+
+def plan_template(existing, windows, replace=True):
+    """
+    So khớp `windows` (dict đã validate: day_of_week, start_time, end_time, id tuỳ chọn)
+    với `existing` (các Availability hiện có của bác sĩ), hoàn toàn trong bộ nhớ.
+
+    - window có id: cập nhật đúng khung đó
+    - window không id: trùng hệt một khung hiện có thì giữ nguyên, không thì tạo mới
+    - replace=True: khung hiện có không được nhắc tới sẽ bị xoá; False: giữ lại và
+      vẫn được dùng để kiểm tra chồng lắp
+    - khung được sửa sang đúng (ngày, giờ) hiện tại của một khung khác cũng đang được
+      sửa (vd. đổi chỗ hai khung) thì được xoá rồi tạo lại: một câu UPDATE hàng loạt
+      sẽ vi phạm unique_together giữa chừng
+    """
+    errors = [{} for _ in windows]
+    plan = TemplatePlan(errors=errors)
+    by_id = {row.id: row for row in existing}
+    by_key = {(row.day_of_week, row.start_time, row.end_time): row for row in existing}
+    claimed = {}
+
+    def add_error(index, message):
+        errors[index].setdefault('non_field_errors', []).append(message)
+
+    targets = []
+    for index, window in enumerate(windows):
+        if window['start_time'] >= window['end_time']:
+            add_error(index, "start_time phải trước end_time")
+        key = (window['day_of_week'], window['start_time'], window['end_time'])
+        row = by_id.get(window['id']) if window.get('id') is not None else by_key.get(key)
+        if window.get('id') is not None and row is None:
+            add_error(index, f"Không có khung id={window['id']} của bác sĩ này")
+        if row is not None:
+            if row.id in claimed:
+                add_error(index, f"Khung id={row.id} đã được dùng ở window #{claimed[row.id]}")
+                row = None
+            else:
+                claimed[row.id] = index
+        targets.append(row)
+
+    entries = [
+        (window['day_of_week'], window['start_time'], window['end_time'], ('window', index))
+        for index, window in enumerate(windows)
+    ]
+    if not replace:
+        entries += [
+            (row.day_of_week, row.start_time, row.end_time, ('existing', row))
+            for row in existing if row.id not in claimed
+        ]
+    for ref, other in find_overlaps(entries):
+        # báo lỗi ở window trong request; cặp window-window báo ở cả hai phía
+        for mine, theirs in ((ref, other), (other, ref)):
+            if mine[0] != 'window':
+                continue
+            if theirs[0] == 'window':
+                add_error(mine[1], f"Chồng lắp với window #{theirs[1]} ({_label(windows[theirs[1]])})")
+            else:
+                row = theirs[1]
+                add_error(mine[1], f"Chồng lắp với khung hiện có id={row.id} "
+                                   f"({row.day_of_week} {row.start_time:%H:%M}-{row.end_time:%H:%M})")
+
+    if not plan.valid:
+        return plan
+
+    moving = {}
+    for window, row in zip(windows, targets):
+        if row is not None and (row.day_of_week, row.start_time, row.end_time) != (
+                window['day_of_week'], window['start_time'], window['end_time']):
+            moving[(row.day_of_week, row.start_time, row.end_time)] = row
+
+    for window, row in zip(windows, targets):
+        key = (window['day_of_week'], window['start_time'], window['end_time'])
+        if row is not None and moving.get(key, row) is not row:
+            # khung đang giữ (ngày, giờ) đích sẽ được UPDATE cùng lúc: xoá + tạo lại khung này,
+            # khi đó (ngày, giờ) cũ của nó được giải phóng trước bước UPDATE
+            moving.pop((row.day_of_week, row.start_time, row.end_time), None)
+            plan.to_delete.append(row)
+            row = None
+        if row is None:
+            plan.to_create.append(Availability(
+                day_of_week=window['day_of_week'], start_time=window['start_time'], end_time=window['end_time'],
+            ))
+        elif (row.day_of_week, row.start_time, row.end_time) == key:
+            plan.unchanged.append(row)
+        else:
+            row.day_of_week, row.start_time, row.end_time = (
+                window['day_of_week'], window['start_time'], window['end_time'])
+            plan.to_update.append(row)
+    if replace:
+        plan.to_delete += [row for row in existing if row.id not in claimed]
+    return plan
+
+
+def apply_template(doctor_id, windows, replace=True):
+    """
+    Áp dụng template tuần cho bác sĩ trong một transaction: một query đọc (khoá) các
+    khung hiện có, rồi xoá / cập nhật / tạo bằng thao tác hàng loạt. Không qua
+    Availability.save() nên không tốn query kiểm tra chồng lắp cho từng khung.
+    Trả về TemplatePlan; nếu plan.valid là False thì không có gì được ghi.
+    IntegrityError (vd. ghi đồng thời) được để nguyên cho view trả 409.
+    """
+    with transaction.atomic():
+        existing = list(Availability.objects.select_for_update().filter(doctor_id=doctor_id))
+        plan = plan_template(existing, windows, replace=replace)
+        if not plan.valid:
+            return plan
+
+        if plan.to_delete:
+            Availability.objects.filter(id__in=[row.id for row in plan.to_delete]).delete()
+        if plan.to_update:
+            Availability.objects.bulk_update(plan.to_update, ['day_of_week', 'start_time', 'end_time'])
+        for row in plan.to_create:
+            row.doctor_id = doctor_id
+        Availability.objects.bulk_create(plan.to_create)
+    return plan
+
+
+def _merge(windows):
+    """Gộp các khoảng (start, end) chồng hoặc nối tiếp nhau; trả về danh sách đã sắp xếp."""
+    merged = []
+    for start, end in sorted(windows):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _subtract(windows, removed):
+    """windows - removed, cả hai đã gộp và sắp xếp: quét song song O(n + m)."""
+    result = []
+    j, m = 0, len(removed)
+    for start, end in windows:
+        while j < m and removed[j][1] <= start:
+            j += 1
+        current, k = start, j
+        while k < m and removed[k][0] < end:
+            if removed[k][0] > current:
+                result.append((current, removed[k][0]))
+            current = max(current, removed[k][1])
+            k += 1
+        if current < end:
+            result.append((current, end))
+    return result
+
+
+def effective_windows(availabilities, overrides, start_date, end_date):
+    """
+    Giờ làm thực tế của bác sĩ trong [start_date, end_date] dưới dạng các khoảng
+    (start, end) aware, đã sắp xếp và gộp. `overrides` phải sắp theo date; mỗi ngày
+    chỉ xét các override của ngày đó nên cả khoảng được tính trong một lượt.
+    """
+    by_day = {}
+    for av in availabilities:
+        by_day.setdefault(av.day_of_week, []).append((av.start_time, av.end_time))
+
+    overrides = list(overrides)
+    tz = timezone.get_current_timezone()
+    result = []
+    i, n = 0, len(overrides)
+    day = start_date
+    while day <= end_date:
+        while i < n and overrides[i].date < day:
+            i += 1
+        day_off, added, removed = False, [], []
+        while i < n and overrides[i].date == day:
+            override = overrides[i]
+            if override.kind == AvailabilityOverride.KIND_ADD:
+                added.append((override.start_time, override.end_time))
+            elif override.whole_day:
+                day_off = True
+            else:
+                removed.append((override.start_time, override.end_time))
+            i += 1
+
+        base = [] if day_off else by_day.get(WEEKDAY_NAMES[day.weekday()], [])
+        windows = _merge(base + added) if added else _merge(base)
+        if removed:
+            windows = _subtract(windows, _merge(removed))
+        for start_time, end_time in windows:
+            result.append((
+                timezone.make_aware(datetime.combine(day, start_time), tz),
+                timezone.make_aware(datetime.combine(day, end_time), tz),
+            ))
+        day += timedelta(days=1)
+    return result
+
+
+def get_effective_windows(doctor_id, start_date, end_date):
+    """Giờ làm thực tế trong khoảng ngày; 2 query: lịch tuần + override trong khoảng."""
+    availabilities = Availability.objects.filter(doctor_id=doctor_id).only(
+        'day_of_week', 'start_time', 'end_time'
+    )
+    if (end_date - start_date).days < 6:
+        # khoảng ngắn (vd. kiểm tra khi đặt lịch) chỉ cần các thứ trong khoảng
+        availabilities = availabilities.filter(day_of_week__in={
+            WEEKDAY_NAMES[(start_date + timedelta(days=d)).weekday()]
+            for d in range((end_date - start_date).days + 1)
+        })
+    overrides = AvailabilityOverride.objects.filter(
+        doctor_id=doctor_id, date__gte=start_date, date__lte=end_date,
+    ).order_by('date').only('date', 'kind', 'start_time', 'end_time')
+    return effective_windows(availabilities, overrides, start_date, end_date)
+
+
+def is_within_hours(doctor_id, start, end):
+    """[start, end) có nằm trọn trong giờ làm thực tế của bác sĩ không (dùng khi đặt lịch)."""
+    day = timezone.localtime(start).date()
+    return any(
+        window_start <= start and end <= window_end
+        for window_start, window_end in get_effective_windows(doctor_id, day, day)
+    )
@@ -0,0 +1,110 @@
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from appointments.models import Appointment
+from .serializers import DashboardAppointmentSerializer
+
+STATUSES = [value for value, _ in Appointment.STATUS_CHOICES]
+
+
+def cache_key(doctor_id):
+    return f"doctor_dashboard:{doctor_id}"
+
+
+def invalidate(doctor_ids):
+    # như users.counters: xoá sau commit để request khác không kịp cache lại dữ liệu cũ
+    keys = [cache_key(doctor_id) for doctor_id in set(doctor_ids)]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def periods(now):
+    """Khoảng [start, end) của hôm nay, tuần này (từ thứ Hai) và tháng này theo giờ địa phương."""
+    today = timezone.localtime(now).date()
+    week_start = today - timedelta(days=today.weekday())
+    month_start = today.replace(day=1)
+    next_month = (month_start + timedelta(days=32)).replace(day=1)
+    tz = timezone.get_current_timezone()
+
+    def at(day):
+        return timezone.make_aware(datetime.combine(day, time.min), tz)
+
+    return {
+        'today': (at(today), at(today + timedelta(days=1))),
+        'week': (at(week_start), at(week_start + timedelta(days=7))),
+        'month': (at(month_start), at(next_month)),
+    }
+
+
+def status_counts(doctor_id, ranges):
+    """Đếm lịch hẹn theo status cho từng khoảng trong một câu aggregate có điều kiện."""
+    start = min(start for start, _ in ranges.values())
+    end = max(end for _, end in ranges.values())
+    aggregates = {
+        f'{period}__{status}': Count('id', filter=Q(timeslot__gte=period_start, timeslot__lt=period_end, status=status))
+        for period, (period_start, period_end) in ranges.items()
+        for status in STATUSES
+    }
+    row = Appointment.objects.filter(doctor_id=doctor_id, timeslot__gte=start, timeslot__lt=end).aggregate(**aggregates)
+
+    counts = {period: dict.fromkeys(STATUSES, 0) for period in ranges}
+    for key, value in row.items():
+        period, status = key.split('__')
+        counts[period][status] = value
+    return counts
+
+
+def confirmed_schedule(doctor_id, day_start, day_end, now):
+    """
+    Lịch confirmed hôm nay và lịch confirmed kế tiếp (tính từ `now`) trong một
+    câu range query theo index (doctor, status, timeslot, id); đọc dần và dừng
+    ngay khi đã có cả hai.
+    """
+    queryset = (
+        Appointment.objects.filter(doctor_id=doctor_id, status='confirmed', timeslot__gte=day_start)
+        .select_related('patient__user').order_by('timeslot', 'id')
+    )
+    today, upcoming = [], None
+    for appointment in queryset.iterator(chunk_size=100):
+        if appointment.timeslot < day_end:
+            today.append(appointment)
+        if upcoming is None and appointment.timeslot >= now:
+            upcoming = appointment
+        if appointment.timeslot >= day_end and upcoming is not None:
+            break
+    return today, upcoming
+
+
+def _next_passed(data, now):
+    upcoming = data['next_appointment']
+    return upcoming is not None and parse_datetime(upcoming['timeslot']) < now
+
+
+def get_dashboard(doctor_id, now=None):
+    """
+    Dữ liệu dashboard của bác sĩ, cache DOCTOR_DASHBOARD_CACHE_SECONDS giây.
+    Cache bị xoá khi lịch hẹn của bác sĩ thay đổi (xem appointments.signals).
+    """
+    now = now or timezone.now()
+    today = timezone.localdate(now).isoformat()
+    key = cache_key(doctor_id)
+    data = cache.get(key)
+    if data is not None and data['date'] == today and not _next_passed(data, now):
+        return data
+
+    ranges = periods(now)
+    schedule, upcoming = confirmed_schedule(doctor_id, *ranges['today'], now)
+    data = {
+        'date': today,
+        'counts': status_counts(doctor_id, ranges),
+        'today_schedule': DashboardAppointmentSerializer(schedule, many=True).data,
+        'next_appointment': DashboardAppointmentSerializer(upcoming).data if upcoming else None,
+    }
+    cache.set(key, data, getattr(settings, 'DOCTOR_DASHBOARD_CACHE_SECONDS', 30))
+    return data
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from doctors.models import DoctorProfile
+from doctors.search import refresh_search_columns
+
+
+class Command(BaseCommand):
+    help = "Tính lại các cột tìm kiếm không dấu của bác sĩ (sau import / cập nhật hàng loạt)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--doctor', type=int, action='append', dest='profile_ids',
+                            help="Chỉ tính lại cho DoctorProfile id này (có thể lặp lại).")
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        profiles = DoctorProfile.objects.all()
+        if options['profile_ids']:
+            profiles = profiles.filter(id__in=options['profile_ids'])
+        done = refresh_search_columns(profiles, chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f"Đã cập nhật cột tìm kiếm cho {done} bác sĩ."))
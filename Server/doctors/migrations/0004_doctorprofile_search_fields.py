@@ -0,0 +1,84 @@
+# Generated by Django 5.2.4 on 2026-10-18 07:55
+
+import re
+import unicodedata
+
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+
+SEARCH_COLUMNS = ['search_name', 'search_specialty', 'search_address']
+
+
+def normalize(text):
+    # bản sao doctors.search.normalize tại thời điểm viết migration, để migration không đổi theo code
+    if not text:
+        return ''
+    text = text.replace('đ', 'd').replace('Đ', 'D')
+    text = unicodedata.normalize('NFD', text)
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return re.sub(r'\s+', ' ', text).strip().lower()
+
+
+def backfill_search_fields(apps, schema_editor):
+    DoctorProfile = apps.get_model('doctors', 'DoctorProfile')
+    profiles = DoctorProfile.objects.select_related('user')
+    batch = []
+    for profile in profiles.iterator(chunk_size=1000):
+        user = profile.user
+        first_last = f"{user.first_name} {user.last_name}".strip()
+        profile.search_name = normalize(' '.join(filter(None, [first_last, user.full_name, user.username])))
+        profile.search_specialty = normalize(profile.specialty)
+        profile.search_address = normalize(profile.address)
+        batch.append(profile)
+        if len(batch) >= 1000:
+            DoctorProfile.objects.bulk_update(batch, SEARCH_COLUMNS)
+            batch = []
+    if batch:
+        DoctorProfile.objects.bulk_update(batch, SEARCH_COLUMNS)
+
+
+def create_trigram_indexes(apps, schema_editor):
+    # GIN trigram chỉ có trên PostgreSQL; SQLite (test) dùng quét tuần tự
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for column in SEARCH_COLUMNS:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS doctor_{column}_trgm '
+            f'ON doctors_doctorprofile USING gin ({column} gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for column in SEARCH_COLUMNS:
+        schema_editor.execute(f'DROP INDEX IF EXISTS doctor_{column}_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doctors', '0003_availability'),
+        ('users', '0004_usercounter'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='doctorprofile',
+            name='search_address',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='doctorprofile',
+            name='search_name',
+            field=models.CharField(blank=True, default='', editable=False, max_length=600),
+        ),
+        migrations.AddField(
+            model_name='doctorprofile',
+            name='search_specialty',
+            field=models.CharField(blank=True, default='', editable=False, max_length=100),
+        ),
+        migrations.RunPython(backfill_search_fields, migrations.RunPython.noop),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.4 on 2026-10-18 08:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doctors', '0004_doctorprofile_search_fields'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AvailabilityOverride',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('kind', models.CharField(choices=[('add', 'Thêm giờ'), ('remove', 'Nghỉ')], max_length=6)),
+                ('start_time', models.TimeField(blank=True, null=True)),
+                ('end_time', models.TimeField(blank=True, null=True)),
+                ('reason', models.CharField(blank=True, max_length=255)),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='availability_overrides', to='doctors.doctorprofile')),
+            ],
+            options={
+                'ordering': ['doctor', 'date', 'start_time'],
+                'indexes': [models.Index(fields=['doctor', 'date'], name='avail_override_doctor_date')],
+            },
+        ),
+    ]
@@ -8,6 +8,26 @@ class DoctorProfile(models.Model):
     address        = models.TextField(blank=True)
     license_number = models.CharField(max_length=50, blank=True, null=True)
 
+    # bản không dấu, chữ thường để tìm kiếm (xem doctors.search); GIN trigram index trên PostgreSQL
+    search_name      = models.CharField(max_length=600, blank=True, default='', editable=False)
+    search_specialty = models.CharField(max_length=100, blank=True, default='', editable=False)
+    search_address   = models.TextField(blank=True, default='', editable=False)
+
+    def refresh_search_fields(self):
+        from .search import doctor_search_name, normalize
+        self.search_name = doctor_search_name(self.user)
+        self.search_specialty = normalize(self.specialty)
+        self.search_address = normalize(self.address)
+
+    def save(self, *args, **kwargs):
+        # bulk_create / QuerySet.update() không qua save(): gọi refresh_search_fields()
+        # trước bulk_create, hoặc doctors.search.refresh_search_columns() sau update()
+        self.refresh_search_fields()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | {'search_name', 'search_specialty', 'search_address'}
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"{self.user.get_full_name()} — {self.specialty}"
 
@@ -59,3 +79,52 @@ class Availability(models.Model):
 
     def __str__(self):
         return f"{self.doctor.user.get_full_name()} – {self.day_of_week} {self.start_time}-{self.end_time}"
+
+
+class AvailabilityOverride(models.Model):
+    """
+    Ngoại lệ của lịch tuần trong một ngày cụ thể: thêm giờ (ca khám bổ sung) hoặc
+    nghỉ (bỏ trống giờ = nghỉ cả ngày). Lịch tuần giữ nguyên cho các tuần khác.
+    Giờ làm thực tế = (lịch tuần, trừ khi nghỉ cả ngày) + giờ thêm - giờ nghỉ,
+    xem doctors.availability.effective_windows.
+    """
+    KIND_ADD    = 'add'
+    KIND_REMOVE = 'remove'
+    KIND_CHOICES = [
+        (KIND_ADD,    'Thêm giờ'),
+        (KIND_REMOVE, 'Nghỉ'),
+    ]
+
+    doctor     = models.ForeignKey(DoctorProfile, on_delete=models.CASCADE, related_name='availability_overrides')
+    date       = models.DateField()
+    kind       = models.CharField(max_length=6, choices=KIND_CHOICES)
+    start_time = models.TimeField(null=True, blank=True)
+    end_time   = models.TimeField(null=True, blank=True)
+    reason     = models.CharField(max_length=255, blank=True)
+
+    class Meta:
+        ordering = ['doctor', 'date', 'start_time']
+        indexes = [
+            # resolver đọc theo (doctor, khoảng ngày)
+            models.Index(fields=['doctor', 'date'], name='avail_override_doctor_date'),
+        ]
+
+    @property
+    def whole_day(self):
+        return self.start_time is None and self.end_time is None
+
+    def clean(self):
+        if (self.start_time is None) != (self.end_time is None):
+            raise ValidationError("Cần cả start_time và end_time, hoặc bỏ trống cả hai để nghỉ cả ngày")
+        if self.whole_day and self.kind == self.KIND_ADD:
+            raise ValidationError("Thêm giờ cần start_time và end_time")
+        if not self.whole_day and self.start_time >= self.end_time:
+            raise ValidationError("start_time phải trước end_time")
+
+    def save(self, *args, **kwargs):
+        self.full_clean()
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        hours = 'cả ngày' if self.whole_day else f"{self.start_time}-{self.end_time}"
+        return f"{self.doctor.user.get_full_name()} – {self.date} {self.get_kind_display()} {hours}"
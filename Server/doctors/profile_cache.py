@@ -0,0 +1,179 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+
+class LRUCache:
+    """
+    LRU có giới hạn số phần tử và thời gian sống, dùng trong một process (worker).
+    Thread-safe để chạy được dưới server nhiều thread.
+    """
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._data[key]
+            self.misses += 1
+            return None
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete_many(self, keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = 0
+
+    def __len__(self):
+        return len(self._data)
+
+
+class DoctorProfileCache:
+    """
+    Cache dict đã render của DoctorProfileSerializer, theo id của DoctorProfile.
+
+    Tầng 1 là LRU trong process; nếu bật DOCTOR_PROFILE_SHARED_CACHE thì tầng 2 là
+    Django cache (Redis...) dùng chung giữa các worker. Save DoctorProfile/User sẽ
+    xoá entry (xem doctors.signals); LRU của worker khác hết hạn sau
+    DOCTOR_PROFILE_CACHE_SECONDS nên độ trễ tối đa là khoảng thời gian đó.
+    """
+
+    def __init__(self):
+        self._local = None
+        self.shared_hits = 0
+
+    @property
+    def local(self):
+        if self._local is None:
+            self._local = LRUCache(
+                maxsize=getattr(settings, 'DOCTOR_PROFILE_CACHE_SIZE', 1000),
+                ttl=getattr(settings, 'DOCTOR_PROFILE_CACHE_SECONDS', 60),
+            )
+        return self._local
+
+    @property
+    def shared_enabled(self):
+        return getattr(settings, 'DOCTOR_PROFILE_SHARED_CACHE', False)
+
+    @staticmethod
+    def shared_key(profile_id):
+        return f"doctor_profile:{profile_id}"
+
+    def get(self, profile_id):
+        data = self.local.get(profile_id)
+        if data is None and self.shared_enabled:
+            data = cache.get(self.shared_key(profile_id))
+            if data is not None:
+                self.shared_hits += 1
+                self.local.set(profile_id, data)
+        return data
+
+    def set(self, profile_id, data):
+        self.local.set(profile_id, data)
+        if self.shared_enabled:
+            cache.set(self.shared_key(profile_id), data, getattr(settings, 'DOCTOR_PROFILE_CACHE_SECONDS', 60))
+
+    def get_many(self, profile_ids):
+        """Trả về {id: data}; các id chưa có trong cache được nạp bằng một query."""
+        from .models import DoctorProfile
+        from .serializers import DoctorProfileSerializer
+
+        result, missing = {}, []
+        for profile_id in set(profile_ids):
+            data = self.get(profile_id)
+            if data is None:
+                missing.append(profile_id)
+            else:
+                result[profile_id] = data
+        if missing:
+            # to_representation của serializer tự ghi vào cache
+            for profile in DoctorProfile.objects.select_related('user').filter(id__in=missing):
+                result[profile.id] = DoctorProfileSerializer(profile).data
+        return result
+
+    async def aget_many(self, profile_ids):
+        """Bản async của get_many: các id thiếu được nạp bằng async ORM."""
+        from .models import DoctorProfile
+        from .serializers import DoctorProfileSerializer
+
+        result, missing = {}, []
+        for profile_id in set(profile_ids):
+            data = self.local.get(profile_id)
+            if data is None and self.shared_enabled:
+                data = await cache.aget(self.shared_key(profile_id))
+                if data is not None:
+                    self.shared_hits += 1
+                    self.local.set(profile_id, data)
+            if data is None:
+                missing.append(profile_id)
+            else:
+                result[profile_id] = data
+        if missing:
+            async for profile in DoctorProfile.objects.select_related('user').filter(id__in=missing):
+                result[profile.id] = DoctorProfileSerializer(profile).data
+        return result
+
+    def invalidate(self, profile_ids):
+        profile_ids = list(profile_ids)
+        if not profile_ids:
+            return
+
+        def delete():
+            self.local.delete_many(profile_ids)
+            if self.shared_enabled:
+                cache.delete_many([self.shared_key(profile_id) for profile_id in profile_ids])
+
+        # xoá ngay và xoá lại sau commit: request khác có thể đã kịp cache bản cũ trong lúc chờ commit
+        delete()
+        transaction.on_commit(delete)
+
+    def clear(self):
+        self.local.clear()
+        self.shared_hits = 0
+
+    def reset(self):
+        """Bỏ LRU hiện tại; lần dùng sau tạo lại theo settings mới (override_settings trong test)."""
+        self._local = None
+        self.shared_hits = 0
+
+    def stats(self):
+        local = self.local
+        total = local.hits + local.misses
+        return {
+            'size': len(local),
+            'maxsize': local.maxsize,
+            'hits': local.hits,
+            'misses': local.misses,
+            'shared_hits': self.shared_hits,
+            'hit_rate': round(local.hits / total, 4) if total else None,
+            'shared': self.shared_enabled,
+        }
+
+
+profile_cache = DoctorProfileCache()
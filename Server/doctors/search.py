@@ -0,0 +1,97 @@
+import re
+import unicodedata
+
+from django.db import connection
+from django.db.models import Case, FloatField, Q, Value, When
+
+_SPACES = re.compile(r'\s+')
+
+
+def normalize(text):
+    """
+    Chuẩn hoá để tìm kiếm không dấu: "Nguyễn Văn Đức" -> "nguyen van duc".
+    Dùng cho cả dữ liệu lưu trong các cột search_* lẫn từ khoá người dùng nhập.
+    """
+    if not text:
+        return ''
+    text = text.replace('đ', 'd').replace('Đ', 'D')
+    text = unicodedata.normalize('NFD', text)
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return _SPACES.sub(' ', text).strip().lower()
+
+
+def doctor_search_name(user):
+    return normalize(' '.join(filter(None, [user.fullname, user.full_name, user.username])))
+
+
+def refresh_search_columns(profiles, chunk_size=1000):
+    """
+    Tính lại các cột search_* cho queryset DoctorProfile, theo lô bằng bulk_update.
+    DoctorProfile.save() và signal của User tự làm việc này; các đường ghi hàng loạt
+    (QuerySet.update(), bulk_update, SQL thô, import) thì phải gọi hàm này sau đó,
+    hoặc chạy `manage.py refresh_doctor_search`. Trả về số profile đã cập nhật.
+    """
+    columns = ['search_name', 'search_specialty', 'search_address']
+    done, batch = 0, []
+    for profile in profiles.select_related('user').order_by('id').iterator(chunk_size=chunk_size):
+        profile.refresh_search_fields()
+        batch.append(profile)
+        if len(batch) >= chunk_size:
+            profiles.model.objects.bulk_update(batch, columns)
+            done, batch = done + len(batch), []
+    if batch:
+        profiles.model.objects.bulk_update(batch, columns)
+        done += len(batch)
+    return done
+
+
+def search_doctors(queryset, q=None, specialty=None, city=None, prefix=''):
+    """
+    Lọc queryset bác sĩ theo từ khoá (không dấu, khớp chuỗi con).
+
+    Các cột search_* có GIN trigram index trên PostgreSQL nên LIKE '%...%'
+    dùng được index. Khi có `q` thì thêm annotation `search_rank` để sắp xếp.
+    `prefix` là đường dẫn tới DoctorProfile, vd. 'doctor_profile__' khi
+    queryset là User.
+    """
+    name_field = f'{prefix}search_name'
+    specialty_field = f'{prefix}search_specialty'
+    address_field = f'{prefix}search_address'
+
+    specialty = normalize(specialty)
+    if specialty:
+        queryset = queryset.filter(**{f'{specialty_field}__contains': specialty})
+    city = normalize(city)
+    if city:
+        queryset = queryset.filter(**{f'{address_field}__contains': city})
+
+    q = normalize(q)
+    if q:
+        queryset = queryset.filter(
+            Q(**{f'{name_field}__contains': q})
+            | Q(**{f'{specialty_field}__contains': q})
+            | Q(**{f'{address_field}__contains': q})
+        ).annotate(search_rank=search_rank(q, name_field, specialty_field, address_field))
+    return queryset
+
+
+def search_rank(q, name_field, specialty_field, address_field):
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import TrigramWordSimilarity
+        from django.db.models.functions import Cast, Greatest
+        # similarity() trả về real (float4): ép sang double precision để giá trị lưu trong
+        # cursor phân trang so sánh bằng đúng với cột, không làm rơi các dòng cùng rank
+        return Cast(Greatest(
+            TrigramWordSimilarity(q, name_field),
+            TrigramWordSimilarity(q, specialty_field),
+            TrigramWordSimilarity(q, address_field),
+        ), FloatField())
+    # fallback (SQLite): ưu tiên khớp đầu chuỗi, tên trước chuyên khoa trước địa chỉ
+    return Case(
+        When(**{f'{name_field}__startswith': q}, then=Value(1.0)),
+        When(**{f'{specialty_field}__startswith': q}, then=Value(0.8)),
+        When(**{f'{name_field}__contains': q}, then=Value(0.6)),
+        When(**{f'{specialty_field}__contains': q}, then=Value(0.5)),
+        default=Value(0.3),
+        output_field=FloatField(),
+    )
@@ -1,5 +1,8 @@
+from django.core.exceptions import ValidationError as DjangoValidationError
 from rest_framework import serializers
-from .models import DoctorProfile, Availability
+from .models import DoctorProfile, Availability, AvailabilityOverride
+from appointments.models import Appointment
+from .profile_cache import profile_cache
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
@@ -18,9 +21,16 @@ class DoctorProfileSerializer(serializers.ModelSerializer):
         model  = DoctorProfile
         fields = ['fullname','email','phone_number','specialty','address','license_number']
     def to_representation(self, instance):
+        # profile ít thay đổi nên dict đã render được cache theo id (xem doctors.profile_cache)
+        if instance.pk is not None:
+            cached = profile_cache.get(instance.pk)
+            if cached is not None:
+                return dict(cached)
         rep = super().to_representation(instance)
         # đọc từ property user.fullname
         rep['fullname'] = instance.user.fullname
+        if instance.pk is not None:
+            profile_cache.set(instance.pk, dict(rep))
         return rep
 
     # def get_fullname(self, obj):
@@ -80,3 +90,43 @@ class AvailabilitySerializer(serializers.ModelSerializer):
     class Meta:
         model  = Availability
         fields = ['id','day_of_week','start_time','end_time']
+
+
+class AvailabilityOverrideSerializer(serializers.ModelSerializer):
+    class Meta:
+        model  = AvailabilityOverride
+        fields = ['id', 'date', 'kind', 'start_time', 'end_time', 'reason']
+
+    def validate(self, attrs):
+        # dùng lại AvailabilityOverride.clean() để lỗi trả 400 thay vì nổ ở save()
+        values = {field: getattr(self.instance, field, None) for field in ('date', 'kind', 'start_time', 'end_time')}
+        values.update({field: attrs[field] for field in values if field in attrs})
+        try:
+            AvailabilityOverride(**values).clean()
+        except DjangoValidationError as exc:
+            raise serializers.ValidationError(exc.messages)
+        return attrs
+
+
+class AvailabilityWindowSerializer(serializers.Serializer):
+    # id: khung hiện có cần sửa; bỏ trống thì so theo (ngày, giờ) hoặc tạo mới
+    id          = serializers.IntegerField(required=False, allow_null=True)
+    day_of_week = serializers.ChoiceField(choices=Availability.DAYS_OF_WEEK)
+    start_time  = serializers.TimeField()
+    end_time    = serializers.TimeField()
+
+
+class AvailabilityTemplateSerializer(serializers.Serializer):
+    MAX_WINDOWS = 7 * 48
+
+    windows = AvailabilityWindowSerializer(many=True, max_length=MAX_WINDOWS)
+    # True: template là toàn bộ lịch tuần, khung không có trong template sẽ bị xoá
+    replace = serializers.BooleanField(default=True)
+
+
+class DashboardAppointmentSerializer(serializers.ModelSerializer):
+    patient_name = serializers.CharField(source='patient.user.get_full_name', read_only=True)
+
+    class Meta:
+        model  = Appointment
+        fields = ['id', 'patient', 'patient_name', 'timeslot', 'reason', 'status']
@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import DoctorProfile
+from .profile_cache import profile_cache
+from .search import doctor_search_name
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_save, sender='users.TokenClaimsUser')
+def refresh_doctor_from_user(sender, instance, raw=False, **kwargs):
+    # tên/email/sđt bác sĩ nằm ở User nên đổi User thì cập nhật cột tìm kiếm và xoá cache profile
+    if raw or instance.user_type != 'doctor':
+        return
+    profile_ids = list(DoctorProfile.objects.filter(user=instance).values_list('id', flat=True))
+    if profile_ids:
+        DoctorProfile.objects.filter(id__in=profile_ids).update(search_name=doctor_search_name(instance))
+        profile_cache.invalidate(profile_ids)
+
+
+@receiver(post_save, sender=DoctorProfile)
+@receiver(post_delete, sender=DoctorProfile)
+def invalidate_profile_cache(sender, instance, **kwargs):
+    profile_cache.invalidate([instance.pk])
+
+
+@receiver(setting_changed)
+def reset_profile_cache(sender, setting, **kwargs):
+    # kích thước / TTL / tầng dùng chung đổi (override_settings): dựng lại cache, không giữ dữ liệu cũ
+    if setting.startswith('DOCTOR_PROFILE_'):
+        profile_cache.reset()
@@ -0,0 +1,75 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .availability import get_effective_windows
+
+
+def get_slot_length():
+    return timedelta(minutes=getattr(settings, 'APPOINTMENT_SLOT_MINUTES', 30))
+
+
+def split_windows(windows, slot_length):
+    """Cắt mỗi khoảng thành các slot liên tiếp dài slot_length (bỏ phần lẻ cuối)."""
+    slots = []
+    for start, end in windows:
+        current = start
+        while current + slot_length <= end:
+            slots.append(current)
+            current += slot_length
+    return slots
+
+
+def subtract_booked(slots, booked, slot_length):
+    """
+    Quét song song hai danh sách đã sắp xếp: slot ứng viên và thời điểm
+    bắt đầu của các lịch đã đặt (mỗi lịch chiếm slot_length).
+    Một slot bị loại nếu giao với bất kỳ lịch nào. O(n + m).
+    """
+    free = []
+    i, n = 0, len(booked)
+    for slot in slots:
+        slot_end = slot + slot_length
+        # bỏ qua những lịch đã kết thúc trước khi slot bắt đầu
+        while i < n and booked[i] + slot_length <= slot:
+            i += 1
+        if i < n and booked[i] < slot_end:
+            continue
+        free.append(slot)
+    return free
+
+
+def get_free_slots(doctor, start_date, end_date, now=None):
+    """
+    Trả về danh sách thời điểm bắt đầu các slot còn trống của bác sĩ
+    trong [start_date, end_date], theo giờ làm thực tế (lịch tuần + override theo ngày).
+    Slot đang giữ cho bệnh nhân trong waitlist cũng không còn trống.
+    Tốn 3 query: lịch tuần, override, lịch hẹn + chỗ giữ (UNION).
+    """
+    from appointments.models import Appointment
+    from appointments.waitlist import held_timeslots
+
+    slot_length = get_slot_length()
+    windows = get_effective_windows(doctor.pk, start_date, end_date)
+    if not windows:
+        return []
+
+    slots = split_windows(windows, slot_length)
+    slots.sort()
+
+    now = now or timezone.now()
+    range_start = max(windows[0][0], now)
+    range_end = max(end for _, end in windows)
+    appointments = Appointment.objects.filter(
+        doctor=doctor,
+        timeslot__gt=range_start - slot_length,
+        timeslot__lt=range_end,
+    ).exclude(status='cancelled').values_list('timeslot', flat=True)
+    held = held_timeslots(doctor.pk, now).filter(
+        offered_timeslot__gt=range_start - slot_length,
+        offered_timeslot__lt=range_end,
+    ).values_list('offered_timeslot', flat=True)
+    booked = list(appointments.union(held).order_by('timeslot'))
+
+    return [slot for slot in subtract_booked(slots, booked, slot_length) if slot >= now]
@@ -1,3 +1,583 @@
-from django.test import TestCase
+import time
+from unittest import mock
+from datetime import date, datetime, time as dtime, timedelta, timezone as dt_timezone
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import IntegrityError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from config.query_plans import QueryPlanAssertionsMixin
+from config.testing import ProfileCacheTestMixin, benchmark, make_doctor, make_patient
+from appointments.models import Appointment, WaitlistEntry
+from users.models import User
+from .dashboard import get_dashboard
+from .availability import get_effective_windows, is_within_hours
+from .models import DoctorProfile, Availability, AvailabilityOverride
+from .profile_cache import LRUCache, profile_cache
+from .serializers import DoctorProfileSerializer
+from .slots import get_free_slots, subtract_booked
+
+
+def aware(*args):
+    return datetime(*args, tzinfo=dt_timezone.utc)
+
+
+# 2026-11-02 là thứ Hai
+MONDAY = date(2026, 11, 2)
+BEFORE = aware(2026, 1, 1)
+
+
+@override_settings(APPOINTMENT_SLOT_MINUTES=30)
+class SlotEngineTests(TestCase):
+    def setUp(self):
+        self.doctor = make_doctor()
+        self.patient = make_patient()
+        Availability.objects.create(doctor=self.doctor, day_of_week='Monday',
+                                    start_time=dtime(8, 0), end_time=dtime(10, 0))
+        Availability.objects.create(doctor=self.doctor, day_of_week='Monday',
+                                    start_time=dtime(13, 0), end_time=dtime(14, 15))
+
+    def test_expands_weekly_windows_into_slots(self):
+        slots = get_free_slots(self.doctor, MONDAY, MONDAY + timedelta(days=7), now=BEFORE)
+        self.assertEqual(len(slots), 2 * (4 + 2))
+        self.assertEqual(slots[0], aware(2026, 11, 2, 8, 0))
+        self.assertEqual(slots[5], aware(2026, 11, 2, 13, 30))
+        self.assertEqual(slots[6], aware(2026, 11, 9, 8, 0))
+
+    def test_booked_slots_are_removed_but_cancelled_are_not(self):
+        Appointment.objects.create(patient=self.patient, doctor=self.doctor,
+                                   timeslot=aware(2026, 11, 2, 8, 30), reason='x')
+        Appointment.objects.create(patient=self.patient, doctor=self.doctor,
+                                   timeslot=aware(2026, 11, 2, 13, 0), reason='x', status='cancelled')
+        # lịch lệch giờ chiếm hai slot
+        Appointment.objects.create(patient=self.patient, doctor=self.doctor,
+                                   timeslot=aware(2026, 11, 2, 9, 15), reason='x', status='confirmed')
+        slots = get_free_slots(self.doctor, MONDAY, MONDAY, now=BEFORE)
+        self.assertEqual(slots, [
+            aware(2026, 11, 2, 8, 0),
+            aware(2026, 11, 2, 13, 0),
+            aware(2026, 11, 2, 13, 30),
+        ])
+
+    def test_held_slots_are_removed_until_hold_expires(self):
+        held = aware(2026, 11, 2, 8, 30)
+        WaitlistEntry.objects.create(patient=self.patient, doctor=self.doctor, start_date=MONDAY, end_date=MONDAY,
+                                     reason='x', status=WaitlistEntry.OFFERED, offered_timeslot=held,
+                                     hold_until=aware(2026, 11, 1, 12, 0))
+        with self.assertNumQueries(3):
+            slots = get_free_slots(self.doctor, MONDAY, MONDAY, now=aware(2026, 11, 1, 11, 0))
+        self.assertNotIn(held, slots)
+        self.assertEqual(len(slots), 5)
+        slots = get_free_slots(self.doctor, MONDAY, MONDAY, now=aware(2026, 11, 1, 12, 0))
+        self.assertIn(held, slots)
+
+    def test_past_slots_are_excluded(self):
+        slots = get_free_slots(self.doctor, MONDAY, MONDAY, now=aware(2026, 11, 2, 9, 0))
+        self.assertEqual(slots[0], aware(2026, 11, 2, 9, 0))
+
+    def test_subtract_booked_sweep(self):
+        length = timedelta(minutes=30)
+        slots = [aware(2026, 11, 2, 8, 0) + i * length for i in range(6)]
+        booked = [aware(2026, 11, 2, 7, 45), aware(2026, 11, 2, 9, 0), aware(2026, 11, 2, 9, 0)]
+        self.assertEqual(subtract_booked(slots, booked, length), [
+            slots[1], slots[3], slots[4], slots[5],
+        ])
+
+
+class DoctorSlotsViewTests(APITestCase):
+    def setUp(self):
+        self.doctor = make_doctor()
+        self.patient = make_patient()
+        self.client.force_authenticate(self.patient.user)
+        Availability.objects.create(doctor=self.doctor, day_of_week='Monday',
+                                    start_time=dtime(8, 0), end_time=dtime(9, 0))
+
+    def test_returns_free_slots(self):
+        url = f'/api/doctors/{self.doctor.id}/slots/'
+        response = self.client.get(url, {'start': '2099-11-02', 'end': '2099-11-08'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['slots']), 60 // response.data['slot_minutes'])
+
+    def test_rejects_bad_range(self):
+        url = f'/api/doctors/{self.doctor.id}/slots/'
+        self.assertEqual(self.client.get(url, {'start': 'abc'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'start': '2099-02-30'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'start': '2099-11-02', 'end': '2099-11-31'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'start': '2099-11-08', 'end': '2099-11-02'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'start': '2099-01-01', 'end': '2099-12-31'}).status_code, 400)
+
+    def test_unknown_doctor(self):
+        self.assertEqual(self.client.get('/api/doctors/999999/slots/').status_code, 404)
+
+
+@override_settings(APPOINTMENT_SLOT_MINUTES=15)
+class BusyDoctorSlotTests(TestCase):
+    """Bác sĩ bận: 6 ngày/tuần, 8h-18h, slot 15 phút, 4 tuần gần kín lịch."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = make_doctor()
+        patient = make_patient()
+        for day in ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday']:
+            Availability.objects.create(doctor=cls.doctor, day_of_week=day,
+                                        start_time=dtime(8, 0), end_time=dtime(12, 0))
+            Availability.objects.create(doctor=cls.doctor, day_of_week=day,
+                                        start_time=dtime(13, 0), end_time=dtime(18, 0))
+        appointments = []
+        for offset in range(28):
+            day = MONDAY + timedelta(days=offset)
+            start = aware(day.year, day.month, day.day, 8, 0)
+            for i in range(40):
+                if i % 5:  # chừa lại 1/5 số slot
+                    appointments.append(Appointment(patient=patient, doctor=cls.doctor, reason='x',
+                                                    timeslot=start + timedelta(minutes=15 * i)))
+        Appointment.objects.bulk_create(appointments)
+
+    def test_four_week_range(self):
+        end = MONDAY + timedelta(days=27)
+        with CaptureQueriesContext(connection) as ctx:
+            slots = get_free_slots(self.doctor, MONDAY, end, now=BEFORE)
+        # lịch tuần, override theo ngày, lịch hẹn
+        self.assertEqual(len(ctx.captured_queries), 3)
+        # mỗi ngày 36 slot, 28 slot đã kín (4 lịch rơi vào giờ nghỉ trưa)
+        self.assertEqual(len(slots), 24 * 8)
+
+
+@benchmark
+class SlotEngineBenchmark(BusyDoctorSlotTests):
+    BUDGET_MS = 100
+
+    def test_four_week_range_under_budget(self):
+        end = MONDAY + timedelta(days=27)
+        started = time.perf_counter()
+        get_free_slots(self.doctor, MONDAY, end, now=BEFORE)
+        self.assertLess((time.perf_counter() - started) * 1000, self.BUDGET_MS)
+
+
+class DoctorQueryPlanTests(QueryPlanAssertionsMixin, APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctors = [make_doctor(f'doc{i}') for i in range(3)]
+        for doctor in cls.doctors:
+            for day in ('Monday', 'Wednesday', 'Friday'):
+                Availability.objects.create(doctor=doctor, day_of_week=day, start_time=dtime(8), end_time=dtime(11))
+
+    def test_slots_endpoint(self):
+        self.client.force_authenticate(make_patient().user)
+        with self.assertNoSequentialScans():
+            self.client.get(f'/api/doctors/{self.doctors[0].id}/slots/', {'start': '2099-11-02', 'end': '2099-11-08'})
+
+    def test_availability_overlap_check(self):
+        # unique_together (doctor, day_of_week, start_time, end_time) đã phục vụ truy vấn chồng khung
+        availability = Availability(
+            doctor=self.doctors[1], day_of_week='Monday', start_time=dtime(13), end_time=dtime(15),
+        )
+        with self.assertNoSequentialScans():
+            availability.full_clean()
+
+
+class LRUCacheTests(TestCase):
+    def test_evicts_least_recently_used(self):
+        lru = LRUCache(maxsize=2, ttl=60)
+        lru.set(1, 'a')
+        lru.set(2, 'b')
+        lru.get(1)
+        lru.set(3, 'c')
+        self.assertEqual((lru.get(1), lru.get(2), lru.get(3)), ('a', None, 'c'))
+        self.assertEqual((lru.hits, lru.misses), (3, 1))
+
+    def test_entries_expire(self):
+        lru = LRUCache(maxsize=2, ttl=0)
+        lru.set(1, 'a')
+        self.assertIsNone(lru.get(1))
+        self.assertEqual(len(lru), 0)
+
+
+class DoctorProfileCacheTests(ProfileCacheTestMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.doctor = make_doctor()
+        self.doctor.user.fullname = 'Lê Minh'
+        self.doctor.user.save()
+        profile_cache.clear()
+
+    def render(self):
+        return DoctorProfileSerializer(DoctorProfile.objects.select_related('user').get(pk=self.doctor.pk)).data
+
+    def test_second_render_is_a_hit(self):
+        self.assertEqual(self.render()['fullname'], 'Lê Minh')
+        self.assertEqual(self.render()['fullname'], 'Lê Minh')
+        stats = profile_cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['size']), (1, 1, 1))
+
+    def test_user_and_profile_saves_invalidate(self):
+        self.render()
+        user = User.objects.get(pk=self.doctor.user_id)
+        user.fullname = 'Lê Minh Khoa'
+        with self.captureOnCommitCallbacks(execute=True):
+            user.save()
+        self.assertEqual(self.render()['fullname'], 'Lê Minh Khoa')
+
+        profile = DoctorProfile.objects.get(pk=self.doctor.pk)
+        profile.specialty = 'Da liễu'
+        with self.captureOnCommitCallbacks(execute=True):
+            profile.save()
+        self.assertEqual(self.render()['specialty'], 'Da liễu')
+
+    def test_get_many_loads_misses_in_one_query(self):
+        other = make_doctor('doc2')
+        self.render()
+        with self.assertNumQueries(1):
+            data = profile_cache.get_many([self.doctor.pk, other.pk])
+        self.assertEqual(set(data), {self.doctor.pk, other.pk})
+        with self.assertNumQueries(0):
+            profile_cache.get_many([self.doctor.pk, other.pk])
+
+    @override_settings(DOCTOR_PROFILE_SHARED_CACHE=True)
+    def test_shared_cache_backs_local_lru(self):
+        self.render()
+        profile_cache.local.clear()
+        with self.assertNumQueries(0):
+            self.assertEqual(profile_cache.get(self.doctor.pk)['fullname'], 'Lê Minh')
+        self.assertEqual(profile_cache.stats()['shared_hits'], 1)
+
+    def test_stats_endpoint_is_admin_only(self):
+        self.client.force_authenticate(self.doctor.user)
+        self.assertEqual(self.client.get('/api/doctors/profile-cache/stats/').status_code, 403)
+        admin = User.objects.create_user(username='admin', user_type='admin')
+        self.client.force_authenticate(admin)
+        response = self.client.get('/api/doctors/profile-cache/stats/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('hit_rate', response.data)
+
+
+class DoctorDashboardTests(QueryPlanAssertionsMixin, APITestCase):
+    # thứ Tư 2026-11-04
+    NOW = aware(2026, 11, 4, 10)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = make_doctor()
+        other = make_doctor('other')
+        patient = make_patient()
+        for doctor, timeslot, status in [
+            (cls.doctor, aware(2026, 11, 4, 8), 'confirmed'),
+            (cls.doctor, aware(2026, 11, 4, 14), 'confirmed'),
+            (cls.doctor, aware(2026, 11, 4, 15), 'pending'),
+            (cls.doctor, aware(2026, 11, 2, 9), 'cancelled'),
+            (cls.doctor, aware(2026, 11, 20, 9), 'confirmed'),
+            (cls.doctor, aware(2026, 12, 1, 9), 'confirmed'),
+            (other, aware(2026, 11, 4, 9), 'confirmed'),
+        ]:
+            Appointment.objects.create(patient=patient, doctor=doctor, timeslot=timeslot, reason='x', status=status)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_dashboard_in_two_queries(self):
+        with self.assertNumQueries(2):
+            data = get_dashboard(self.doctor.id, now=self.NOW)
+        self.assertEqual(data['counts'], {
+            'today': {'pending': 1, 'confirmed': 2, 'cancelled': 0},
+            'week': {'pending': 1, 'confirmed': 2, 'cancelled': 1},
+            'month': {'pending': 1, 'confirmed': 3, 'cancelled': 1},
+        })
+        self.assertEqual([a['timeslot'] for a in data['today_schedule']],
+                         ['2026-11-04T08:00:00Z', '2026-11-04T14:00:00Z'])
+        self.assertEqual(data['next_appointment']['timeslot'], '2026-11-04T14:00:00Z')
+
+        with self.assertNumQueries(0):
+            get_dashboard(self.doctor.id, now=self.NOW)
+
+    def test_next_appointment_beyond_today(self):
+        data = get_dashboard(self.doctor.id, now=aware(2026, 11, 4, 16))
+        self.assertEqual(len(data['today_schedule']), 2)
+        self.assertEqual(data['next_appointment']['timeslot'], '2026-11-20T09:00:00Z')
+
+    def test_cache_invalidated_on_appointment_change(self):
+        get_dashboard(self.doctor.id, now=self.NOW)
+        appointment = Appointment.objects.get(doctor=self.doctor, status='pending')
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment.status = 'confirmed'
+            appointment.save()
+        data = get_dashboard(self.doctor.id, now=self.NOW)
+        self.assertEqual(data['counts']['today'], {'pending': 0, 'confirmed': 3, 'cancelled': 0})
+
+    def test_batch_cancel_invalidates_cache(self):
+        get_dashboard(self.doctor.id, now=self.NOW)
+        self.client.force_authenticate(self.doctor.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/doctors/appointments/batch-cancel/', {'date': '2026-11-04'})
+        self.assertEqual(response.status_code, 200)
+        data = get_dashboard(self.doctor.id, now=self.NOW)
+        self.assertEqual(data['counts']['today'], {'pending': 0, 'confirmed': 2, 'cancelled': 1})
+
+    def test_endpoint(self):
+        self.client.force_authenticate(make_patient('p2').user)
+        self.assertEqual(self.client.get('/api/doctors/dashboard/').status_code, 403)
+        self.client.force_authenticate(self.doctor.user)
+        with mock.patch('django.utils.timezone.now', return_value=self.NOW):
+            response = self.client.get('/api/doctors/dashboard/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['date'], '2026-11-04')
+        self.assertEqual(response.data['counts']['today']['confirmed'], 2)
+
+    def test_queries_use_indexes(self):
+        with self.assertNoSequentialScans():
+            get_dashboard(self.doctor.id, now=self.NOW)
+
+
+class AvailabilityTemplateTests(APITestCase):
+    URL = '/api/doctors/availability/template/'
+
+    def setUp(self):
+        self.doctor = make_doctor()
+        self.other = make_doctor('other')
+        self.morning = Availability.objects.create(doctor=self.doctor, day_of_week='Monday',
+                                                   start_time=dtime(8), end_time=dtime(11))
+        self.afternoon = Availability.objects.create(doctor=self.doctor, day_of_week='Monday',
+                                                     start_time=dtime(13), end_time=dtime(17))
+        self.friday = Availability.objects.create(doctor=self.doctor, day_of_week='Friday',
+                                                  start_time=dtime(8), end_time=dtime(12))
+        self.foreign = Availability.objects.create(doctor=self.other, day_of_week='Monday',
+                                                   start_time=dtime(8), end_time=dtime(11))
+        self.client.force_authenticate(self.doctor.user)
+
+    def put(self, windows, **extra):
+        return self.client.put(self.URL, {'windows': windows, **extra}, format='json')
+
+    def test_list_returns_whole_schedule_unpaginated(self):
+        for day in ('Tuesday', 'Wednesday', 'Thursday', 'Saturday', 'Sunday'):
+            for hour in range(6, 20, 3):
+                Availability.objects.create(doctor=self.doctor, day_of_week=day,
+                                            start_time=dtime(hour), end_time=dtime(hour + 2))
+        response = self.client.get('/api/doctors/availability/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIsInstance(response.data, list)
+        self.assertEqual(len(response.data), 28)
+        expected = Availability.objects.filter(doctor=self.doctor).order_by('day_of_week', 'start_time')
+        self.assertEqual([w['id'] for w in response.data], [w.id for w in expected])
+
+    def current(self):
+        return set(Availability.objects.filter(doctor=self.doctor)
+                   .values_list('day_of_week', 'start_time', 'end_time'))
+
+    def test_applies_diff(self):
+        response = self.put([
+            {'day_of_week': 'Monday', 'start_time': '08:00', 'end_time': '11:00'},
+            {'id': self.afternoon.id, 'day_of_week': 'Monday', 'start_time': '14:00', 'end_time': '18:00'},
+            {'day_of_week': 'Wednesday', 'start_time': '08:00', 'end_time': '12:00'},
+        ])
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual({k: response.data[k] for k in ('created', 'updated', 'deleted', 'unchanged')},
+                         {'created': 1, 'updated': 1, 'deleted': 1, 'unchanged': 1})
+        self.assertEqual(self.current(), {
+            ('Monday', dtime(8), dtime(11)),
+            ('Monday', dtime(14), dtime(18)),
+            ('Wednesday', dtime(8), dtime(12)),
+        })
+        self.assertEqual(len(response.data['windows']), 3)
+        self.assertTrue(Availability.objects.filter(pk=self.afternoon.pk, start_time=dtime(14)).exists())
+        self.assertTrue(Availability.objects.filter(pk=self.foreign.pk).exists())
+
+    def test_swap_windows_by_id(self):
+        response = self.put([
+            {'id': self.morning.id, 'day_of_week': 'Monday', 'start_time': '13:00', 'end_time': '17:00'},
+            {'id': self.afternoon.id, 'day_of_week': 'Monday', 'start_time': '08:00', 'end_time': '11:00'},
+            {'id': self.friday.id, 'day_of_week': 'Friday', 'start_time': '08:00', 'end_time': '12:00'},
+        ])
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(self.current(), {
+            ('Monday', dtime(8), dtime(11)),
+            ('Monday', dtime(13), dtime(17)),
+            ('Friday', dtime(8), dtime(12)),
+        })
+        # một khung được sửa tại chỗ, khung kia xoá + tạo lại để không vướng unique_together
+        self.assertEqual((response.data['updated'], response.data['created'], response.data['deleted']), (1, 1, 1))
+
+    def test_integrity_error_returns_409(self):
+        with mock.patch('doctors.views.apply_template', side_effect=IntegrityError):
+            response = self.put([{'day_of_week': 'Monday', 'start_time': '08:00', 'end_time': '11:00'}])
+        self.assertEqual(response.status_code, 409)
+
+    def test_constant_queries(self):
+        windows = [
+            {'day_of_week': day, 'start_time': f'{hour:02d}:00', 'end_time': f'{hour:02d}:30'}
+            for day, _ in Availability.DAYS_OF_WEEK for hour in range(6, 20)
+        ]
+        # doctor_profile, savepoint, select existing, delete, insert, release, đọc lại kết quả
+        with self.assertNumQueries(7):
+            response = self.put(windows)
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data['created'], 7 * 14)
+        self.assertEqual(len(self.current()), 7 * 14)
+
+    def test_per_window_errors_and_nothing_written(self):
+        before = self.current()
+        response = self.put([
+            {'day_of_week': 'Monday', 'start_time': '08:00', 'end_time': '11:00'},
+            {'day_of_week': 'Monday', 'start_time': '10:00', 'end_time': '12:00'},
+            {'day_of_week': 'Tuesday', 'start_time': '12:00', 'end_time': '09:00'},
+            {'id': self.foreign.id, 'day_of_week': 'Friday', 'start_time': '08:00', 'end_time': '09:00'},
+            {'day_of_week': 'Friday', 'start_time': '13:00', 'end_time': '14:00'},
+        ])
+        self.assertEqual(response.status_code, 400)
+        errors = response.data['windows']
+        self.assertEqual(len(errors), 5)
+        self.assertIn('window #1', errors[0]['non_field_errors'][0])
+        self.assertIn('window #0', errors[1]['non_field_errors'][0])
+        self.assertIn('start_time', errors[2]['non_field_errors'][0])
+        self.assertIn(f'id={self.foreign.id}', errors[3]['non_field_errors'][0])
+        self.assertEqual(errors[4], {})
+        self.assertEqual(self.current(), before)
+
+    def test_field_errors(self):
+        response = self.put([{'day_of_week': 'Funday', 'start_time': '08:00', 'end_time': '09:00'}])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('day_of_week', response.data['windows'][0])
+
+    def test_merge_checks_existing_rows(self):
+        response = self.put([{'day_of_week': 'Friday', 'start_time': '11:00', 'end_time': '13:00'}], replace=False)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(f'id={self.friday.id}', response.data['windows'][0]['non_field_errors'][0])
+
+        response = self.put([{'day_of_week': 'Friday', 'start_time': '12:00', 'end_time': '13:00'}], replace=False)
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data['deleted'], 0)
+        self.assertEqual(len(self.current()), 4)
+
+    def test_nested_overlap_detected(self):
+        response = self.put([
+            {'day_of_week': 'Monday', 'start_time': '08:00', 'end_time': '17:00'},
+            {'day_of_week': 'Monday', 'start_time': '09:00', 'end_time': '10:00'},
+            {'day_of_week': 'Monday', 'start_time': '12:00', 'end_time': '13:00'},
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([bool(e) for e in response.data['windows']], [True, True, True])
+
+    def test_get(self):
+        response = self.client.get(self.URL)
+        self.assertEqual({w['id'] for w in response.data['windows']},
+                         {self.morning.id, self.afternoon.id, self.friday.id})
+
+
+class AvailabilityOverrideTests(QueryPlanAssertionsMixin, APITestCase):
+    TUESDAY = MONDAY + timedelta(days=1)
+
+    def setUp(self):
+        self.doctor = make_doctor()
+        for start, end in ((dtime(8), dtime(12)), (dtime(13), dtime(17))):
+            Availability.objects.create(doctor=self.doctor, day_of_week='Monday', start_time=start, end_time=end)
+
+    def override(self, day, kind, start=None, end=None):
+        return AvailabilityOverride.objects.create(doctor=self.doctor, date=day, kind=kind,
+                                                   start_time=start, end_time=end)
+
+    def hours(self, start, end):
+        return [(s.date(), s.time(), e.time()) for s, e in get_effective_windows(self.doctor.id, start, end)]
+
+    def test_merges_template_and_overrides(self):
+        next_monday = MONDAY + timedelta(days=7)
+        self.override(MONDAY, 'remove', dtime(10), dtime(14))
+        self.override(MONDAY, 'add', dtime(17), dtime(19))
+        self.override(self.TUESDAY, 'add', dtime(9), dtime(11))
+        self.override(next_monday, 'remove')
+        self.override(next_monday, 'add', dtime(18), dtime(20))
+        with self.assertNumQueries(2):
+            hours = self.hours(MONDAY, MONDAY + timedelta(days=14))
+        self.assertEqual(hours, [
+            (MONDAY, dtime(8), dtime(10)),
+            (MONDAY, dtime(14), dtime(19)),
+            (self.TUESDAY, dtime(9), dtime(11)),
+            (next_monday, dtime(18), dtime(20)),
+            (MONDAY + timedelta(days=14), dtime(8), dtime(12)),
+            (MONDAY + timedelta(days=14), dtime(13), dtime(17)),
+        ])
+
+    def test_slots_follow_overrides(self):
+        self.override(MONDAY, 'remove')
+        self.override(self.TUESDAY, 'add', dtime(9), dtime(10))
+        with override_settings(APPOINTMENT_SLOT_MINUTES=30):
+            slots = get_free_slots(self.doctor, MONDAY, self.TUESDAY, now=BEFORE)
+        self.assertEqual(slots, [aware(2026, 11, 3, 9), aware(2026, 11, 3, 9, 30)])
+
+    def test_is_within_hours(self):
+        self.override(MONDAY, 'remove', dtime(8), dtime(9))
+        with self.assertNumQueries(2):
+            self.assertTrue(is_within_hours(self.doctor.id, aware(2026, 11, 2, 9), aware(2026, 11, 2, 9, 30)))
+        self.assertFalse(is_within_hours(self.doctor.id, aware(2026, 11, 2, 8), aware(2026, 11, 2, 8, 30)))
+        self.assertFalse(is_within_hours(self.doctor.id, aware(2026, 11, 2, 11, 45), aware(2026, 11, 2, 12, 15)))
+        self.assertFalse(is_within_hours(self.doctor.id, aware(2026, 11, 3, 9), aware(2026, 11, 3, 9, 30)))
+
+    def test_resolver_uses_indexes(self):
+        with self.assertNoSequentialScans():
+            get_effective_windows(self.doctor.id, MONDAY, MONDAY + timedelta(days=30))
+
+    @override_settings(APPOINTMENT_REQUIRE_AVAILABILITY=True, APPOINTMENT_SLOT_MINUTES=30)
+    def test_booking_validation(self):
+        self.override(date(2099, 11, 2), 'remove')
+        patient = make_patient()
+        self.client.force_authenticate(patient.user)
+
+        def book(timeslot):
+            return self.client.post('/api/patients/booking/', {
+                'doctor': self.doctor.id, 'timeslot': timeslot, 'reason': 'khám'})
+
+        self.assertEqual(book('2099-11-09T08:00:00Z').status_code, 201)
+        response = book('2099-11-02T08:00:00Z')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('timeslot', response.data)
+        self.assertEqual(book('2099-11-09T11:45:00Z').status_code, 400)
+
+    def test_api(self):
+        self.client.force_authenticate(self.doctor.user)
+        url = '/api/doctors/availability/overrides/'
+        response = self.client.post(url, {'date': '2026-12-24', 'kind': 'remove', 'reason': 'Nghỉ lễ'})
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertIsNone(response.data['start_time'])
+        self.assertEqual(self.client.post(url, {'date': '2026-12-26', 'kind': 'add'}).status_code, 400)
+        response = self.client.post(url, {'date': '2026-12-26', 'kind': 'add', 'start_time': '10:00', 'end_time': '09:00'})
+        self.assertEqual(response.status_code, 400)
+        self.client.post(url, {'date': '2027-01-02', 'kind': 'add', 'start_time': '08:00', 'end_time': '11:00'})
+
+        response = self.client.get(url, {'start': '2026-12-01', 'end': '2026-12-31'})
+        self.assertEqual([o['date'] for o in response.data], ['2026-12-24'])
+        self.assertEqual(self.client.get(url, {'start': 'abc'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'end': '2026-02-30'}).status_code, 400)
+
+        override_id = response.data[0]['id']
+        response = self.client.patch(f'{url}{override_id}/', {'start_time': '08:00'})
+        self.assertEqual(response.status_code, 400)
+
+        self.client.force_authenticate(make_doctor('other').user)
+        self.assertEqual(self.client.get(f'{url}{override_id}/').status_code, 404)
+
+
+class ProfileCacheIsolationTests(ProfileCacheTestMixin, TestCase):
+    def test_override_settings_rebuilds_cache(self):
+        doctor = make_doctor()
+        profile_cache.get_many([doctor.id])
+        self.assertEqual(len(profile_cache.local), 1)
+        with override_settings(DOCTOR_PROFILE_CACHE_SIZE=5):
+            self.assertEqual(profile_cache.local.maxsize, 5)
+            self.assertEqual(len(profile_cache.local), 0)
+        self.assertEqual(profile_cache.local.maxsize, 1000)
+
+    def test_cache_starts_empty_for_each_test(self):
+        # ProfileCacheTestMixin xoá cache trước và sau mỗi test
+        self.assertEqual(len(profile_cache.local), 0)
+        profile_cache.set(1, {'fullname': 'stale'})
+
+    def test_cache_starts_empty_for_each_test_again(self):
+        self.assertEqual(len(profile_cache.local), 0)
+        profile_cache.set(1, {'fullname': 'stale'})
+
+    def test_new_profile_with_reused_id_drops_stale_entry(self):
+        doctor = make_doctor()
+        profile_cache.set(doctor.id + 1, {'fullname': 'stale'})
+        # entry còn sót lại của test trước có cùng id: signal post_save xoá khi profile được tạo
+        second = make_doctor('doc2')
+        self.assertEqual(second.id, doctor.id + 1)
+        self.assertIsNone(profile_cache.get(second.id))
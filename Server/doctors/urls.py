@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import DoctorMeView, AvailabilityListCreateView, AvailabilityDetailView
+from .views import DoctorMeView, AvailabilityListCreateView, AvailabilityDetailView, AvailabilityTemplateView, AvailabilityOverrideListCreateView, AvailabilityOverrideDetailView, DoctorSlotsView, DoctorProfileCacheStatsView, DoctorDashboardView
 from appointments.views import AppointmentViewSet
 from records.views      import MedicalRecordViewSet
 
@@ -13,7 +13,13 @@ router.register(r'records',      MedicalRecordViewSet, basename='records')
 urlpatterns = [
     path('profile/',        DoctorMeView.as_view(),                  name='doctor-me'),
     path('availability/',      AvailabilityListCreateView.as_view(),   name='availability-list'),
+    path('availability/template/', AvailabilityTemplateView.as_view(), name='availability-template'),
+    path('availability/overrides/', AvailabilityOverrideListCreateView.as_view(), name='availability-override-list'),
+    path('availability/overrides/<int:id>/', AvailabilityOverrideDetailView.as_view(), name='availability-override-detail'),
     path('availability/<int:id>/', AvailabilityDetailView.as_view(),   name='availability-detail'),
+    path('<int:id>/slots/',        DoctorSlotsView.as_view(),          name='doctor-slots'),
+    path('profile-cache/stats/',   DoctorProfileCacheStatsView.as_view(), name='doctor-profile-cache-stats'),
+    path('dashboard/',             DoctorDashboardView.as_view(),      name='doctor-dashboard'),
 
     # nối luôn router
     path('', include(router.urls)),
@@ -1,25 +1,49 @@
-from rest_framework import generics
+from datetime import timedelta
+
+from django.db import IntegrityError
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework import generics, status
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from users.permissions import IsDoctor
-from .models import DoctorProfile, Availability
-from .serializers import DoctorProfileSerializer, AvailabilitySerializer
+from rest_framework.views import APIView
+from rest_framework.exceptions import ValidationError
+from users.permissions import IsAdmin, IsDoctor
+from .models import DoctorProfile, Availability, AvailabilityOverride
+from .dashboard import get_dashboard
+from .profile_cache import profile_cache
+from .availability import apply_template
+from .serializers import (
+    DoctorProfileSerializer, AvailabilitySerializer, AvailabilityTemplateSerializer, AvailabilityOverrideSerializer,
+)
+from .slots import get_free_slots, get_slot_length
 from appointments.models import Appointment
 from appointments.serializers import AppointmentSerializer
 from records.serializers import MedicalRecordSerializer
 
+def current_doctor_id(request):
+    # token có sẵn doctor_profile_id (users.authentication); user dựng từ DB thì tra bảng
+    doctor_id = getattr(request.user, 'doctor_profile_id', None)
+    if doctor_id is None:
+        doctor_id = get_object_or_404(DoctorProfile, user=request.user).id
+    return doctor_id
+
 # 1. Me / Profile
 class DoctorMeView(generics.RetrieveUpdateAPIView):
     serializer_class   = DoctorProfileSerializer
     permission_classes = [IsAuthenticated, IsDoctor]
 
     def get_object(self):
-        return self.request.user.doctor_profile
+        # serializer lưu cả profile.user: lấy user thật thay vì user dựng từ claim
+        return get_object_or_404(DoctorProfile.objects.select_related('user'), user_id=self.request.user.pk)
 
 # 2. Availability
 class AvailabilityListCreateView(generics.ListCreateAPIView):
     serializer_class   = AvailabilitySerializer
     permission_classes = [IsAuthenticated, IsDoctor]
+    # cả lịch tuần (ít dòng), trả nguyên danh sách theo Meta.ordering, không phân trang
+    pagination_class   = None
     def get_queryset(self):
         return self.request.user.doctor_profile.availabilities.all()
     def perform_create(self, serializer):
@@ -31,3 +55,147 @@ class AvailabilityDetailView(generics.RetrieveUpdateDestroyAPIView):
     lookup_field       = 'id'
     def get_queryset(self):
         return self.request.user.doctor_profile.availabilities.all()
+
+class AvailabilityTemplateView(APIView):
+    """
+    GET /api/doctors/availability/template/: lịch làm việc tuần hiện tại.
+    PUT /api/doctors/availability/template/ {"windows": [...], "replace": true}
+    Ghi cả lịch tuần một lần: validate mọi khung với nhau (và với các khung được giữ
+    lại khi replace=false), lỗi trả theo từng window; hợp lệ thì áp dụng phần chênh
+    lệch (tạo / sửa / xoá) trong một transaction.
+    """
+    permission_classes = [IsAuthenticated, IsDoctor]
+
+    def get(self, request):
+        windows = Availability.objects.filter(doctor_id=current_doctor_id(request))
+        return Response({'windows': AvailabilitySerializer(windows, many=True).data})
+
+    def put(self, request):
+        serializer = AvailabilityTemplateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        doctor_id = current_doctor_id(request)
+        try:
+            plan = apply_template(doctor_id, serializer.validated_data['windows'],
+                                  replace=serializer.validated_data['replace'])
+        except IntegrityError:
+            return Response(
+                {"detail": "Lịch làm việc vừa bị thay đổi bởi request khác, vui lòng thử lại."},
+                status=status.HTTP_409_CONFLICT,
+            )
+        if not plan.valid:
+            raise ValidationError({'windows': plan.errors})
+        windows = Availability.objects.filter(doctor_id=doctor_id)
+        return Response({
+            'created': len(plan.to_create),
+            'updated': len(plan.to_update),
+            'deleted': len(plan.to_delete),
+            'unchanged': len(plan.unchanged),
+            'windows': AvailabilitySerializer(windows, many=True).data,
+        })
+
+class AvailabilityOverrideListCreateView(generics.ListCreateAPIView):
+    """
+    GET/POST /api/doctors/availability/overrides/?start=YYYY-MM-DD&end=YYYY-MM-DD
+    Ngoại lệ theo ngày (nghỉ, thêm ca) của bác sĩ đang đăng nhập.
+    """
+    serializer_class   = AvailabilityOverrideSerializer
+    permission_classes = [IsAuthenticated, IsDoctor]
+    # danh sách ngoại lệ theo ngày, ít dòng: trả nguyên danh sách theo Meta.ordering
+    pagination_class   = None
+
+    def get_queryset(self):
+        queryset = AvailabilityOverride.objects.filter(doctor_id=current_doctor_id(self.request))
+        for param, lookup in (('start', 'date__gte'), ('end', 'date__lte')):
+            value = self.request.query_params.get(param)
+            if value:
+                try:
+                    parsed = parse_date(value)
+                except ValueError:
+                    # đúng dạng nhưng không phải ngày có thật, vd. 2026-02-30
+                    parsed = None
+                if parsed is None:
+                    raise ValidationError({param: "Không đúng định dạng YYYY-MM-DD."})
+                queryset = queryset.filter(**{lookup: parsed})
+        return queryset
+
+    def perform_create(self, serializer):
+        serializer.save(doctor_id=current_doctor_id(self.request))
+
+class AvailabilityOverrideDetailView(generics.RetrieveUpdateDestroyAPIView):
+    serializer_class   = AvailabilityOverrideSerializer
+    permission_classes = [IsAuthenticated, IsDoctor]
+    lookup_field       = 'id'
+    def get_queryset(self):
+        return AvailabilityOverride.objects.filter(doctor_id=current_doctor_id(self.request))
+
+# 3. Slot trống để đặt lịch
+class DoctorSlotsView(APIView):
+    """
+    GET /api/doctors/<id>/slots/?start=YYYY-MM-DD&end=YYYY-MM-DD
+    Trả về các slot còn trống của bác sĩ (id = DoctorProfile id).
+    Mặc định 7 ngày kể từ hôm nay, tối đa MAX_RANGE_DAYS ngày.
+    """
+    permission_classes = [IsAuthenticated]
+    DEFAULT_RANGE_DAYS = 7
+    MAX_RANGE_DAYS     = 62
+
+    def get(self, request, id):
+        doctor = get_object_or_404(DoctorProfile, pk=id)
+
+        start_param = request.query_params.get('start')
+        end_param   = request.query_params.get('end')
+        try:
+            start = parse_date(start_param) if start_param else timezone.localdate()
+        except ValueError:
+            start = None
+        if start is None:
+            return Response({"detail": "start không đúng định dạng YYYY-MM-DD."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            end = parse_date(end_param) if end_param else start + timedelta(days=self.DEFAULT_RANGE_DAYS - 1)
+        except ValueError:
+            end = None
+        if end is None:
+            return Response({"detail": "end không đúng định dạng YYYY-MM-DD."}, status=status.HTTP_400_BAD_REQUEST)
+        if end < start:
+            return Response({"detail": "end phải sau hoặc bằng start."}, status=status.HTTP_400_BAD_REQUEST)
+        if (end - start).days >= self.MAX_RANGE_DAYS:
+            return Response(
+                {"detail": f"Chỉ được truy vấn tối đa {self.MAX_RANGE_DAYS} ngày."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        slot_length = get_slot_length()
+        slots = get_free_slots(doctor, start, end)
+        return Response({
+            'doctor': doctor.id,
+            'start': start,
+            'end': end,
+            'slot_minutes': int(slot_length.total_seconds() // 60),
+            'slots': [
+                {'start': slot.isoformat(), 'end': (slot + slot_length).isoformat()}
+                for slot in slots
+            ],
+        })
+
+
+class DoctorProfileCacheStatsView(APIView):
+    """
+    GET /api/doctors/profile-cache/stats/
+    Thống kê hit/miss của cache profile bác sĩ trong worker xử lý request này.
+    """
+    permission_classes = [IsAuthenticated, IsAdmin]
+
+    def get(self, request):
+        return Response(profile_cache.stats())
+
+
+class DoctorDashboardView(APIView):
+    """
+    GET /api/doctors/dashboard/
+    Lịch confirmed hôm nay, số lịch hẹn theo status trong hôm nay/tuần này/tháng này
+    và lịch hẹn confirmed kế tiếp của bác sĩ đang đăng nhập.
+    """
+    permission_classes = [IsAuthenticated, IsDoctor]
+
+    def get(self, request):
+        return Response(get_dashboard(current_doctor_id(request)))
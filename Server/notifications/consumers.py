@@ -1,26 +1,86 @@
+from urllib.parse import parse_qs
+
 from channels.generic.websocket import AsyncWebsocketConsumer
 import json
 
+from .models import Notification
+from .outbox import build_event, get_replay_limit, notification_group
+
+
 class NotificationConsumer(AsyncWebsocketConsumer):
+    """
+    ws/notifications/?last_seen_id=<id>
+
+    Có last_seen_id thì sau khi accept, gửi lại các notification có id lớn hơn
+    (tăng dần theo id), rồi gửi {"event": "replay_complete", ...} trước khi
+    chuyển sang nhận trực tiếp. Nếu quá NOTIFICATION_REPLAY_LIMIT thì
+    truncated = true và client nên tải lại danh sách qua REST.
+    """
+
     async def connect(self):
+        # scope["user"] do users.middleware.JWTAuthMiddleware gán từ JWT
         self.user = self.scope["user"]
         if not self.user.is_authenticated:
             await self.close()
             return
 
-        self.room_name = f"user_{self.user.id}_notifications"
+        # join group trước khi query: notification gửi trong lúc replay sẽ xếp hàng
+        # chờ tới khi connect() xong, không bị mất
+        self.replayed_ids = set()
+        self.room_name = notification_group(self.user.id)
         await self.channel_layer.group_add(
             self.room_name,
             self.channel_name
         )
-        await self.accept()
+        # token gửi qua subprotocol thì phải chọn lại subprotocol đó, trình duyệt mới nhận kết nối
+        await self.accept(subprotocol=self.scope.get("auth_subprotocol"))
+
+        last_seen_id = self.get_last_seen_id()
+        if last_seen_id is not None:
+            await self.replay_missed(last_seen_id)
+
+    def get_last_seen_id(self):
+        values = parse_qs(self.scope.get("query_string", b"").decode()).get("last_seen_id")
+        try:
+            return int(values[0]) if values else None
+        except ValueError:
+            return None
+
+    async def replay_missed(self, last_seen_id):
+        limit = get_replay_limit()
+        missed = (
+            Notification.objects.filter(recipient_id=self.user.id, id__gt=last_seen_id)
+            .order_by("id").only("id", "message", "created_at")[:limit + 1]
+        )
+        count, truncated = 0, False
+        async for notification in missed:
+            if count == limit:
+                truncated = True
+                break
+            self.replayed_ids.add(notification.id)
+            await self.send(text_data=json.dumps(build_event(notification)["data"]))
+            count += 1
+        await self.send(text_data=json.dumps({
+            "event": "replay_complete", "count": count, "truncated": truncated,
+        }))
 
     async def disconnect(self, close_code):
+        if not hasattr(self, "room_name"):
+            return
         await self.channel_layer.group_discard(
             self.room_name,
             self.channel_name
         )
 
+    async def read_state_changed(self, event):
+        # tab khác vừa đánh dấu đã đọc (xem notifications.services.mark_read)
+        await self.send(text_data=json.dumps(event["data"]))
+
     async def notification_message(self, event):
+        # đã gửi trong lúc replay (dispatcher đẩy trễ hơn lúc query) thì bỏ qua
+        notification_id = event["data"]["id"]
+        if notification_id in self.replayed_ids:
+            self.replayed_ids.discard(notification_id)
+            return
         # Gửi notification tới client
-        await self.send(text_data=json.dumps(event["data"]))
\ No newline at end of file
+        await self.send(text_data=json.dumps(event["data"]))
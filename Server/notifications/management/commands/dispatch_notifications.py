@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from notifications.outbox import dispatch_events, dispatch_pending, get_batch_size
+
+
+class Command(BaseCommand):
+    help = ("Gửi các notification đang chờ và sự kiện tạm thời (PushEvent) trong outbox "
+            "qua channel layer (chạy như một process riêng).")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help="Số notification mỗi batch (mặc định NOTIFICATION_DISPATCH_BATCH_SIZE).")
+        parser.add_argument('--interval', type=float, default=0.5,
+                            help="Số giây nghỉ khi outbox rỗng.")
+        parser.add_argument('--once', action='store_true',
+                            help="Xả hết outbox một lần rồi thoát.")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size'] or get_batch_size()
+        total_delivered = total_failed = 0
+        try:
+            while True:
+                delivered, failed = dispatch_pending(batch_size=batch_size)
+                total_delivered += delivered
+                total_failed += failed
+                if delivered or failed:
+                    self.stdout.write(f"delivered={delivered} failed={failed}")
+                events_sent, events_failed = dispatch_events(batch_size=batch_size)
+                # batch đầy -> còn việc, chạy tiếp ngay; ngược lại thì nghỉ
+                if delivered + failed < batch_size and events_sent + events_failed < batch_size:
+                    if options['once']:
+                        break
+                    time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(
+            f"Tổng cộng: delivered={total_delivered} failed={total_failed}"
+        ))
@@ -0,0 +1,55 @@
+import argparse
+
+from django.core.management.base import BaseCommand, CommandError
+
+from notifications.retention import ACTIONS, RetentionPolicy, run_retention
+
+
+class Command(BaseCommand):
+    help = ("Dọn notification cũ theo chính sách lưu giữ (NOTIFICATION_RETENTION_*): "
+            "xoá hoặc lưu trữ theo từng batch, có thể gộp vào digest của user.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--read-days', type=int, default=None,
+                            help="Dọn notification đã đọc cũ hơn N ngày (0: giữ lại).")
+        parser.add_argument('--unread-days', type=int, default=None,
+                            help="Dọn notification chưa đọc cũ hơn N ngày (0: giữ lại).")
+        parser.add_argument('--action', choices=ACTIONS, default=None,
+                            help="delete: xoá hẳn; archive: chuyển sang bảng lưu trữ.")
+        parser.add_argument('--digest', action=argparse.BooleanOptionalAction, default=None,
+                            help="Cộng dồn số notification đã dọn vào digest của từng user.")
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--pause', type=float, default=0,
+                            help="Số giây nghỉ giữa các batch.")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Chỉ đếm số notification sẽ bị dọn.")
+
+    def handle(self, *args, **options):
+        try:
+            policy = RetentionPolicy.from_settings(
+                read_days=options['read_days'],
+                unread_days=options['unread_days'],
+                action=options['action'],
+                digest=options['digest'],
+                batch_size=options['batch_size'],
+            )
+        except ValueError as exc:
+            raise CommandError(exc)
+
+        self.stdout.write(
+            f"Chính sách: read_days={policy.read_days} unread_days={policy.unread_days} "
+            f"action={policy.action} digest={policy.digest} batch_size={policy.batch_size}"
+        )
+
+        def progress(result):
+            percent = 100 * result.processed / result.matched if result.matched else 100
+            self.stdout.write(f"Batch {result.batches}: {result.processed}/{result.matched} ({percent:.1f}%)")
+
+        result = run_retention(policy, dry_run=options['dry_run'], progress=progress, pause=options['pause'])
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f"[dry-run] Sẽ dọn {result.matched} notification."))
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f"Đã dọn {result.processed} notification ({result.archived} lưu trữ) "
+            f"trong {result.batches} batch; digest cho {len(result.digested_users)} user."
+        ))
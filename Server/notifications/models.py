@@ -1,29 +1,108 @@
 from django.db import models
 from django.conf import settings
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
+
 
 class Notification(models.Model):
+    """
+    Notification đồng thời là outbox: row được ghi trong cùng transaction với
+    nghiệp vụ (đặt lịch, xác nhận...), sau khi commit thì process
+    `manage.py dispatch_notifications` đọc các row pending và đẩy qua channel layer.
+    Request HTTP không còn phụ thuộc vào Redis.
+    """
+    DELIVERY_PENDING   = 'pending'
+    DELIVERY_DELIVERED = 'delivered'
+    DELIVERY_FAILED    = 'failed'
+    DELIVERY_STATUS_CHOICES = [
+        (DELIVERY_PENDING, 'Pending'),
+        (DELIVERY_DELIVERED, 'Delivered'),
+        (DELIVERY_FAILED, 'Failed'),
+    ]
+
     recipient = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='notifications')
     message = models.TextField()
     read = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # trạng thái gửi qua websocket
+    delivery_status   = models.CharField(max_length=10, choices=DELIVERY_STATUS_CHOICES, default=DELIVERY_PENDING)
+    delivery_attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at   = models.DateTimeField(null=True, blank=True)
+    delivered_at      = models.DateTimeField(null=True, blank=True)
+    last_error        = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            # NotificationListView: recipient = ? ORDER BY created_at DESC, id DESC
+            models.Index(fields=['recipient', '-created_at', '-id'], name='notif_recipient_created_idx'),
+            # websocket replay khi kết nối lại: recipient = ? AND id > last_seen_id ORDER BY id
+            models.Index(fields=['recipient', 'id'], name='notif_recipient_id_idx'),
+            # job dọn dẹp (notifications.retention): notification đã đọc theo thời gian tạo
+            models.Index(
+                fields=['created_at', 'id'],
+                condition=models.Q(read=True),
+                name='notif_read_created_idx',
+            ),
+            # đếm / liệt kê notification chưa đọc; row đã đọc (đa số) không nằm trong index
+            models.Index(
+                fields=['recipient', '-created_at', '-id'],
+                condition=models.Q(read=False),
+                name='notif_recipient_unread_idx',
+            ),
+            # dispatcher: chỉ quét các row còn chờ gửi
+            models.Index(
+                fields=['id'],
+                condition=models.Q(delivery_status='pending'),
+                name='notif_pending_delivery_idx',
+            ),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # nhớ cờ read lúc đọc để signal cập nhật bộ đếm chưa đọc (xem notifications.signals)
+        instance._loaded_read = instance.__dict__.get('read')
+        return instance
+
     def __str__(self):
         return f"To {self.recipient}: {self.message[:30]}{'...' if len(self.message) > 30 else ''}"
 
-    def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        # Gửi notification qua WebSocket
-        channel_layer = get_channel_layer()
-        async_to_sync(channel_layer.group_send)(
-            f"user_{self.recipient.id}_notifications",
-            {
-                "type": "notification_message",
-                "data": {
-                    "id": self.id,
-                    "message": self.message,
-                    "created_at": self.created_at.isoformat(),
-                }
-            }
-        )
+
+class NotificationArchive(models.Model):
+    """Bản lưu trữ của notification đã được dọn khỏi bảng chính (xem notifications.retention)."""
+    id = models.BigIntegerField(primary_key=True)  # giữ nguyên id gốc
+    recipient = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE,
+                                  related_name='archived_notifications')
+    message = models.TextField()
+    read = models.BooleanField(default=False)
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"[archived] To {self.recipient_id}: {self.message[:30]}"
+
+
+class NotificationDigest(models.Model):
+    """Một row cho mỗi user, gộp các notification cũ đã dọn: số lượng và khoảng thời gian."""
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE,
+                                primary_key=True, related_name='notification_digest')
+    compacted_count = models.PositiveIntegerField(default=0)
+    oldest_at = models.DateTimeField(null=True, blank=True)
+    newest_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Digest of {self.user_id}: {self.compacted_count} notifications"
+
+
+class PushEvent(models.Model):
+    """
+    Outbox cho sự kiện websocket tạm thời (vd. read_state_changed): ghi trong cùng
+    transaction với thao tác, dispatcher (manage.py dispatch_notifications) gửi rồi xoá.
+    Không gửi lại khi lỗi: client vẫn đồng bộ lại được qua REST.
+    """
+    recipient = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    event = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.event.get('type')} to {self.recipient_id}"
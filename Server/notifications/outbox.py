@@ -0,0 +1,164 @@
+import asyncio
+import logging
+from datetime import timedelta
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Notification, PushEvent
+
+logger = logging.getLogger(__name__)
+
+
+def notification_group(user_id):
+    return f"user_{user_id}_notifications"
+
+
+def build_event(notification):
+    return {
+        "type": "notification_message",
+        "data": {
+            "id": notification.id,
+            "message": notification.message,
+            "created_at": notification.created_at.isoformat(),
+        },
+    }
+
+
+def get_batch_size():
+    return getattr(settings, 'NOTIFICATION_DISPATCH_BATCH_SIZE', 100)
+
+
+def get_max_attempts():
+    return getattr(settings, 'NOTIFICATION_MAX_DELIVERY_ATTEMPTS', 5)
+
+
+def get_claim_lease():
+    # batch đã nhận bị bỏ dở (dispatcher chết khi đang gửi) sẽ được nhận lại sau khoảng này
+    return timedelta(seconds=getattr(settings, 'NOTIFICATION_DISPATCH_LEASE_SECONDS', 60))
+
+
+def get_replay_limit():
+    return getattr(settings, 'NOTIFICATION_REPLAY_LIMIT', 200)
+
+
+def get_retry_delay(attempts):
+    # backoff luỹ thừa: 2s, 4s, 8s...
+    return timedelta(seconds=getattr(settings, 'NOTIFICATION_RETRY_SECONDS', 2) * 2 ** (attempts - 1))
+
+
+async def _group_send_all(channel_layer, messages):
+    """
+    messages: [(id, user_id, event)]. Gửi đồng thời cả batch để các lệnh tới Redis
+    được pipeline thay vì chờ từng round trip. Trả về {id: lỗi} của các lệnh thất bại.
+    """
+    results = await asyncio.gather(
+        *(channel_layer.group_send(notification_group(user_id), event) for _, user_id, event in messages),
+        return_exceptions=True,
+    )
+    return {
+        message_id: repr(result)
+        for (message_id, _, _), result in zip(messages, results)
+        if isinstance(result, Exception)
+    }
+
+
+async def _send_batch(channel_layer, notifications):
+    # lỗi Redis/kết nối: để lại cho lần thử sau
+    return await _group_send_all(channel_layer, [
+        (notification.id, notification.recipient_id, build_event(notification)) for notification in notifications
+    ])
+
+
+def dispatch_events(batch_size=None, channel_layer=None):
+    """
+    Gửi một batch sự kiện tạm thời (PushEvent). Batch được nhận và xoá trong một
+    transaction ngắn rồi mới gửi; sự kiện gửi lỗi chỉ ghi log, không thử lại.
+    Trả về (số đã gửi, số lỗi).
+    """
+    batch_size = batch_size or get_batch_size()
+    channel_layer = channel_layer or get_channel_layer()
+    with transaction.atomic():
+        events = list(PushEvent.objects.order_by('id').select_for_update(skip_locked=True)[:batch_size])
+        if not events:
+            return 0, 0
+        PushEvent.objects.filter(id__in=[e.id for e in events]).delete()
+
+    errors = async_to_sync(_group_send_all)(channel_layer, [(e.id, e.recipient_id, e.event) for e in events])
+    for event in events:
+        if event.id in errors:
+            logger.warning("Không gửi được sự kiện %s cho user %s: %s",
+                           event.event.get("type"), event.recipient_id, errors[event.id])
+    return len(events) - len(errors), len(errors)
+
+
+def claim_batch(batch_size, now=None):
+    """
+    Nhận một batch notification đang chờ (đã commit) trong một transaction ngắn:
+    dời next_attempt_at của batch tới hết hạn nhận, dispatcher khác sẽ bỏ qua các
+    row này. Trên PostgreSQL SKIP LOCKED để các dispatcher song song không chờ nhau.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        batch = list(
+            Notification.objects.filter(delivery_status=Notification.DELIVERY_PENDING)
+            .filter(Q(next_attempt_at__isnull=True) | Q(next_attempt_at__lte=now))
+            .order_by('id')
+            .only('id', 'recipient_id', 'message', 'created_at', 'delivery_attempts')
+            .select_for_update(skip_locked=True)[:batch_size]
+        )
+        if batch:
+            Notification.objects.filter(id__in=[n.id for n in batch]).update(next_attempt_at=now + get_claim_lease())
+    return batch
+
+
+def dispatch_pending(batch_size=None, channel_layer=None):
+    """
+    Nhận một batch notification đang chờ, gửi qua channel layer rồi ghi lại
+    trạng thái gửi. Trả về (số đã gửi, số lỗi).
+
+    Việc gửi tới Redis nằm ngoài transaction nên không giữ khoá row (và không
+    chặn autovacuum) trong lúc chờ mạng; chỉ bước nhận và bước ghi kết quả là
+    transaction ngắn.
+    """
+    batch_size = batch_size or get_batch_size()
+    channel_layer = channel_layer or get_channel_layer()
+    now = timezone.now()
+
+    batch = claim_batch(batch_size, now)
+    if not batch:
+        return 0, 0
+
+    errors = async_to_sync(_send_batch)(channel_layer, batch)
+
+    with transaction.atomic():
+        delivered_ids = [n.id for n in batch if n.id not in errors]
+        if delivered_ids:
+            Notification.objects.filter(id__in=delivered_ids).update(
+                delivery_status=Notification.DELIVERY_DELIVERED,
+                delivery_attempts=F('delivery_attempts') + 1,
+                delivered_at=timezone.now(),
+                next_attempt_at=None,
+                last_error='',
+            )
+
+        max_attempts = get_max_attempts()
+        for notification in batch:
+            if notification.id not in errors:
+                continue
+            attempts = notification.delivery_attempts + 1
+            failed = attempts >= max_attempts
+            Notification.objects.filter(id=notification.id).update(
+                delivery_status=Notification.DELIVERY_FAILED if failed else Notification.DELIVERY_PENDING,
+                delivery_attempts=attempts,
+                next_attempt_at=None if failed else now + get_retry_delay(attempts),
+                last_error=errors[notification.id],
+            )
+            logger.warning("Gửi notification %s thất bại (lần %s): %s",
+                           notification.id, attempts, errors[notification.id])
+
+    return len(delivered_ids), len(errors)
@@ -0,0 +1,163 @@
+import time
+from collections import Counter
+from dataclasses import dataclass, field, replace
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from users.counters import apply_deltas
+from .models import Notification, NotificationArchive, NotificationDigest
+
+ACTION_DELETE = 'delete'
+ACTION_ARCHIVE = 'archive'
+ACTIONS = (ACTION_DELETE, ACTION_ARCHIVE)
+
+
+@dataclass(frozen=True)
+class RetentionPolicy:
+    """
+    Chính sách dọn bảng Notification.
+
+    read_days / unread_days: dọn notification đã đọc / chưa đọc cũ hơn N ngày
+    (0 hoặc None: giữ lại). action: 'delete' xoá hẳn, 'archive' chuyển sang
+    NotificationArchive. digest: cộng dồn số notification đã dọn vào
+    NotificationDigest của từng user.
+    """
+    read_days: int | None = 90
+    unread_days: int | None = None
+    action: str = ACTION_DELETE
+    digest: bool = False
+    batch_size: int = 1000
+
+    @classmethod
+    def from_settings(cls, **overrides):
+        policy = cls(
+            read_days=getattr(settings, 'NOTIFICATION_RETENTION_READ_DAYS', 90),
+            unread_days=getattr(settings, 'NOTIFICATION_RETENTION_UNREAD_DAYS', 0),
+            action=getattr(settings, 'NOTIFICATION_RETENTION_ACTION', ACTION_DELETE),
+            digest=getattr(settings, 'NOTIFICATION_RETENTION_DIGEST', False),
+            batch_size=getattr(settings, 'NOTIFICATION_RETENTION_BATCH_SIZE', 1000),
+        )
+        # None = không ghi đè (vd. option không truyền trên command line)
+        return replace(policy, **{name: value for name, value in overrides.items() if value is not None})
+
+    def __post_init__(self):
+        if self.action not in ACTIONS:
+            raise ValueError(f"action phải là một trong {ACTIONS}")
+        if self.batch_size < 1:
+            raise ValueError("batch_size phải >= 1")
+
+    def scopes(self, now):
+        """Các queryset cần dọn, mỗi cái đi theo một index (đã đọc / chưa đọc)."""
+        # row còn chờ dispatcher gửi thì chưa được đụng tới
+        base = Notification.objects.exclude(delivery_status=Notification.DELIVERY_PENDING)
+        scopes = []
+        if self.read_days:
+            scopes.append(base.filter(read=True, created_at__lt=now - timedelta(days=self.read_days)))
+        if self.unread_days:
+            scopes.append(base.filter(read=False, created_at__lt=now - timedelta(days=self.unread_days)))
+        return scopes
+
+
+@dataclass
+class RetentionResult:
+    matched: int = 0
+    processed: int = 0
+    archived: int = 0
+    batches: int = 0
+    digested_users: set = field(default_factory=set)
+
+
+def run_retention(policy, now=None, dry_run=False, progress=None, pause=0):
+    """
+    Dọn notification theo `policy` thành nhiều batch, mỗi batch một transaction
+    ngắn (khoá tối đa batch_size row, bỏ qua row đang bị khoá) để không chặn
+    các request đang ghi vào bảng.
+
+    dry_run chỉ đếm số row sẽ bị dọn. progress(result) được gọi sau mỗi batch;
+    pause là số giây nghỉ giữa các batch để giảm tải cho DB.
+    """
+    now = now or timezone.now()
+    result = RetentionResult()
+    scopes = policy.scopes(now)
+    result.matched = sum(scope.count() for scope in scopes)
+    if dry_run:
+        return result
+
+    for scope in scopes:
+        while True:
+            done = _process_batch(scope, policy, result)
+            if not done:
+                break
+            result.batches += 1
+            if progress:
+                progress(result)
+            if done < policy.batch_size:
+                break
+            if pause:
+                time.sleep(pause)
+    return result
+
+
+def _process_batch(scope, policy, result):
+    fields = ['id', 'recipient_id', 'read', 'created_at']
+    if policy.action == ACTION_ARCHIVE:
+        fields.append('message')
+
+    with transaction.atomic():
+        rows = list(
+            scope.order_by('created_at', 'id')
+            .select_for_update(skip_locked=True)
+            .values(*fields)[:policy.batch_size]
+        )
+        if not rows:
+            return 0
+
+        if policy.action == ACTION_ARCHIVE:
+            NotificationArchive.objects.bulk_create(
+                [NotificationArchive(**row) for row in rows], ignore_conflicts=True,
+            )
+            result.archived += len(rows)
+        Notification.objects.filter(id__in=[row['id'] for row in rows]).delete()
+
+        # dọn cả notification chưa đọc thì phải trừ bộ đếm chưa đọc
+        unread = Counter(row['recipient_id'] for row in rows if not row['read'])
+        if unread:
+            apply_deltas('unread_notifications', {user_id: -n for user_id, n in unread.items()})
+        if policy.digest:
+            _merge_digests(rows)
+            result.digested_users.update(row['recipient_id'] for row in rows)
+
+    result.processed += len(rows)
+    return len(rows)
+
+
+def _merge_digests(rows):
+    summary = {}
+    for row in rows:
+        count, oldest, newest = summary.get(row['recipient_id'], (0, row['created_at'], row['created_at']))
+        summary[row['recipient_id']] = (
+            count + 1, min(oldest, row['created_at']), max(newest, row['created_at']),
+        )
+
+    existing = NotificationDigest.objects.select_for_update().in_bulk(list(summary))
+    now = timezone.now()
+    to_create, to_update = [], []
+    for user_id, (count, oldest, newest) in summary.items():
+        digest = existing.get(user_id)
+        if digest is None:
+            to_create.append(NotificationDigest(
+                user_id=user_id, compacted_count=count, oldest_at=oldest, newest_at=newest,
+            ))
+            continue
+        digest.compacted_count += count
+        digest.oldest_at = min(filter(None, [digest.oldest_at, oldest]))
+        digest.newest_at = max(filter(None, [digest.newest_at, newest]))
+        digest.updated_at = now
+        to_update.append(digest)
+    NotificationDigest.objects.bulk_create(to_create)
+    NotificationDigest.objects.bulk_update(
+        to_update, ['compacted_count', 'oldest_at', 'newest_at', 'updated_at'],
+    )
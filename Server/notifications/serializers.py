@@ -6,3 +6,27 @@ class NotificationSerializer(serializers.ModelSerializer):
         model = Notification
         fields = ['id', 'recipient', 'message', 'read', 'created_at']
         read_only_fields = ['id', 'recipient', 'created_at']
+
+
+class NotificationMarkReadSerializer(serializers.Serializer):
+    """
+    Chọn notification cần đánh dấu đã đọc, dùng tối đa một trong các cách:
+    - ids: danh sách id
+    - up_to_id: mọi notification có id <= up_to_id
+    - before: mọi notification tạo trước hoặc đúng thời điểm này
+    Không chọn gì nghĩa là tất cả (chỉ cho phép ở mark-all-read).
+    """
+    MAX_IDS = 500
+
+    ids      = serializers.ListField(child=serializers.IntegerField(), required=False,
+                                     allow_empty=False, max_length=MAX_IDS)
+    up_to_id = serializers.IntegerField(required=False, min_value=1)
+    before   = serializers.DateTimeField(required=False)
+
+    def validate(self, attrs):
+        modes = sum(name in attrs for name in ('ids', 'up_to_id', 'before'))
+        if modes > 1:
+            raise serializers.ValidationError("Chỉ dùng một trong: ids, up_to_id, before.")
+        if modes == 0 and self.context.get('require_selector', True):
+            raise serializers.ValidationError("Cần một trong: ids, up_to_id, before.")
+        return attrs
@@ -0,0 +1,63 @@
+from collections import Counter
+
+from django.db import transaction
+
+from users.counters import apply_deltas, get_counters
+from .models import Notification, PushEvent
+
+
+def notify_many(items):
+    """
+    Tạo nhiều notification bằng một câu INSERT.
+    items: iterable các cặp (recipient, message).
+
+    Việc gửi qua websocket do dispatcher của outbox đảm nhiệm sau khi
+    transaction commit (xem notifications.outbox), nên hàm này không gọi Redis.
+    """
+    notifications = [Notification(recipient=recipient, message=message) for recipient, message in items]
+    if not notifications:
+        return []
+    created = Notification.objects.bulk_create(notifications)
+    # bulk_create không phát signal nên tự cập nhật bộ đếm chưa đọc
+    apply_deltas('unread_notifications', Counter(n.recipient_id for n in created))
+    return created
+
+
+def notify(recipient, message):
+    return notify_many([(recipient, message)])[0]
+
+
+def mark_read(user_id, ids=None, up_to_id=None, before=None):
+    """
+    Đánh dấu đã đọc bằng một câu UPDATE, theo danh sách id, mọi id <= up_to_id,
+    mọi notification tạo trước/bằng `before`, hoặc tất cả nếu không truyền điều kiện.
+    Trả về (số notification vừa được đánh dấu, số chưa đọc còn lại).
+
+    Ghi kèm một sự kiện read_state_changed vào outbox (PushEvent) để các tab khác
+    cập nhật badge; request không gọi Redis.
+    """
+    notifications = Notification.objects.filter(recipient_id=user_id, read=False)
+    if ids is not None:
+        notifications = notifications.filter(id__in=ids)
+    if up_to_id is not None:
+        notifications = notifications.filter(id__lte=up_to_id)
+    if before is not None:
+        notifications = notifications.filter(created_at__lte=before)
+
+    with transaction.atomic():
+        # update() không phát signal nên tự trừ bộ đếm chưa đọc
+        updated = notifications.update(read=True)
+        apply_deltas('unread_notifications', {user_id: -updated})
+        unread = get_counters(user_id, use_cache=False)['unread_notifications']
+        if updated:
+            PushEvent.objects.create(recipient_id=user_id, event={
+                'type': 'read_state_changed',
+                'data': {
+                    'event': 'read_state',
+                    'unread': unread,
+                    'ids': ids,
+                    'up_to_id': up_to_id,
+                    'before': before.isoformat() if before else None,
+                },
+            })
+    return updated, unread
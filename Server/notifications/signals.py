@@ -0,0 +1,22 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from users.counters import increment
+from .models import Notification
+
+
+@receiver(post_save, sender=Notification)
+def update_unread_counter_on_save(sender, instance, created, raw=False, **kwargs):
+    # notify_many dùng bulk_create (không có signal) và tự cập nhật bộ đếm
+    if raw:
+        return
+    old_read = None if created else getattr(instance, '_loaded_read', None)
+    if not created and old_read is None:
+        return
+    instance._loaded_read = instance.read
+    if created:
+        delta = 0 if instance.read else 1
+    else:
+        delta = int(old_read) - int(instance.read)
+    if delta:
+        increment(instance.recipient_id, 'unread_notifications', delta)
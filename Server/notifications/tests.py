@@ -1,3 +1,561 @@
-from django.test import TestCase
+import asyncio
+import json
+import unittest
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from channels.layers import InMemoryChannelLayer, get_channel_layer
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, APITestCase
+
+from config.pagination import KeysetPagination
+from config.testing import benchmark, shared_revocation_cache
+from config.query_plans import QueryPlanAssertionsMixin, QueryPlanCapture
+from users.counters import compute
+from config.asgi import application
+from users.authentication import revoke_user_tokens
+from users.counters import get_counters
+from users.models import User
+from users.serializers import ClaimsTokenObtainPairSerializer
+from .models import Notification, NotificationArchive, NotificationDigest, PushEvent
+from .outbox import build_event, claim_batch, dispatch_events, dispatch_pending, get_claim_lease, notification_group
+from .retention import RetentionPolicy, run_retention
+from .services import notify_many
+
+
+class NotificationPaginationTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='pat', user_type='patient')
+        other = User.objects.create_user(username='other', user_type='patient')
+        Notification.objects.bulk_create(
+            [Notification(recipient=self.user, message=f'n{i}') for i in range(45)]
+            + [Notification(recipient=other, message='x')]
+        )
+        # cùng created_at cho một nhóm để kiểm tra phần tie-break theo id
+        Notification.objects.filter(recipient=self.user, id__lte=10).update(
+            created_at=Notification.objects.get(message='n0').created_at
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_walks_all_pages_in_order_without_duplicates(self):
+        expected = list(
+            Notification.objects.filter(recipient=self.user)
+            .order_by('-created_at', '-id').values_list('id', flat=True)
+        )
+        seen, url, pages = [], '/api/notifications/', 0
+        while url:
+            response = self.client.get(url, {'page_size': 20} if pages == 0 else None)
+            self.assertEqual(response.status_code, 200)
+            seen += [item['id'] for item in response.data['results']]
+            url, pages = response.data['next'], pages + 1
+        self.assertEqual(seen, expected)
+        self.assertEqual(pages, 3)
+
+    def test_previous_link_returns_previous_page(self):
+        first = self.client.get('/api/notifications/', {'page_size': 10}).data
+        second = self.client.get(first['next']).data
+        back = self.client.get(second['previous']).data
+        self.assertEqual([n['id'] for n in back['results']], [n['id'] for n in first['results']])
+
+    def test_deep_page_costs_the_same_as_first_page(self):
+        url = '/api/notifications/'
+        with CaptureQueriesContext(connection) as first_page:
+            response = self.client.get(url, {'page_size': 5})
+        while response.data['next']:
+            last_url = response.data['next']
+            response = self.client.get(last_url)
+        with CaptureQueriesContext(connection) as last_page:
+            self.client.get(last_url)
+        self.assertEqual(len(first_page.captured_queries), len(last_page.captured_queries))
+        self.assertNotIn('OFFSET', last_page.captured_queries[-1]['sql'])
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get('/api/notifications/', {'cursor': 'bad'}).status_code, 404)
+
+    def paginate(self, queryset, ordering, url):
+        paginator = KeysetPagination()
+        view = type('View', (), {'ordering': ordering})()
+        page = paginator.paginate_queryset(queryset, Request(APIRequestFactory().get(url)), view)
+        return [n.id for n in page], paginator.get_next_link(), paginator.get_previous_link()
+
+    def test_nullable_ordering_field(self):
+        ids = list(Notification.objects.filter(recipient=self.user).order_by('id').values_list('id', flat=True))
+        # một nửa chưa gửi (delivered_at NULL), số còn lại trùng nhau theo từng nhóm
+        delivered = timezone.now()
+        Notification.objects.filter(id__in=ids[::2]).update(delivered_at=delivered)
+        Notification.objects.filter(id__in=ids[::4]).update(delivered_at=delivered - timedelta(minutes=1))
+        queryset = Notification.objects.filter(recipient=self.user)
+        for ordering in (('delivered_at', 'id'), ('-delivered_at', '-id'), ('-delivered_at', 'id')):
+            with self.subTest(ordering=ordering):
+                pages, url = [], '/?page_size=7'
+                while url:
+                    page, url, previous_url = self.paginate(queryset, ordering, url)
+                    pages.append(page)
+                expected = list(queryset.order_by(*ordering).values_list('id', flat=True))
+                self.assertEqual(sum(pages, []), expected)
+
+                # đi lùi từ trang cuối cũng qua đúng từng trang
+                url = previous_url
+                for previous in reversed(pages[:-1]):
+                    page, _, url = self.paginate(queryset, ordering, url)
+                    self.assertEqual(page, previous)
+
+
+class BrokenChannelLayer:
+    async def group_send(self, group, message):
+        raise ConnectionError("redis down")
+
+
+@override_settings(NOTIFICATION_MAX_DELIVERY_ATTEMPTS=2)
+class OutboxDispatchTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='pat', user_type='patient')
+
+    def test_create_does_not_touch_channel_layer(self):
+        # CHANNEL_LAYERS mặc định trỏ tới Redis không tồn tại trong test
+        notification = Notification.objects.create(recipient=self.user, message='hello')
+        self.assertEqual(notification.delivery_status, Notification.DELIVERY_PENDING)
+
+    def test_dispatch_delivers_pending_notifications(self):
+        layer = InMemoryChannelLayer()
+        channel = async_to_sync(layer.new_channel)()
+        async_to_sync(layer.group_add)(notification_group(self.user.id), channel)
+        notification = Notification.objects.create(recipient=self.user, message='hello')
+
+        self.assertEqual(dispatch_pending(channel_layer=layer), (1, 0))
+        event = async_to_sync(layer.receive)(channel)
+        self.assertEqual(event['type'], 'notification_message')
+        self.assertEqual(event['data']['id'], notification.id)
+
+        notification.refresh_from_db()
+        self.assertEqual(notification.delivery_status, Notification.DELIVERY_DELIVERED)
+        self.assertEqual(notification.delivery_attempts, 1)
+        self.assertIsNotNone(notification.delivered_at)
+        # đã gửi thì không gửi lại
+        self.assertEqual(dispatch_pending(channel_layer=layer), (0, 0))
+
+    def test_failed_sends_are_retried_then_marked_failed(self):
+        notification = Notification.objects.create(recipient=self.user, message='hello')
+        self.assertEqual(dispatch_pending(channel_layer=BrokenChannelLayer()), (0, 1))
+        notification.refresh_from_db()
+        self.assertEqual(notification.delivery_status, Notification.DELIVERY_PENDING)
+        self.assertIn('redis down', notification.last_error)
+        self.assertIsNotNone(notification.next_attempt_at)
+
+        # chưa tới hạn retry
+        self.assertEqual(dispatch_pending(channel_layer=BrokenChannelLayer()), (0, 0))
+        Notification.objects.update(next_attempt_at=None)
+        self.assertEqual(dispatch_pending(channel_layer=BrokenChannelLayer()), (0, 1))
+        notification.refresh_from_db()
+        self.assertEqual(notification.delivery_status, Notification.DELIVERY_FAILED)
+        self.assertEqual(notification.delivery_attempts, 2)
+
+    def test_claimed_batch_is_skipped_until_lease_expires(self):
+        Notification.objects.create(recipient=self.user, message='hello')
+        layer = InMemoryChannelLayer()
+        # dispatcher khác đã nhận batch nhưng chưa ghi kết quả
+        self.assertEqual(len(claim_batch(10)), 1)
+        self.assertEqual(dispatch_pending(channel_layer=layer), (0, 0))
+        # nhận từ lâu (dispatcher đó đã chết): hết hạn nhận thì gửi lại
+        Notification.objects.update(next_attempt_at=None)
+        claim_batch(10, now=timezone.now() - get_claim_lease() - timedelta(seconds=1))
+        self.assertEqual(dispatch_pending(channel_layer=layer), (1, 0))
+
+
+class SendingChannelLayer:
+    """Ghi lại trạng thái DB (trong thread của dispatcher) ở thời điểm gửi."""
+    def __init__(self):
+        self.seen = []
+
+    async def group_send(self, group, message):
+        def state():
+            notification = Notification.objects.get(id=message['data']['id'])
+            return connection.in_atomic_block, notification.next_attempt_at
+        self.seen.append(await sync_to_async(state)())
+
+
+class OutboxDispatchTransactionTests(TransactionTestCase):
+    def test_sends_outside_transaction_after_claiming(self):
+        user = User.objects.create_user(username='pat', user_type='patient')
+        Notification.objects.create(recipient=user, message='hello')
+        layer = SendingChannelLayer()
+        self.assertEqual(dispatch_pending(channel_layer=layer), (1, 0))
+        [(in_transaction, claimed_until)] = layer.seen
+        self.assertFalse(in_transaction)
+        self.assertGreater(claimed_until, timezone.now())
+        notification = Notification.objects.get()
+        self.assertEqual(notification.delivery_status, Notification.DELIVERY_DELIVERED)
+        self.assertIsNone(notification.next_attempt_at)
+
+
+class NotifyManyTests(TestCase):
+    def test_bulk_creates_pending_notifications(self):
+        users = [User.objects.create_user(username=f'u{i}', user_type='patient') for i in range(3)]
+        # một INSERT cho notification + một UPDATE cho bộ đếm chưa đọc
+        with self.assertNumQueries(2):
+            created = notify_many((user, f'hi {user.username}') for user in users)
+        self.assertEqual([n.recipient_id for n in created], [u.id for u in users])
+        self.assertTrue(all(n.id for n in created))
+        self.assertEqual(Notification.objects.filter(delivery_status=Notification.DELIVERY_PENDING).count(), 3)
+        self.assertEqual(notify_many([]), [])
+
+
+class NotificationQueryPlanTests(QueryPlanAssertionsMixin, APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [User.objects.create_user(username=f'u{i}', user_type='patient') for i in range(3)]
+        Notification.objects.bulk_create([
+            Notification(recipient=cls.users[i % 3], message=f'n{i}', read=i % 4 == 0) for i in range(60)
+        ])
+
+    def test_list_pages(self):
+        self.client.force_authenticate(self.users[0])
+        with self.assertNoSequentialScans():
+            first = self.client.get('/api/notifications/', {'page_size': 5}).data
+            self.client.get(first['next'])
+
+    def test_unread_count(self):
+        with self.assertNoSequentialScans():
+            compute([user.id for user in self.users])
+
+    def test_websocket_replay_query(self):
+        user = self.users[0]
+        with self.assertNoSequentialScans():
+            list(Notification.objects.filter(recipient_id=user.id, id__gt=5).order_by('id')[:201])
+
+    def test_retention_batch_query(self):
+        scope = RetentionPolicy(read_days=30).scopes(timezone.now())[0]
+        with self.assertNoSequentialScans():
+            list(scope.order_by('created_at', 'id').values('id', 'recipient_id')[:1000])
+
+    def test_harness_flags_unindexed_filter(self):
+        with QueryPlanCapture() as capture:
+            list(Notification.objects.filter(message='n1'))
+        self.assertEqual([table for _, table in capture.sequential_scans()], ['notifications_notification'])
+
+    def test_harness_skips_unsupported_backend(self):
+        capture = QueryPlanCapture()
+        with mock.patch.object(capture.connection, 'vendor', 'mysql'):
+            with self.assertRaises(unittest.SkipTest):
+                capture.explain('SELECT 1', ())
+
+
+IN_MEMORY_LAYERS = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+
+
+async def open_socket(query_string=b'', subprotocols=()):
+    communicator = ApplicationCommunicator(application, {
+        'type': 'websocket',
+        'path': '/ws/notifications/',
+        'query_string': query_string,
+        'headers': [],
+        'subprotocols': list(subprotocols),
+    })
+    await communicator.send_input({'type': 'websocket.connect'})
+    return communicator, await communicator.receive_output(timeout=2)
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_LAYERS)
+@shared_revocation_cache()
+class WebsocketAuthTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='pat', user_type='patient')
+        cls.token = str(ClaimsTokenObtainPairSerializer.get_token(cls.user).access_token)
+
+    def setUp(self):
+        cache.clear()
+
+    async def test_token_in_query_string(self):
+        # token có claim: không đụng tới DB khi handshake
+        with mock.patch('users.middleware._get_user_from_db') as db_lookup:
+            communicator, message = await open_socket(f'token={self.token}'.encode())
+        db_lookup.assert_not_called()
+        self.assertEqual(message['type'], 'websocket.accept')
+        self.assertIsNone(message.get('subprotocol'))
+
+        await get_channel_layer().group_send(
+            notification_group(self.user.id), {'type': 'notification_message', 'data': {'id': 1}},
+        )
+        self.assertEqual((await communicator.receive_output(timeout=2))['text'], '{"id": 1}')
+        await communicator.send_input({'type': 'websocket.disconnect', 'code': 1000})
+        await communicator.wait()
+
+    async def test_token_in_subprotocol(self):
+        communicator, message = await open_socket(subprotocols=['jwt', self.token])
+        self.assertEqual(message, {'type': 'websocket.accept', 'subprotocol': 'jwt'})
+        await communicator.send_input({'type': 'websocket.disconnect', 'code': 1000})
+        await communicator.wait()
+
+    async def test_missing_or_invalid_token_is_rejected(self):
+        for query_string in (b'', b'token=garbage'):
+            communicator, message = await open_socket(query_string)
+            self.assertEqual(message['type'], 'websocket.close')
+            await communicator.send_input({'type': 'websocket.disconnect', 'code': 1006})
+            await communicator.wait()
+
+    async def test_revoked_user_is_rejected(self):
+        await asyncio.to_thread(revoke_user_tokens, self.user.id)
+        _, message = await open_socket(f'token={self.token}'.encode())
+        self.assertEqual(message['type'], 'websocket.close')
+
+
+class MarkReadTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='pat', user_type='patient')
+        self.other = User.objects.create_user(username='other', user_type='patient')
+        self.mine = notify_many((self.user, f'n{i}') for i in range(6))
+        self.theirs = notify_many([(self.other, 'x')])[0]
+        get_counters(self.user.id)
+        self.client.force_authenticate(self.user)
+
+    def post(self, url, data=None):
+        PushEvent.objects.all().delete()
+        with self.captureOnCommitCallbacks(execute=True):
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.post(url, data or {}, format='json')
+        updates = [q for q in ctx.captured_queries if q['sql'].startswith('UPDATE "notifications_notification"')]
+        self.assertLessEqual(len(updates), 1)
+        return response, list(PushEvent.objects.all())
+
+    def unread_ids(self):
+        return list(Notification.objects.filter(recipient=self.user, read=False).values_list('id', flat=True))
+
+    def test_mark_ids_with_one_update_and_push_one_event(self):
+        ids = [self.mine[0].id, self.mine[1].id, self.theirs.id]
+        response, events = self.post('/api/notifications/mark-read/', {'ids': ids})
+        self.assertEqual(response.data, {'updated': 2, 'unread': 4})
+        self.assertFalse(Notification.objects.get(pk=self.theirs.pk).read)
+        # sự kiện đi qua outbox, request không gọi channel layer
+        [pushed] = events
+        self.assertEqual(pushed.recipient_id, self.user.id)
+        event = pushed.event
+        self.assertEqual(event['type'], 'read_state_changed')
+        self.assertEqual(event['data']['unread'], 4)
+        self.assertEqual(get_counters(self.user.id)['unread_notifications'], 4)
+
+        # lặp lại: không đổi gì, không đẩy sự kiện
+        response, events = self.post('/api/notifications/mark-read/', {'ids': ids})
+        self.assertEqual(response.data, {'updated': 0, 'unread': 4})
+        self.assertEqual(events, [])
+
+    def test_mark_up_to_id_and_before(self):
+        response, _ = self.post('/api/notifications/mark-read/', {'up_to_id': self.mine[2].id})
+        self.assertEqual(response.data['updated'], 3)
+        self.assertEqual(self.unread_ids(), [n.id for n in self.mine[3:]])
+
+        Notification.objects.filter(pk=self.mine[5].pk).update(
+            created_at=self.mine[5].created_at + timedelta(days=1))
+        response, _ = self.post('/api/notifications/mark-read/', {'before': self.mine[4].created_at.isoformat()})
+        self.assertEqual(response.data, {'updated': 2, 'unread': 1})
+
+    def test_mark_all_read(self):
+        response, _ = self.post('/api/notifications/mark-all-read/')
+        self.assertEqual(response.data, {'updated': 6, 'unread': 0})
+        self.assertEqual(self.unread_ids(), [])
+        self.assertFalse(Notification.objects.get(pk=self.theirs.pk).read)
+
+    def test_dispatcher_delivers_and_drops_events(self):
+        self.post('/api/notifications/mark-all-read/')
+        layer = InMemoryChannelLayer()
+        channel = async_to_sync(layer.new_channel)()
+        async_to_sync(layer.group_add)(notification_group(self.user.id), channel)
+        self.assertEqual(dispatch_events(channel_layer=layer), (1, 0))
+        event = async_to_sync(layer.receive)(channel)
+        self.assertEqual(event['data'], {'event': 'read_state', 'unread': 0, 'ids': None,
+                                         'up_to_id': None, 'before': None})
+        self.assertFalse(PushEvent.objects.exists())
+
+        # lỗi gửi chỉ ghi log, không giữ lại sự kiện
+        Notification.objects.filter(pk=self.mine[0].pk).update(read=False)
+        self.post('/api/notifications/mark-read/', {'ids': [self.mine[0].id]})
+        self.assertEqual(dispatch_events(channel_layer=BrokenChannelLayer()), (0, 1))
+        self.assertFalse(PushEvent.objects.exists())
+
+    def test_selector_validation(self):
+        self.assertEqual(self.post('/api/notifications/mark-read/')[0].status_code, 400)
+        both = {'ids': [self.mine[0].id], 'up_to_id': 3}
+        self.assertEqual(self.post('/api/notifications/mark-all-read/', both)[0].status_code, 400)
+
+    def test_single_mark_read(self):
+        response, _ = self.post(f'/api/notifications/{self.mine[0].id}/read/')
+        self.assertEqual(response.data, {'detail': 'Marked as read.', 'unread': 5})
+        self.assertEqual(self.post(f'/api/notifications/{self.mine[0].id}/read/')[0].status_code, 200)
+        self.assertEqual(self.post(f'/api/notifications/{self.theirs.id}/read/')[0].status_code, 404)
+
+
+class RetentionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.now = timezone.now()
+        self.user = User.objects.create_user(username='pat', user_type='patient')
+        self.other = User.objects.create_user(username='other', user_type='patient')
+        self.old_read = [self.make(self.user, 200 + i, read=True) for i in range(5)]
+        self.old_unread = self.make(self.user, 400)
+        self.other_old = self.make(self.other, 150, read=True)
+        self.recent = self.make(self.user, 10, read=True)
+        # còn chờ dispatcher gửi: không được dọn
+        self.pending = self.make(self.user, 300, read=True, delivery_status=Notification.DELIVERY_PENDING)
+        get_counters(self.user.id)
+
+    def make(self, user, days_ago, read=False, delivery_status=Notification.DELIVERY_DELIVERED):
+        notification = Notification.objects.create(recipient=user, message=f'{days_ago}d', read=read)
+        Notification.objects.filter(pk=notification.pk).update(
+            created_at=self.now - timedelta(days=days_ago), delivery_status=delivery_status,
+        )
+        return notification
+
+    def remaining(self):
+        return set(Notification.objects.values_list('id', flat=True))
+
+    def test_dry_run_only_counts(self):
+        result = run_retention(RetentionPolicy(read_days=90), now=self.now, dry_run=True)
+        self.assertEqual((result.matched, result.processed), (6, 0))
+        self.assertEqual(Notification.objects.count(), 9)
+
+    def test_deletes_old_read_notifications_in_batches(self):
+        batches = []
+        result = run_retention(RetentionPolicy(read_days=90, batch_size=2), now=self.now,
+                               progress=lambda r: batches.append(r.processed))
+        self.assertEqual(batches, [2, 4, 6])
+        self.assertEqual(self.remaining(), {self.old_unread.id, self.recent.id, self.pending.id})
+        self.assertEqual(result.archived, 0)
+        self.assertFalse(NotificationArchive.objects.exists())
+
+    def test_archive_keeps_original_rows(self):
+        run_retention(RetentionPolicy(read_days=180, action='archive'), now=self.now)
+        archived = NotificationArchive.objects.order_by('id')
+        self.assertEqual([a.id for a in archived], [n.id for n in self.old_read])
+        self.assertEqual(archived[0].message, '200d')
+        self.assertEqual(archived[0].created_at, self.now - timedelta(days=200))
+        self.assertIn(self.other_old.id, self.remaining())
+
+    def test_unread_purge_updates_counter_and_digest(self):
+        policy = RetentionPolicy(read_days=None, unread_days=365, digest=True)
+        with self.captureOnCommitCallbacks(execute=True):
+            run_retention(policy, now=self.now)
+        self.assertEqual(get_counters(self.user.id)['unread_notifications'], 0)
+        digest = NotificationDigest.objects.get(user=self.user)
+        self.assertEqual(digest.compacted_count, 1)
+
+        run_retention(RetentionPolicy(read_days=90, digest=True), now=self.now)
+        digest.refresh_from_db()
+        self.assertEqual(digest.compacted_count, 6)
+        self.assertEqual(digest.oldest_at, self.now - timedelta(days=400))
+        self.assertEqual(digest.newest_at, self.now - timedelta(days=200))
+        self.assertEqual(NotificationDigest.objects.get(user=self.other).compacted_count, 1)
+
+    def test_invalid_policy(self):
+        with self.assertRaises(ValueError):
+            RetentionPolicy(action='shred')
+
+    def test_command(self):
+        out = StringIO()
+        call_command('purge_notifications', '--read-days', '90', '--dry-run', stdout=out)
+        self.assertIn('Sẽ dọn 6 notification', out.getvalue())
+        self.assertEqual(Notification.objects.count(), 9)
+
+        out = StringIO()
+        call_command('purge_notifications', '--read-days', '90', '--batch-size', '4', '--digest', stdout=out)
+        self.assertIn('Batch 2: 6/6 (100.0%)', out.getvalue())
+        self.assertIn('digest cho 2 user', out.getvalue())
+        self.assertEqual(Notification.objects.count(), 3)
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_LAYERS)
+class WebsocketReplayTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='pat', user_type='patient')
+        other = User.objects.create_user(username='other', user_type='patient')
+        cls.token = str(ClaimsTokenObtainPairSerializer.get_token(cls.user).access_token)
+        cls.notifications = [Notification.objects.create(recipient=cls.user, message=f'n{i}') for i in range(4)]
+        Notification.objects.create(recipient=other, message='not mine')
+
+    def setUp(self):
+        cache.clear()
+
+    async def connect(self, last_seen_id):
+        communicator, message = await open_socket(f'token={self.token}&last_seen_id={last_seen_id}'.encode())
+        self.assertEqual(message['type'], 'websocket.accept')
+        return communicator
+
+    async def receive(self, communicator):
+        return json.loads((await communicator.receive_output(timeout=2))['text'])
+
+    async def test_replays_missed_then_switches_to_live_without_duplicates(self):
+        communicator = await self.connect(self.notifications[1].id)
+        replayed = [await self.receive(communicator) for _ in range(2)]
+        self.assertEqual([n['id'] for n in replayed], [n.id for n in self.notifications[2:]])
+        self.assertEqual(replayed[0]['message'], 'n2')
+        self.assertEqual(await self.receive(communicator),
+                         {'event': 'replay_complete', 'count': 2, 'truncated': False})
+
+        # dispatcher đẩy trễ một notification đã replay: không gửi lại
+        layer = get_channel_layer()
+        group = notification_group(self.user.id)
+        await layer.group_send(group, build_event(self.notifications[3]))
+        await layer.group_send(group, {'type': 'notification_message', 'data': {'id': 999, 'message': 'live'}})
+        self.assertEqual((await self.receive(communicator))['id'], 999)
+        self.assertTrue(await communicator.receive_nothing())
+        await communicator.send_input({'type': 'websocket.disconnect', 'code': 1000})
+        await communicator.wait()
+
+    @override_settings(NOTIFICATION_REPLAY_LIMIT=2)
+    async def test_replay_is_bounded(self):
+        communicator = await self.connect(0)
+        replayed = [await self.receive(communicator) for _ in range(2)]
+        self.assertEqual([n['id'] for n in replayed], [n.id for n in self.notifications[:2]])
+        self.assertEqual(await self.receive(communicator),
+                         {'event': 'replay_complete', 'count': 2, 'truncated': True})
+        await communicator.send_input({'type': 'websocket.disconnect', 'code': 1000})
+        await communicator.wait()
+
+    async def test_read_state_events_are_forwarded(self):
+        communicator, _ = await open_socket(f'token={self.token}'.encode())
+        data = {'event': 'read_state', 'unread': 0, 'ids': None, 'up_to_id': None, 'before': None}
+        await get_channel_layer().group_send(
+            notification_group(self.user.id), {'type': 'read_state_changed', 'data': data},
+        )
+        self.assertEqual(await self.receive(communicator), data)
+        await communicator.send_input({'type': 'websocket.disconnect', 'code': 1000})
+        await communicator.wait()
+
+    async def test_without_last_seen_id_nothing_is_replayed(self):
+        communicator, message = await open_socket(f'token={self.token}'.encode())
+        self.assertEqual(message['type'], 'websocket.accept')
+        self.assertTrue(await communicator.receive_nothing())
+        await communicator.send_input({'type': 'websocket.disconnect', 'code': 1000})
+        await communicator.wait()
+
+
+@benchmark
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_LAYERS)
+@shared_revocation_cache()
+class WebsocketHandshakeStormBenchmark(TestCase):
+    SOCKETS = 2000
+
+    @classmethod
+    def setUpTestData(cls):
+        users = User.objects.bulk_create([User(username=f'u{i}', user_type='patient') for i in range(50)])
+        cls.tokens = [str(ClaimsTokenObtainPairSerializer.get_token(user).access_token) for user in users]
+
+    async def test_connection_storm(self):
+        results = await asyncio.gather(*(
+            open_socket(f'token={self.tokens[i % len(self.tokens)]}'.encode()) for i in range(self.SOCKETS)
+        ))
+        self.assertTrue(all(message['type'] == 'websocket.accept' for _, message in results))
+        for communicator, _ in results:
+            await communicator.send_input({'type': 'websocket.disconnect', 'code': 1000})
+        await asyncio.gather(*(communicator.wait() for communicator, _ in results))
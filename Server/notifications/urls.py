@@ -1,7 +1,10 @@
 from django.urls import path
-from .views import NotificationListView, NotificationMarkReadView
+from .views import NotificationListView, NotificationMarkReadView, NotificationBulkMarkReadView
 
 urlpatterns = [
     path('', NotificationListView.as_view(), name='notification-list'),
     path('<int:pk>/read/', NotificationMarkReadView.as_view(), name='notification-mark-read'),
+    path('mark-read/', NotificationBulkMarkReadView.as_view(), name='notification-bulk-mark-read'),
+    path('mark-all-read/', NotificationBulkMarkReadView.as_view(require_selector=False),
+         name='notification-mark-all-read'),
 ]
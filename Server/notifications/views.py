@@ -2,25 +2,47 @@ from rest_framework import generics, permissions
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
+from config.async_views import AsyncAPIViewMixin, AsyncListModelMixin
 from .models import Notification
-from .serializers import NotificationSerializer
+from .serializers import NotificationMarkReadSerializer, NotificationSerializer
+from .services import mark_read
 
-class NotificationListView(generics.ListAPIView):
+class NotificationListView(AsyncAPIViewMixin, AsyncListModelMixin, generics.ListAPIView):
     serializer_class = NotificationSerializer
     permission_classes = [permissions.IsAuthenticated]
+    ordering = ('-created_at', '-id')
 
     def get_queryset(self):
-        return Notification.objects.filter(recipient=self.request.user).order_by('-created_at')
+        return Notification.objects.filter(recipient=self.request.user)
+
+    async def get(self, request, *args, **kwargs):
+        return await self.list(request, *args, **kwargs)
 
 
 class NotificationMarkReadView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def post(self, request, pk):
-        try:
-            notif = Notification.objects.get(pk=pk, recipient=request.user)
-        except Notification.DoesNotExist:
+        updated, unread = mark_read(request.user.id, ids=[pk])
+        # không đổi gì: hoặc đã đọc từ trước, hoặc không phải của user này
+        if not updated and not Notification.objects.filter(pk=pk, recipient_id=request.user.id).exists():
             return Response({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
-        notif.read = True
-        notif.save()
-        return Response({'detail': 'Marked as read.'})
+        return Response({'detail': 'Marked as read.', 'unread': unread})
+
+
+class NotificationBulkMarkReadView(APIView):
+    """
+    POST /api/notifications/mark-read/      {"ids": [...]} | {"up_to_id": 120} | {"before": "<ISO datetime>"}
+    POST /api/notifications/mark-all-read/  như trên, hoặc body rỗng để đánh dấu tất cả
+    Trả về {"updated": n, "unread": số chưa đọc còn lại}.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    require_selector = True
+
+    def post(self, request):
+        serializer = NotificationMarkReadSerializer(
+            data=request.data, context={'require_selector': self.require_selector},
+        )
+        serializer.is_valid(raise_exception=True)
+        updated, unread = mark_read(request.user.id, **serializer.validated_data)
+        return Response({'updated': updated, 'unread': unread})
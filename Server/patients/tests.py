@@ -1,3 +1,193 @@
-from django.test import TestCase
+import time
+import unittest
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import FloatField
+from django.db.models.functions import Cast
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from config.testing import benchmark
+from doctors.models import DoctorProfile
+from doctors.profile_cache import profile_cache
+from doctors.search import normalize, refresh_search_columns, search_rank
+from users.models import User
+from .models import PatientProfile
+
+
+def make_doctors(count, start=0, with_profile=True):
+    users = User.objects.bulk_create([
+        User(username=f'doc{i}', first_name='Bác sĩ', last_name=str(i), user_type='doctor')
+        for i in range(start, start + count)
+    ])
+    if with_profile:
+        profiles = [DoctorProfile(user=user, specialty='Tim mạch', address='Hà Nội') for user in users]
+        # bulk_create không gọi save() nên tự điền các cột search_*
+        for profile in profiles:
+            profile.refresh_search_fields()
+        DoctorProfile.objects.bulk_create(profiles)
+        # bulk_create không phát signal xoá cache profile (id có thể trùng với test trước)
+        profile_cache.invalidate(profile.id for profile in profiles)
+    return users
+
+
+class DoctorDirectoryQueryTests(APITestCase):
+    def setUp(self):
+        user = User.objects.create_user(username='pat', user_type='patient')
+        PatientProfile.objects.create(user=user)
+        self.client.force_authenticate(user)
+
+    def count_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/patients/doctors/', {'page_size': 100})
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries), response.data['results']
+
+    def test_query_count_is_constant_in_number_of_doctors(self):
+        make_doctors(5)
+        small, results = self.count_queries()
+        self.assertEqual(len(results), 5)
+
+        make_doctors(95, start=5)
+        large, results = self.count_queries()
+        self.assertEqual(len(results), 100)
+        self.assertEqual(small, large)
+
+    def test_renders_nested_profile_and_missing_profile(self):
+        [with_profile] = make_doctors(1)
+        [without_profile] = make_doctors(1, start=1, with_profile=False)
+        _, results = self.count_queries()
+        by_id = {row['id']: row for row in results}
+
+        row = by_id[with_profile.id]
+        self.assertEqual(row['doctor_profile_id'], with_profile.doctor_profile.id)
+        self.assertEqual(row['profile']['fullname'], 'Bác sĩ 0')
+        self.assertEqual(row['profile']['specialty'], 'Tim mạch')
+
+        row = by_id[without_profile.id]
+        self.assertIsNone(row['profile'])
+        self.assertIsNone(row['doctor_profile_id'])
+
+
+class DoctorSearchTests(APITestCase):
+    def setUp(self):
+        user = User.objects.create_user(username='pat', user_type='patient')
+        PatientProfile.objects.create(user=user)
+        self.client.force_authenticate(user)
+
+        self.duc = User.objects.create_user(username='ducnv', full_name='Nguyễn Văn Đức', user_type='doctor')
+        DoctorProfile.objects.create(user=self.duc, specialty='Tim mạch', address='Quận Cầu Giấy, Hà Nội')
+        self.lan = User.objects.create_user(username='lantt', full_name='Trần Thị Lan', user_type='doctor')
+        DoctorProfile.objects.create(user=self.lan, specialty='Nhi khoa', address='Quận 1, TP Hồ Chí Minh')
+        self.tim = User.objects.create_user(username='hoangtim', full_name='Hoàng Tim', user_type='doctor')
+        DoctorProfile.objects.create(user=self.tim, specialty='Da liễu', address='Đà Nẵng')
+
+    def search(self, **params):
+        response = self.client.get('/api/patients/doctors/', params)
+        self.assertEqual(response.status_code, 200)
+        return [row['id'] for row in response.data['results']]
+
+    def test_normalize_strips_vietnamese_accents(self):
+        self.assertEqual(normalize('  Nguyễn   Văn ĐỨC '), 'nguyen van duc')
+        self.assertEqual(normalize(None), '')
+
+    def test_filters_are_accent_and_case_insensitive(self):
+        self.assertEqual(self.search(specialty='tim mach'), [self.duc.id])
+        self.assertEqual(self.search(specialty='TIM MẠCH'), [self.duc.id])
+        self.assertEqual(self.search(city='ha noi'), [self.duc.id])
+        self.assertEqual(self.search(city='ho chi minh', specialty='nhi'), [self.lan.id])
+        self.assertEqual(self.search(q='duc'), [self.duc.id])
+
+    def test_query_results_are_ranked(self):
+        # khớp đầu tên xếp trên khớp đầu chuyên khoa, rồi tới khớp giữa chuỗi
+        self.assertEqual(self.search(q='hoang'), [self.tim.id])
+        self.assertEqual(self.search(q='tim'), [self.duc.id, self.tim.id])
+        self.assertEqual(self.search(q='tran'), [self.lan.id])
+
+    def test_rank_is_double_precision_on_postgres(self):
+        # similarity() là float4; cursor phân trang chỉ khớp chính xác với float8
+        with mock.patch('doctors.search.connection') as conn:
+            conn.vendor = 'postgresql'
+            rank = search_rank('tim', 'search_name', 'search_specialty', 'search_address')
+        self.assertIsInstance(rank, Cast)
+        self.assertIsInstance(rank.output_field, FloatField)
+
+    def test_pages_keep_rows_tied_on_rank(self):
+        for i in range(5):
+            user = User.objects.create_user(username=f'tie{i}', full_name=f'Bác sĩ {i}', user_type='doctor')
+            DoctorProfile.objects.create(user=user, specialty='Nội khoa', address='Huế')
+        seen, url, params = [], '/api/patients/doctors/', {'q': 'noi', 'page_size': 2}
+        while url:
+            data = self.client.get(url, params).data
+            seen += [row['id'] for row in data['results']]
+            url, params = data['next'], None
+        # 5 bác sĩ "Nội khoa" cùng rank + bác sĩ ở "Hà Nội"
+        self.assertEqual(len(seen), 6)
+        self.assertEqual(set(seen), set(User.objects.filter(user_type='doctor').exclude(
+            pk__in=[self.lan.pk, self.tim.pk]).values_list('pk', flat=True)))
+
+    def test_renaming_user_refreshes_search_name(self):
+        self.lan.full_name = 'Phạm Thị Lan Anh'
+        self.lan.save()
+        self.assertEqual(self.search(q='pham thi'), [self.lan.id])
+        self.assertEqual(self.search(q='tran thi'), [])
+
+    def test_updating_profile_refreshes_search_columns(self):
+        profile = self.tim.doctor_profile
+        profile.address = 'Huế'
+        profile.save(update_fields=['address'])
+        self.assertEqual(self.search(city='hue'), [self.tim.id])
+
+    def test_bulk_update_needs_refresh(self):
+        profiles = DoctorProfile.objects.filter(user=self.tim)
+        profiles.update(address='Cần Thơ')
+        self.assertEqual(self.search(city='can tho'), [])
+        self.assertEqual(refresh_search_columns(profiles), 1)
+        self.assertEqual(self.search(city='can tho'), [self.tim.id])
+
+        profiles.update(specialty='Da liễu')
+        out = StringIO()
+        call_command('refresh_doctor_search', stdout=out)
+        self.assertIn('Đã cập nhật', out.getvalue())
+        self.assertEqual(self.search(specialty='da lieu'), [self.tim.id])
+
+
+@benchmark
+@unittest.skipUnless(connection.vendor == 'postgresql', 'cần GIN trigram index của PostgreSQL')
+class DoctorSearchBenchmark(APITestCase):
+    DOCTORS = 100_000
+    BUDGET_MS = 10
+
+    @classmethod
+    def setUpTestData(cls):
+        specialties = ['Tim mạch', 'Nhi khoa', 'Da liễu', 'Thần kinh', 'Nội tiết', 'Răng hàm mặt']
+        cities = ['Hà Nội', 'Đà Nẵng', 'Huế', 'Hải Phòng', 'Cần Thơ', 'TP Hồ Chí Minh']
+        for start in range(0, cls.DOCTORS, 10_000):
+            users = User.objects.bulk_create([
+                User(username=f'doc{i}', full_name=f'Bác sĩ Nguyễn {i}', user_type='doctor')
+                for i in range(start, start + 10_000)
+            ])
+            profiles = [
+                DoctorProfile(user=user, specialty=specialties[i % 6], address=f'{i} Lê Lợi, {cities[i % 6]}')
+                for i, user in enumerate(users, start)
+            ]
+            for profile in profiles:
+                profile.refresh_search_fields()
+            DoctorProfile.objects.bulk_create(profiles)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE doctors_doctorprofile')
+
+    def test_search_under_budget(self):
+        user = User.objects.create_user(username='pat', user_type='patient')
+        self.client.force_authenticate(user)
+        for params in ({'q': 'nguyen 4242'}, {'specialty': 'than kinh', 'city': 'hue'}):
+            self.client.get('/api/patients/doctors/', params)  # làm nóng cache
+            started = time.perf_counter()
+            response = self.client.get('/api/patients/doctors/', params)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.data['results'])
+            self.assertLess(elapsed_ms, self.BUDGET_MS)
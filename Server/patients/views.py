@@ -20,16 +20,22 @@ from appointments.serializers import AppointmentSerializer
 from users.permissions import IsPatient
 from appointments.models import Appointment
 from appointments.serializers import AppointmentSerializer
+from appointments.booking import save_appointment
 from doctors.models import DoctorProfile
 from doctors.serializers import DoctorProfileSerializer
+from doctors.search import search_doctors
 from records.models import MedicalRecord
 from records.serializers import MedicalRecordSerializer
 from notifications.models import Notification
+from notifications.services import notify_many
 from rest_framework.exceptions import PermissionDenied
 from rest_framework import generics, permissions
 from users.permissions import IsPatient
 from django.contrib.auth import get_user_model
 from users.serializers import DoctorForPatientSerializer
+from users.counters import aget_counters
+from config.async_views import AsyncListModelMixin, AsyncViewSetMixin, AsyncAPIViewMixin
+from doctors.profile_cache import profile_cache
 
 
 from typing import cast
@@ -46,7 +52,8 @@ class PatientProfileUpdateView(generics.RetrieveUpdateAPIView):
     permission_classes = [IsAuthenticated, IsPatient]
 
     def get_object(self):
-        return self.request.user
+        # request.user chỉ dựng từ claim (có thể cũ), đọc user thật để sửa và lưu
+        return User.objects.get(pk=self.request.user.pk)
 
     def update(self, request, *args, **kwargs):
         user = self.get_object()
@@ -65,22 +72,17 @@ class PatientProfileUpdateView(generics.RetrieveUpdateAPIView):
         return Response(MeSerializer(user).data)
 
 
-class PatientDashboardView(APIView):
+class PatientDashboardView(AsyncAPIViewMixin, APIView):
+    """
+    Đọc từ bộ đếm duy trì sẵn (cache -> UserCounter), không COUNT(*) mỗi lần tải.
+    View async: chỉ chờ cache/DB, không chiếm thread của worker.
+    """
     permission_classes = [permissions.IsAuthenticated, IsPatient]
-    def get(self, request: Request, *args, **kwargs):
-        user = request.user
-        profile, _ = PatientProfile.objects.get_or_create(user=user)
-        upcoming = Appointment.objects.filter(
-            patient=profile,
-            status='pending'
-        ).count()
-        unread = Notification.objects.filter(
-            recipient=user,
-            read=False
-        ).count()
+    async def get(self, request: Request, *args, **kwargs):
+        counters = await aget_counters(request.user.id)
         return Response({
-            'upcoming_appointments': upcoming,
-            'unread_notifications': unread,
+            'upcoming_appointments': counters['pending_appointments'],
+            'unread_notifications': counters['unread_notifications'],
         })
 
 
@@ -101,21 +103,30 @@ class PatientDashboardView(APIView):
 #         return qs
 
 class PatientDoctorListView(generics.ListAPIView):
+    """
+    GET /api/patients/doctors/?q=&specialty=&city=
+    Tìm không dấu, khớp chuỗi con trên các cột search_* (GIN trigram index).
+    Có `q` thì kết quả xếp theo độ liên quan.
+    """
     permission_classes = [permissions.IsAuthenticated, IsPatient]
     serializer_class   = DoctorForPatientSerializer
 
-    def get_queryset(self):
-        qs = User.objects.filter(user_type='doctor')
-        specialty = self.request.query_params.get('specialty')
-        city      = self.request.query_params.get('city')
-
-        # Chỉ lọc những doctor đã có doctor_profile nếu cần filter theo specialty hoặc address
-        if specialty:
-            qs = qs.filter(doctor_profile__specialty__icontains=specialty)
-        if city:
-            qs = qs.filter(doctor_profile__address__icontains=city)
+    @property
+    def ordering(self):
+        if self.request.query_params.get('q'):
+            return ('-search_rank', 'id')
+        return ('id',)
 
-        return qs
+    def get_queryset(self):
+        qs = User.objects.filter(user_type='doctor').select_related('doctor_profile')
+        params = self.request.query_params
+        return search_doctors(
+            qs,
+            q=params.get('q'),
+            specialty=params.get('specialty'),
+            city=params.get('city'),
+            prefix='doctor_profile__',
+        )
 
 
 # class PatientBookingCreateView(generics.CreateAPIView):
@@ -132,25 +143,21 @@ class PatientBookingCreateView(generics.CreateAPIView):
 
     def perform_create(self, serializer):
         profile, _ = PatientProfile.objects.get_or_create(user=self.request.user)
-        appt = serializer.save(patient=profile)
-        # Tạo notification cho bác sĩ:
-        Notification.objects.create(
-            recipient=appt.doctor.user,
-            message=(
+        appt = save_appointment(serializer, patient=profile)
+        notify_many([
+            # Tạo notification cho bác sĩ:
+            (appt.doctor.user, (
                 f"Bác sĩ {appt.doctor.user.get_full_name()}, "
                 f"bạn có cuộc hẹn mới từ bệnh nhân "
                 f"{self.request.user.get_full_name()} vào {appt.timeslot:%Y-%m-%d %H:%M}."
-            )
-        )
-        # Tạo notification cho chính bệnh nhân:
-        Notification.objects.create(
-            recipient=self.request.user,
-            message=(
+            )),
+            # Tạo notification cho chính bệnh nhân:
+            (self.request.user, (
                 f"Bạn đã đặt cuộc hẹn với bác sĩ "
                 f"{appt.doctor.user.get_full_name()} vào {appt.timeslot:%Y-%m-%d %H:%M}. "
                 f"Trạng thái: pending."
-            )
-        )
+            )),
+        ])
 
 
 # class PatientAppointmentViewSet(viewsets.ModelViewSet):
@@ -164,23 +171,28 @@ class PatientBookingCreateView(generics.CreateAPIView):
 #         profile, _ = PatientProfile.objects.get_or_create(user=self.request.user)
 #         return Appointment.objects.filter(patient=profile)
 
-class PatientAppointmentViewSet(viewsets.ModelViewSet):
+class PatientAppointmentViewSet(AsyncViewSetMixin, AsyncListModelMixin, viewsets.ModelViewSet):
+    # list chạy async; tạo/sửa/xoá vẫn là handler sync
     serializer_class = AppointmentSerializer
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [DjangoFilterBackend]
     filterset_class = AppointmentFilter
+    ordering = ('timeslot', 'id')
 
     def get_queryset(self):
-        return Appointment.objects.filter(patient__user=self.request.user)
+        return Appointment.objects.filter(patient__user=self.request.user).select_related('patient__user')
+
+    async def aprepare_objects(self, objects):
+        return {'doctor_profiles': await profile_cache.aget_many(appt.doctor_id for appt in objects)}
 
     def perform_create(self, serializer):
-        serializer.save(patient=self.request.user.patient_profile)
+        save_appointment(serializer, patient=self.request.user.patient_profile)
 
     def perform_update(self, serializer):
         instance = self.get_object()
         if instance.status == 'cancelled':
             raise serializers.ValidationError("Cannot update a cancelled appointment.")
-        serializer.save()
+        save_appointment(serializer)
 
     def update(self, request, *args, **kwargs):
         instance = self.get_object()
@@ -198,6 +210,7 @@ class PatientAppointmentViewSet(viewsets.ModelViewSet):
 class PatientRecordListView(generics.ListAPIView):
     permission_classes = [permissions.IsAuthenticated, IsPatient]
     serializer_class = MedicalRecordSerializer
+    ordering = ('-created_at', '-id')
 
     def get_queryset(self):
         profile, _ = PatientProfile.objects.get_or_create(user=self.request.user)
@@ -0,0 +1,102 @@
+import csv
+import json
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+
+CHUNK_SIZE = 2000
+FORMATS = ('ndjson', 'csv')
+CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+    'csv': 'text/csv; charset=utf-8',
+}
+COLUMNS = [
+    'id', 'created_at', 'appointment_id', 'appointment_timeslot',
+    'patient_id', 'patient_name', 'doctor_id', 'doctor_name',
+    'diagnosis', 'prescription', 'notes',
+]
+_SOURCE_FIELDS = [
+    'id', 'created_at', 'appointment_id', 'appointment__timeslot',
+    'patient_id', 'patient__user__first_name', 'patient__user__last_name', 'patient__user__username',
+    'doctor_id', 'doctor__user__first_name', 'doctor__user__last_name', 'doctor__user__username',
+    'diagnosis', 'prescription', 'notes',
+]
+
+
+def filter_records(queryset, start=None, end=None, patient_id=None, doctor_id=None):
+    """Lọc theo ngày tạo (start, end là date, tính cả ngày end) và theo bệnh nhân / bác sĩ."""
+    tz = timezone.get_current_timezone()
+    if start:
+        queryset = queryset.filter(created_at__gte=timezone.make_aware(datetime.combine(start, time.min), tz))
+    if end:
+        queryset = queryset.filter(
+            created_at__lt=timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min), tz))
+    if patient_id:
+        queryset = queryset.filter(patient_id=patient_id)
+    if doctor_id:
+        queryset = queryset.filter(doctor_id=doctor_id)
+    return queryset
+
+
+def _name(first_name, last_name, username):
+    return f'{first_name or ""} {last_name or ""}'.strip() or username
+
+
+def iter_rows(queryset, chunk_size=CHUNK_SIZE):
+    """
+    Duyệt hồ sơ theo (created_at, id) bằng iterator(): trên PostgreSQL là
+    server-side cursor, mỗi lần chỉ giữ chunk_size row. Tên bệnh nhân / bác sĩ
+    lấy bằng join trong cùng câu query.
+    """
+    rows = queryset.order_by('created_at', 'id').values_list(*_SOURCE_FIELDS)
+    for (record_id, created_at, appointment_id, timeslot,
+         patient_id, patient_first, patient_last, patient_username,
+         doctor_id, doctor_first, doctor_last, doctor_username,
+         diagnosis, prescription, notes) in rows.iterator(chunk_size=chunk_size):
+        yield {
+            'id': record_id,
+            'created_at': created_at.isoformat(),
+            'appointment_id': appointment_id,
+            'appointment_timeslot': timeslot.isoformat() if timeslot else None,
+            'patient_id': patient_id,
+            'patient_name': _name(patient_first, patient_last, patient_username),
+            'doctor_id': doctor_id,
+            'doctor_name': _name(doctor_first, doctor_last, doctor_username) if doctor_id else None,
+            'diagnosis': diagnosis,
+            'prescription': prescription,
+            'notes': notes,
+        }
+
+
+def render_ndjson(rows):
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False) + '\n'
+
+
+class _Echo:
+    # csv.writer ghi vào đây và nhận lại đúng dòng vừa ghi
+    def write(self, value):
+        return value
+
+
+# Excel/LibreOffice coi ô bắt đầu bằng các ký tự này là công thức (CSV injection)
+_FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def _csv_cell(value):
+    if isinstance(value, str) and value.startswith(_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def render_csv(rows):
+    writer = csv.DictWriter(_Echo(), fieldnames=COLUMNS)
+    yield writer.writerow(dict(zip(COLUMNS, COLUMNS)))
+    for row in rows:
+        yield writer.writerow({column: _csv_cell(value) for column, value in row.items()})
+
+
+def export_records(queryset, fmt, chunk_size=CHUNK_SIZE):
+    """Các dòng (str) của file export theo định dạng `fmt` ('ndjson' hoặc 'csv')."""
+    render = render_csv if fmt == 'csv' else render_ndjson
+    return render(iter_rows(queryset, chunk_size))
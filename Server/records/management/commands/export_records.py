@@ -0,0 +1,50 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from records.export import CHUNK_SIZE, FORMATS, export_records, filter_records
+from records.models import MedicalRecord
+
+
+def parse_date(value):
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f"Ngày không đúng định dạng YYYY-MM-DD: {value}")
+
+
+class Command(BaseCommand):
+    help = ("Xuất hồ sơ bệnh án ra NDJSON hoặc CSV, stream theo từng chunk nên "
+            "bộ nhớ không phụ thuộc số hồ sơ.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=FORMATS, default='ndjson', dest='fmt')
+        parser.add_argument('--patient', type=int, help="Chỉ xuất hồ sơ của PatientProfile id này.")
+        parser.add_argument('--doctor', type=int, help="Chỉ xuất hồ sơ của DoctorProfile id này.")
+        parser.add_argument('--start', type=parse_date, help="Từ ngày (YYYY-MM-DD).")
+        parser.add_argument('--end', type=parse_date, help="Đến hết ngày (YYYY-MM-DD).")
+        parser.add_argument('--output', '-o', help="Đường dẫn file; mặc định ghi ra stdout.")
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        if options['start'] and options['end'] and options['end'] < options['start']:
+            raise CommandError("--end phải sau hoặc bằng --start.")
+        queryset = filter_records(
+            MedicalRecord.objects.all(),
+            start=options['start'], end=options['end'],
+            patient_id=options['patient'], doctor_id=options['doctor'],
+        )
+        lines = export_records(queryset, options['fmt'], chunk_size=options['chunk_size'])
+
+        if not options['output']:
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+
+        count = 0
+        with open(options['output'], 'w', encoding='utf-8', newline='') as out:
+            for count, line in enumerate(lines, start=1):
+                out.write(line)
+        # mỗi hồ sơ là một dòng; CSV có thêm dòng tiêu đề
+        count -= options['fmt'] == 'csv'
+        self.stderr.write(self.style.SUCCESS(f"Đã xuất {count} hồ sơ ra {options['output']}."))
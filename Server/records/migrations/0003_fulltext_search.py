@@ -0,0 +1,67 @@
+from django.db import migrations
+
+from records.search import SQLITE_FTS_TABLE, search_vector
+
+INDEX_NAME = 'record_fulltext_gin'
+
+# SQLite (test): bảng FTS5 external content, đồng bộ bằng trigger nên cả bulk_create / update() cũng được index.
+# Lưu ý: SQLite tạo lại bảng khi alter records_medicalrecord, khi đó cần chạy lại create_sqlite_fts.
+SQLITE_FTS_SQL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {SQLITE_FTS_TABLE} USING fts5(
+        diagnosis, prescription, notes,
+        content='records_medicalrecord', content_rowid='id', tokenize='unicode61 remove_diacritics 0'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {SQLITE_FTS_TABLE}_ai AFTER INSERT ON records_medicalrecord BEGIN
+        INSERT INTO {SQLITE_FTS_TABLE}(rowid, diagnosis, prescription, notes)
+        VALUES (new.id, new.diagnosis, new.prescription, new.notes);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {SQLITE_FTS_TABLE}_ad AFTER DELETE ON records_medicalrecord BEGIN
+        INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}, rowid, diagnosis, prescription, notes)
+        VALUES ('delete', old.id, old.diagnosis, old.prescription, old.notes);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {SQLITE_FTS_TABLE}_au AFTER UPDATE ON records_medicalrecord BEGIN
+        INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}, rowid, diagnosis, prescription, notes)
+        VALUES ('delete', old.id, old.diagnosis, old.prescription, old.notes);
+        INSERT INTO {SQLITE_FTS_TABLE}(rowid, diagnosis, prescription, notes)
+        VALUES (new.id, new.diagnosis, new.prescription, new.notes);
+    END""",
+    f"INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}) VALUES ('rebuild')",
+]
+SQLITE_DROP_SQL = [
+    f'DROP TRIGGER IF EXISTS {SQLITE_FTS_TABLE}_ai',
+    f'DROP TRIGGER IF EXISTS {SQLITE_FTS_TABLE}_ad',
+    f'DROP TRIGGER IF EXISTS {SQLITE_FTS_TABLE}_au',
+    f'DROP TABLE IF EXISTS {SQLITE_FTS_TABLE}',
+]
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        # GIN trên đúng biểu thức records.search.search_vector() để câu tìm kiếm dùng được index
+        from django.contrib.postgres.indexes import GinIndex
+        MedicalRecord = apps.get_model('records', 'MedicalRecord')
+        schema_editor.add_index(MedicalRecord, GinIndex(search_vector(), name=INDEX_NAME))
+    elif vendor == 'sqlite':
+        for sql in SQLITE_FTS_SQL:
+            schema_editor.execute(sql)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(f'DROP INDEX IF EXISTS {INDEX_NAME}')
+    elif vendor == 'sqlite':
+        for sql in SQLITE_DROP_SQL:
+            schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('records', '0002_list_ordering_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -16,5 +16,12 @@ class MedicalRecord(models.Model):
     notes = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # danh sách hồ sơ theo bệnh nhân / bác sĩ, phân trang theo (created_at, id)
+            models.Index(fields=['patient', '-created_at', '-id'], name='record_patient_created_idx'),
+            models.Index(fields=['doctor', '-created_at', '-id'], name='record_doctor_created_idx'),
+        ]
+
     def __str__(self):
         return f"Record for {self.patient.user.username} @ {self.created_at.date()}"
\ No newline at end of file
@@ -0,0 +1,64 @@
+import re
+
+from django.db import connection
+from django.db.models import FloatField, Value
+from django.db.models.expressions import RawSQL
+
+# bảng FTS5 dùng thay GIN/tsvector khi chạy SQLite (test), tạo trong migration 0003
+SQLITE_FTS_TABLE = 'records_medicalrecord_fts'
+SEARCH_CONFIG = 'simple'
+_TERM = re.compile(r'\w+')
+
+
+def query_terms(q):
+    """Tách từ khoá thành các từ (chữ thường); mọi từ đều phải xuất hiện trong hồ sơ."""
+    return _TERM.findall((q or '').lower())
+
+
+def search_vector():
+    """
+    tsvector của hồ sơ, chẩn đoán nặng ký nhất rồi tới đơn thuốc, ghi chú.
+    Migration 0003 tạo GIN index trên đúng biểu thức này nên WHERE dùng được index.
+    """
+    from django.contrib.postgres.search import SearchVector
+    return (
+        SearchVector('diagnosis', weight='A', config=SEARCH_CONFIG)
+        + SearchVector('prescription', weight='B', config=SEARCH_CONFIG)
+        + SearchVector('notes', weight='C', config=SEARCH_CONFIG)
+    )
+
+
+def search_records(queryset, q):
+    """
+    Lọc queryset MedicalRecord theo từ khoá trên diagnosis/prescription/notes và
+    thêm annotation `search_rank` (càng lớn càng liên quan).
+
+    PostgreSQL: GIN index trên tsvector. SQLite: bảng FTS5 được trigger cập nhật,
+    xếp hạng bằng bm25 với trọng số tương tự.
+    """
+    terms = query_terms(q)
+    if not terms:
+        return queryset.none().annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import SearchQuery, SearchRank
+        from django.db.models.functions import Cast
+        vector = search_vector()
+        query = SearchQuery(' '.join(terms), config=SEARCH_CONFIG)
+        return (
+            queryset.annotate(search_document=vector).filter(search_document=query)
+            # ts_rank trả về real (float4): ép sang double precision để giá trị lưu trong
+            # cursor phân trang so sánh bằng đúng với cột, không làm rơi các dòng cùng rank
+            .annotate(search_rank=Cast(SearchRank(vector, query), FloatField()))
+        )
+
+    match = ' '.join(f'"{term}"' for term in terms)
+    table = queryset.model._meta.db_table
+    return queryset.filter(
+        id__in=RawSQL(f'SELECT rowid FROM {SQLITE_FTS_TABLE} WHERE {SQLITE_FTS_TABLE} MATCH %s', (match,)),
+    ).annotate(search_rank=RawSQL(
+        # bm25 nhỏ hơn là liên quan hơn nên đổi dấu
+        f'SELECT -bm25({SQLITE_FTS_TABLE}, 10.0, 5.0, 2.0) FROM {SQLITE_FTS_TABLE} '
+        f'WHERE {SQLITE_FTS_TABLE} MATCH %s AND rowid = "{table}"."id"',
+        (match,), output_field=FloatField(),
+    ))
@@ -1,8 +1,39 @@
 from rest_framework import serializers
+from .export import FORMATS
 from .models import MedicalRecord
 
 class MedicalRecordSerializer(serializers.ModelSerializer):
     class Meta:
         model = MedicalRecord
         fields = ['id', 'patient', 'doctor', 'appointment', 'diagnosis', 'prescription', 'notes', 'created_at']
-        read_only_fields = ['patient', 'doctor', 'appointment', 'created_at']
\ No newline at end of file
+        read_only_fields = ['patient', 'doctor', 'appointment', 'created_at']
+
+
+class MedicalRecordFilterSerializer(serializers.Serializer):
+    """Bộ lọc chung (query string) của export/search, xem records.export.filter_records."""
+    start   = serializers.DateField(required=False)
+    end     = serializers.DateField(required=False)
+    patient = serializers.IntegerField(required=False)
+    doctor  = serializers.IntegerField(required=False)
+
+    def validate(self, attrs):
+        if 'start' in attrs and 'end' in attrs and attrs['end'] < attrs['start']:
+            raise serializers.ValidationError("end phải sau hoặc bằng start.")
+        return attrs
+
+
+class MedicalRecordExportSerializer(MedicalRecordFilterSerializer):
+    """Tham số của GET /api/records/export/."""
+    output = serializers.ChoiceField(choices=FORMATS, default='ndjson')
+
+
+class MedicalRecordSearchSerializer(MedicalRecordFilterSerializer):
+    """Tham số của GET /api/records/search/."""
+    q = serializers.CharField(max_length=200)
+
+
+class MedicalRecordHitSerializer(MedicalRecordSerializer):
+    rank = serializers.FloatField(source='search_rank', read_only=True)
+
+    class Meta(MedicalRecordSerializer.Meta):
+        fields = MedicalRecordSerializer.Meta.fields + ['rank']
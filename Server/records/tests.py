@@ -1,3 +1,264 @@
+import csv
+import io
+import json
+import os
+import tempfile
+import tracemalloc
+from unittest import mock
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.core.management import call_command
+from django.db.models import FloatField
+from django.db.models.functions import Cast
 from django.test import TestCase
+from rest_framework.test import APITestCase
+
+from config.query_plans import QueryPlanAssertionsMixin
+from config.testing import benchmark, make_doctor, make_patient
+
+from appointments.models import Appointment
+from doctors.models import DoctorProfile
+from users.models import User
+from users.serializers import ClaimsTokenObtainPairSerializer
+from .export import COLUMNS, render_csv, render_ndjson
+from .models import MedicalRecord
+from .search import search_records
+
+START = datetime(2026, 3, 1, 9, tzinfo=dt_timezone.utc)
+
+
+def make_records(specs):
+    """specs: [(patient, doctor, created_at, diagnosis, notes)], tạo kèm appointment cho từng hồ sơ."""
+    fallback = DoctorProfile.objects.first()
+    appointments = Appointment.objects.bulk_create([
+        Appointment(patient=patient, doctor=doctor or fallback, timeslot=START + timedelta(hours=i), reason='x')
+        for i, (patient, doctor, _, _, _) in enumerate(specs)
+    ])
+    records = MedicalRecord.objects.bulk_create([
+        MedicalRecord(patient=patient, doctor=doctor, appointment=appointment,
+                      diagnosis=diagnosis, prescription='Paracetamol', notes=notes)
+        for appointment, (patient, doctor, _, diagnosis, notes) in zip(appointments, specs)
+    ])
+    for record, (_, _, created_at, _, _) in zip(records, specs):
+        if created_at:
+            MedicalRecord.objects.filter(pk=record.pk).update(created_at=created_at)
+    return records
+
+
+class MedicalRecordExportTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.lan = make_doctor('lan', 'Lan', 'Trần')
+        cls.hung = make_doctor('hung', 'Hùng')
+        cls.minh = make_patient('minh', 'Minh')
+        cls.an = make_patient('an')
+        make_records([
+            (cls.minh, cls.lan, datetime(2026, 3, 3, tzinfo=dt_timezone.utc), 'Cảm cúm', 'Uống nhiều nước,\nnghỉ ngơi'),
+            (cls.minh, cls.lan, datetime(2026, 3, 1, tzinfo=dt_timezone.utc), 'Viêm họng', ''),
+            (cls.an, cls.hung, datetime(2026, 3, 2, tzinfo=dt_timezone.utc), 'Đau lưng', ''),
+            (cls.minh, None, datetime(2026, 3, 4, tzinfo=dt_timezone.utc), 'Dị ứng', ''),
+        ])
+        cls.admin = User.objects.create_user(username='admin', user_type='admin')
+
+    def export(self, user, **params):
+        self.client.force_authenticate(user)
+        response = self.client.get('/api/records/export/', params)
+        self.assertEqual(response.status_code, 200, getattr(response, 'data', None))
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def ndjson(self, user, **params):
+        return [json.loads(line) for line in self.export(user, **params).splitlines()]
+
+    def test_ndjson_with_joined_names(self):
+        rows = self.ndjson(self.admin)
+        self.assertEqual([row['diagnosis'] for row in rows], ['Viêm họng', 'Đau lưng', 'Cảm cúm', 'Dị ứng'])
+        self.assertEqual(rows[0]['patient_name'], 'Minh')
+        self.assertEqual(rows[0]['doctor_name'], 'Lan Trần')
+        self.assertEqual(rows[1]['patient_name'], 'an')
+        self.assertIsNone(rows[3]['doctor_name'])
+
+    def test_csv(self):
+        self.client.force_authenticate(self.admin)
+        response = self.client.get('/api/records/export/', {'output': 'csv'})
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertIn('medical-records.csv', response['Content-Disposition'])
+        rows = list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(rows[2]['notes'], 'Uống nhiều nước,\nnghỉ ngơi')
+
+    def test_csv_escapes_formula_cells(self):
+        rows = [{column: None for column in COLUMNS} | {
+            'diagnosis': '=HYPERLINK("http://x","y")', 'prescription': '-2+3', 'notes': '@SUM(A1)',
+            'patient_name': '+84 912', 'doctor_name': 'Lan', 'id': -1,
+        }]
+        [row] = csv.DictReader(io.StringIO(''.join(render_csv(rows))))
+        self.assertEqual(row['diagnosis'], '\'=HYPERLINK("http://x","y")')
+        self.assertEqual(row['prescription'], "'-2+3")
+        self.assertEqual(row['notes'], "'@SUM(A1)")
+        self.assertEqual(row['patient_name'], "'+84 912")
+        self.assertEqual(row['doctor_name'], 'Lan')
+        self.assertEqual(row['id'], '-1')
+        # NDJSON giữ nguyên giá trị
+        self.assertEqual(json.loads(next(render_ndjson(rows)))['diagnosis'], '=HYPERLINK("http://x","y")')
+
+    def test_same_scope_as_list(self):
+        self.assertEqual({row['patient_id'] for row in self.ndjson(self.lan.user)}, {self.minh.id})
+        self.assertEqual(len(self.ndjson(self.lan.user)), 2)
+        self.assertEqual([row['diagnosis'] for row in self.ndjson(self.an.user)], ['Đau lưng'])
+        # bệnh nhân không lấy được hồ sơ của người khác bằng tham số patient
+        self.assertEqual(self.ndjson(self.an.user, patient=self.minh.id), [])
+
+    def test_filters(self):
+        rows = self.ndjson(self.admin, start='2026-03-02', end='2026-03-03')
+        self.assertEqual([row['diagnosis'] for row in rows], ['Đau lưng', 'Cảm cúm'])
+        rows = self.ndjson(self.admin, doctor=self.hung.id)
+        self.assertEqual([row['diagnosis'] for row in rows], ['Đau lưng'])
+
+    def test_invalid_params(self):
+        self.client.force_authenticate(self.admin)
+        self.assertEqual(self.client.get('/api/records/export/', {'output': 'xml'}).status_code, 400)
+        response = self.client.get('/api/records/export/', {'start': '2026-03-05', 'end': '2026-03-01'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_one_query(self):
+        self.client.force_authenticate(self.admin)
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/records/export/')
+            b''.join(response.streaming_content)
+
+    async def test_streams_under_asgi(self):
+        token = ClaimsTokenObtainPairSerializer.get_token(self.admin).access_token
+        response = await self.async_client.get('/api/records/export/', headers={'authorization': f'Bearer {token}'})
+        self.assertTrue(response.is_async)
+        body = b''.join([chunk async for chunk in response.streaming_content]).decode()
+        self.assertEqual(len(body.splitlines()), 4)
+
+    def test_command(self):
+        out = io.StringIO()
+        call_command('export_records', patient=self.minh.id, stdout=out)
+        self.assertEqual([json.loads(line)['diagnosis'] for line in out.getvalue().splitlines()],
+                         ['Viêm họng', 'Cảm cúm', 'Dị ứng'])
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'records.csv')
+            err = io.StringIO()
+            call_command('export_records', '--format=csv', '--start=2026-03-02', output=path, stderr=err)
+            with open(path, encoding='utf-8', newline='') as f:
+                self.assertEqual(len(list(csv.DictReader(f))), 3)
+        self.assertIn('Đã xuất 3 hồ sơ', err.getvalue())
+
+
+@benchmark
+class MedicalRecordExportMemoryBenchmark(TestCase):
+    ROWS = 8000
+    SMALL = 1000
+
+    @classmethod
+    def setUpTestData(cls):
+        doctor = make_doctor('doc')
+        cls.small_patient, other = make_patient('pat'), make_patient('pat2')
+        make_records([
+            (cls.small_patient if i < cls.SMALL else other, doctor, None, 'Chẩn đoán ' * 20, 'Ghi chú ' * 20)
+            for i in range(cls.ROWS)
+        ])
+
+    def peak(self, **filters):
+        with tempfile.TemporaryDirectory() as tmp:
+            tracemalloc.start()
+            call_command('export_records', chunk_size=500, output=os.path.join(tmp, 'out.ndjson'),
+                         stderr=io.StringIO(), **filters)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        return peak
+
+    def test_memory_is_flat(self):
+        small, large = self.peak(patient=self.small_patient.id), self.peak()
+        self.assertLess(large, small * 1.5)
+
+
+class MedicalRecordSearchTests(QueryPlanAssertionsMixin, APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.lan = make_doctor('lan', 'Lan')
+        cls.hung = make_doctor('hung', 'Hùng')
+        cls.minh = make_patient('minh', 'Minh')
+        cls.an = make_patient('an')
+        cls.by_notes, cls.by_diagnosis, cls.old, cls.other_doctor = make_records([
+            (cls.minh, cls.lan, datetime(2026, 8, 1, tzinfo=dt_timezone.utc), 'Viêm họng', 'ghi chú: tiền sử dị ứng Amoxicillin'),
+            (cls.an, cls.lan, datetime(2026, 8, 2, tzinfo=dt_timezone.utc), 'Nhiễm khuẩn, kê amoxicillin 500mg', ''),
+            (cls.an, cls.lan, datetime(2026, 1, 5, tzinfo=dt_timezone.utc), 'Viêm xoang', 'amoxicillin'),
+            (cls.an, cls.hung, datetime(2026, 8, 3, tzinfo=dt_timezone.utc), 'Viêm phế quản, amoxicillin', ''),
+        ])
+        cls.admin = User.objects.create_user(username='admin', user_type='admin')
+
+    def search(self, user, **params):
+        self.client.force_authenticate(user)
+        response = self.client.get('/api/records/search/', params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    def ids(self, user, **params):
+        return [hit['id'] for hit in self.search(user, **params)['results']]
+
+    def test_ranked_by_field_weight(self):
+        # khớp trong chẩn đoán xếp trên khớp trong ghi chú
+        self.assertEqual(self.ids(self.lan.user, q='AMOXICILLIN', start='2026-07-01', end='2026-09-30'),
+                         [self.by_diagnosis.id, self.by_notes.id])
+
+    def test_all_terms_must_match(self):
+        self.assertEqual(self.ids(self.admin, q='amoxicillin 500mg'), [self.by_diagnosis.id])
+        self.assertEqual(self.ids(self.admin, q='viêm amoxicillin xoang'), [self.old.id])
+
+    def test_same_scope_as_list(self):
+        self.assertEqual(set(self.ids(self.lan.user, q='amoxicillin')),
+                         {self.by_notes.id, self.by_diagnosis.id, self.old.id})
+        self.assertEqual(self.ids(self.hung.user, q='amoxicillin'), [self.other_doctor.id])
+        self.assertEqual(self.ids(self.minh.user, q='amoxicillin'), [self.by_notes.id])
+        self.assertEqual(self.ids(self.minh.user, q='amoxicillin', patient=self.an.id), [])
+
+    def test_index_follows_writes(self):
+        MedicalRecord.objects.filter(pk=self.old.pk).update(notes='cephalexin')
+        self.assertEqual(self.ids(self.admin, q='cephalexin'), [self.old.id])
+        self.assertNotIn(self.old.id, self.ids(self.admin, q='amoxicillin'))
+        self.other_doctor.appointment.delete()
+        self.assertEqual(self.ids(self.admin, q='phế quản'), [])
+
+    def test_paginated(self):
+        first = self.search(self.admin, q='amoxicillin', page_size=2)
+        self.assertEqual(len(first['results']), 2)
+        self.assertGreaterEqual(first['results'][0]['rank'], first['results'][1]['rank'])
+        second = self.client.get(first['next']).data
+        seen = [hit['id'] for hit in first['results'] + second['results']]
+        self.assertEqual(len(seen), 4)
+        self.assertEqual(len(set(seen)), 4)
+
+    def test_rank_is_double_precision_on_postgres(self):
+        with mock.patch('records.search.connection') as conn:
+            conn.vendor = 'postgresql'
+            queryset = search_records(MedicalRecord.objects.all(), 'amoxicillin')
+        rank = queryset.query.annotations['search_rank']
+        self.assertIsInstance(rank, Cast)
+        self.assertIsInstance(rank.output_field, FloatField)
+
+    def test_pages_keep_rows_tied_on_rank(self):
+        doctor = make_doctor('tie')
+        make_records([(self.minh, doctor, None, 'Sốt', 'paracetamol') for _ in range(5)])
+        seen, url, params = [], '/api/records/search/', {'q': 'sốt', 'page_size': 2}
+        self.client.force_authenticate(self.admin)
+        while url:
+            data = self.client.get(url, params).data
+            seen += [hit['id'] for hit in data['results']]
+            url, params = data['next'], None
+        self.assertEqual(len(seen), 5)
+        self.assertEqual(len(set(seen)), 5)
+
+    def test_bad_query(self):
+        self.client.force_authenticate(self.admin)
+        self.assertEqual(self.client.get('/api/records/search/').status_code, 400)
+        self.assertEqual(self.search(self.admin, q='!!!')['results'], [])
 
-# Create your tests here.
+    def test_uses_index(self):
+        self.client.force_authenticate(self.lan.user)
+        with self.assertNoSequentialScans():
+            self.client.get('/api/records/search/', {'q': 'amoxicillin'})
@@ -1,26 +1,77 @@
 from rest_framework.exceptions import PermissionDenied
 from rest_framework import generics, permissions, viewsets
+from rest_framework.decorators import action
+from config.streaming import streaming_response
 from users.permissions import IsDoctor, IsAdmin, IsPatient
+from .export import CONTENT_TYPES, export_records, filter_records
 from .models import MedicalRecord
-from .serializers import MedicalRecordSerializer
+from .search import search_records
+from .serializers import (
+    MedicalRecordExportSerializer, MedicalRecordHitSerializer, MedicalRecordSearchSerializer, MedicalRecordSerializer,
+)
 
 class MedicalRecordViewSet(viewsets.ModelViewSet):
     queryset = MedicalRecord.objects.select_related('patient', 'doctor', 'appointment').all()
     serializer_class = MedicalRecordSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    @property
+    def ordering(self):
+        # kết quả tìm kiếm xếp theo độ liên quan
+        if self.action == 'search':
+            return ('-search_rank', '-id')
+        return ('-created_at', '-id')
+
     def get_queryset(self):
         user = self.request.user
-        if user.role == 'admin':
+        if user.user_type == 'admin':
             return self.queryset
-        if user.role == 'doctor':
+        if user.user_type == 'doctor':
             return self.queryset.filter(doctor__user=user)
-        if user.role == 'patient':
+        if user.user_type == 'patient':
             return self.queryset.filter(patient__user=user)
         return MedicalRecord.objects.none()
 
     def perform_create(self, serializer):
         user = self.request.user
-        if user.role not in ['doctor', 'admin']:
+        if user.user_type not in ['doctor', 'admin']:
             raise PermissionDenied("Only doctors or admins can create medical records.")
-        serializer.save(doctor=user.doctor_profile, patient=serializer.validated_data['patient'])
\ No newline at end of file
+        serializer.save(doctor=user.doctor_profile, patient=serializer.validated_data['patient'])
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """
+        GET /api/records/export/?output=ndjson|csv&start=YYYY-MM-DD&end=YYYY-MM-DD&patient=<id>&doctor=<id>
+        Stream toàn bộ hồ sơ user được xem (cùng phạm vi với list), kèm tên bệnh nhân/bác sĩ.
+        Tham số là `output` vì `format` đã được DRF dùng cho content negotiation.
+        """
+        params = MedicalRecordExportSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        data = params.validated_data
+
+        queryset = filter_records(
+            self.get_queryset(), start=data.get('start'), end=data.get('end'),
+            patient_id=data.get('patient'), doctor_id=data.get('doctor'),
+        )
+        fmt = data['output']
+        response = streaming_response(request, export_records(queryset, fmt), content_type=CONTENT_TYPES[fmt])
+        response['Content-Disposition'] = f'attachment; filename="medical-records.{fmt}"'
+        return response
+
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """
+        GET /api/records/search/?q=amoxicillin&start=YYYY-MM-DD&end=YYYY-MM-DD&patient=<id>&doctor=<id>
+        Tìm toàn văn trên chẩn đoán, đơn thuốc, ghi chú (mọi từ đều phải có), trong phạm vi
+        hồ sơ user được xem; kết quả xếp theo độ liên quan, phân trang bằng cursor.
+        """
+        params = MedicalRecordSearchSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        data = params.validated_data
+
+        queryset = filter_records(
+            self.get_queryset(), start=data.get('start'), end=data.get('end'),
+            patient_id=data.get('patient'), doctor_id=data.get('doctor'),
+        )
+        page = self.paginate_queryset(search_records(queryset, data['q']))
+        return self.get_paginated_response(MedicalRecordHitSerializer(page, many=True).data)
@@ -0,0 +1,95 @@
+from asgiref.sync import sync_to_async
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import TokenClaimsUser, User
+
+
+def token_claims(user):
+    """Claim bổ sung cho token: đủ để các permission trong users.permissions không phải đọc DB."""
+    patient_profile = getattr(user, 'patient_profile', None) if user.user_type == 'patient' else None
+    doctor_profile = getattr(user, 'doctor_profile', None) if user.user_type == 'doctor' else None
+    return {
+        'username': user.username,
+        'user_type': user.user_type,
+        'patient_profile_id': patient_profile.id if patient_profile else None,
+        'doctor_profile_id': doctor_profile.id if doctor_profile else None,
+    }
+
+
+def revocation_key(user_id):
+    return f"jwt_revoked:{user_id}"
+
+
+def revoke_user_tokens(user_id):
+    # access token sống tối đa ACCESS_TOKEN_LIFETIME nên chỉ cần giữ dấu trong khoảng đó;
+    # refresh token được kiểm tra lại với DB khi đổi access token mới
+    cache.set(revocation_key(user_id), True, int(api_settings.ACCESS_TOKEN_LIFETIME.total_seconds()))
+
+
+def restore_user_tokens(user_id):
+    cache.delete(revocation_key(user_id))
+
+
+def revocation_is_shared():
+    # locmem/dummy chỉ sống trong một process: dấu thu hồi không tới được worker khác
+    return not isinstance(caches['default'], (LocMemCache, DummyCache))
+
+
+def is_revoked(user_id):
+    if not revocation_is_shared():
+        return not User.objects.filter(pk=user_id, is_active=True).exists()
+    return cache.get(revocation_key(user_id)) is not None
+
+
+async def ais_revoked(user_id):
+    if not revocation_is_shared():
+        return not await User.objects.filter(pk=user_id, is_active=True).aexists()
+    return await cache.aget(revocation_key(user_id)) is not None
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    Xác thực JWT không đọc bảng User: request.user là TokenClaimsUser dựng từ claim
+    (user_id, user_type, profile id). User bị khoá/xoá bị chặn qua dấu thu hồi trong cache.
+
+    Dấu thu hồi chỉ có tác dụng khi cache dùng chung giữa các worker (CACHE_URL, vd. Redis);
+    với cache locmem mặc định mỗi request phải hỏi lại DB xem user còn active không.
+    """
+
+    def get_user(self, validated_token):
+        if api_settings.USER_ID_CLAIM not in validated_token:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+        if 'user_type' not in validated_token:
+            # token phát hành trước khi có claim bổ sung: đọc DB như JWTAuthentication
+            return super().get_user(validated_token)
+
+        if is_revoked(validated_token[api_settings.USER_ID_CLAIM]):
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        return TokenClaimsUser.from_claims(validated_token)
+
+    async def aauthenticate(self, request):
+        """Bản async của authenticate, dùng cho view async (xem config.async_views)."""
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        return await self.aget_user(validated_token), validated_token
+
+    async def aget_user(self, validated_token):
+        if api_settings.USER_ID_CLAIM not in validated_token:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+        if 'user_type' not in validated_token:
+            return await sync_to_async(super().get_user)(validated_token)
+
+        if await ais_revoked(validated_token[api_settings.USER_ID_CLAIM]):
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        return TokenClaimsUser.from_claims(validated_token)
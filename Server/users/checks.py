@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+
+@register(Tags.caches)
+def check_revocation_cache(app_configs, **kwargs):
+    """
+    ClaimsJWTAuthentication (REST) và JWTAuthMiddleware (websocket) chỉ bỏ được
+    việc đọc bảng User mỗi request khi dấu thu hồi nằm trong cache dùng chung.
+    """
+    from .authentication import revocation_is_shared
+
+    auth_classes = settings.REST_FRAMEWORK.get('DEFAULT_AUTHENTICATION_CLASSES', ())
+    if 'users.authentication.ClaimsJWTAuthentication' not in auth_classes or revocation_is_shared():
+        return []
+    return [Warning(
+        "Cache mặc định chỉ sống trong một process: mỗi request và mỗi websocket handshake "
+        "có JWT phải đọc bảng User để kiểm tra user bị khoá.",
+        hint="Đặt CACHE_URL tới cache dùng chung, vd. redis://redis_server:6379/1.",
+        id='users.W001',
+    )]
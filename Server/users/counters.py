@@ -0,0 +1,112 @@
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+
+from .models import UserCounter
+
+COUNTER_FIELDS = ('unread_notifications', 'pending_appointments')
+
+
+def cache_key(user_id):
+    return f"user_counters:{user_id}"
+
+
+def _invalidate(user_ids):
+    # xoá sau khi commit để không có request nào kịp đọc lại giá trị cũ vào cache
+    keys = [cache_key(user_id) for user_id in user_ids]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def get_counters(user_id, use_cache=True):
+    """
+    Đọc bộ đếm của user: cache -> bảng UserCounter -> tính lại từ dữ liệu gốc.
+    use_cache=False để đọc giá trị vừa cập nhật trong transaction hiện tại
+    (cache chỉ bị xoá sau commit).
+    """
+    key = cache_key(user_id)
+    data = cache.get(key) if use_cache else None
+    if data is None:
+        data = UserCounter.objects.filter(user_id=user_id).values(*COUNTER_FIELDS).first()
+        if data is None:
+            data = reconcile([user_id])[user_id]
+        if use_cache:
+            cache.set(key, data, getattr(settings, 'DASHBOARD_COUNTER_CACHE_SECONDS', 300))
+    return data
+
+
+async def aget_counters(user_id):
+    """Bản async của get_counters cho view async: cache và UserCounter đọc không chặn event loop."""
+    key = cache_key(user_id)
+    data = await cache.aget(key)
+    if data is None:
+        data = await UserCounter.objects.filter(user_id=user_id).values(*COUNTER_FIELDS).afirst()
+        if data is None:
+            data = (await sync_to_async(reconcile)([user_id]))[user_id]
+        await cache.aset(key, data, getattr(settings, 'DASHBOARD_COUNTER_CACHE_SECONDS', 300))
+    return data
+
+
+def apply_deltas(field, deltas):
+    """
+    Cộng dồn thay đổi vào bộ đếm `field`. deltas: {user_id: delta}.
+    Các user có cùng delta được gom vào một câu UPDATE.
+    User chưa có row bộ đếm thì bỏ qua: lần đọc đầu tiên sẽ tính từ dữ liệu gốc.
+    """
+    assert field in COUNTER_FIELDS, field
+    by_delta = defaultdict(list)
+    for user_id, delta in deltas.items():
+        if delta:
+            by_delta[delta].append(user_id)
+
+    for delta, user_ids in by_delta.items():
+        UserCounter.objects.filter(user_id__in=user_ids).update(**{field: F(field) + delta})
+    _invalidate([user_id for user_ids in by_delta.values() for user_id in user_ids])
+
+
+def increment(user_id, field, delta=1):
+    apply_deltas(field, {user_id: delta})
+
+
+def compute(user_ids):
+    """Tính bộ đếm từ dữ liệu gốc bằng các câu GROUP BY (không lặp theo user)."""
+    from appointments.models import Appointment
+    from notifications.models import Notification
+
+    result = {user_id: dict.fromkeys(COUNTER_FIELDS, 0) for user_id in user_ids}
+    unread = (
+        Notification.objects.filter(recipient_id__in=user_ids, read=False)
+        .values_list('recipient_id').annotate(n=Count('id'))
+    )
+    for user_id, n in unread:
+        result[user_id]['unread_notifications'] = n
+    for user_field in ('patient__user_id', 'doctor__user_id'):
+        pending = (
+            Appointment.objects.filter(status='pending', **{f'{user_field}__in': user_ids})
+            .values_list(user_field).annotate(n=Count('id'))
+        )
+        for user_id, n in pending:
+            result[user_id]['pending_appointments'] += n
+    return result
+
+
+def reconcile(user_ids):
+    """Tính lại và ghi đè bộ đếm cho các user. Trả về {user_id: counters}."""
+    user_ids = list(user_ids)
+    result = compute(user_ids)
+    rows = [UserCounter(user_id=user_id, **values) for user_id, values in result.items()]
+    try:
+        with transaction.atomic():
+            UserCounter.objects.bulk_create(
+                rows, update_conflicts=True, unique_fields=['user'], update_fields=COUNTER_FIELDS,
+            )
+    except IntegrityError:
+        # user vừa bị xoá giữa chừng: bỏ qua, lần sau sẽ tính lại
+        pass
+    _invalidate(user_ids)
+    return result
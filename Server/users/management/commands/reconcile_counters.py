@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from users.counters import reconcile
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = "Tính lại bộ đếm dashboard (thông báo chưa đọc, lịch pending) từ dữ liệu gốc."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='user_ids',
+                            help="Chỉ tính lại cho user id này (có thể lặp lại).")
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        user_ids = options['user_ids']
+        if user_ids is None:
+            user_ids = User.objects.order_by('id').values_list('id', flat=True).iterator(
+                chunk_size=options['chunk_size']
+            )
+
+        done = 0
+        chunk = []
+        for user_id in user_ids:
+            chunk.append(user_id)
+            if len(chunk) >= options['chunk_size']:
+                reconcile(chunk)
+                done += len(chunk)
+                chunk = []
+                self.stdout.write(f"Đã xử lý {done} user...")
+        if chunk:
+            reconcile(chunk)
+            done += len(chunk)
+        self.stdout.write(self.style.SUCCESS(f"Đã tính lại bộ đếm cho {done} user."))
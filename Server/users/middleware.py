@@ -0,0 +1,75 @@
+from urllib.parse import parse_qs
+
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+from django.contrib.auth.models import AnonymousUser
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .authentication import ClaimsJWTAuthentication, ais_revoked
+from .models import TokenClaimsUser
+
+# client mở socket với subprotocols ["jwt", "<access token>"], server chọn lại "jwt"
+JWT_SUBPROTOCOL = 'jwt'
+
+
+def get_raw_token(scope):
+    """
+    Lấy access token từ subprotocol ["jwt", "<token>"] hoặc query string ?token=...
+    Trả về (token, subprotocol cần chọn khi accept).
+    """
+    subprotocols = list(scope.get('subprotocols') or [])
+    if JWT_SUBPROTOCOL in subprotocols:
+        index = subprotocols.index(JWT_SUBPROTOCOL)
+        if index + 1 < len(subprotocols):
+            return subprotocols[index + 1], JWT_SUBPROTOCOL
+    tokens = parse_qs(scope.get('query_string', b'').decode()).get('token')
+    if tokens:
+        return tokens[0], None
+    return None, None
+
+
+@database_sync_to_async
+def _get_user_from_db(validated_token):
+    try:
+        return ClaimsJWTAuthentication().get_user(validated_token)
+    except (AuthenticationFailed, InvalidToken):
+        return AnonymousUser()
+
+
+async def get_user(raw_token):
+    try:
+        token = AccessToken(raw_token)
+    except TokenError:
+        return AnonymousUser()
+    if api_settings.USER_ID_CLAIM not in token:
+        return AnonymousUser()
+    if 'user_type' not in token:
+        # token cũ chưa có claim: đọc DB như REST API
+        return await _get_user_from_db(token)
+    if await ais_revoked(token[api_settings.USER_ID_CLAIM]):
+        return AnonymousUser()
+    return TokenClaimsUser.from_claims(token)
+
+
+class JWTAuthMiddleware(BaseMiddleware):
+    """
+    Xác thực websocket bằng JWT thay cho session (AuthMiddlewareStack).
+
+    Token hợp lệ có claim user_type thì dựng user từ claim, chỉ kiểm tra dấu thu hồi
+    trong cache (không đọc DB), nên handshake không chiếm thread DB của worker.
+    Điều này cần cache dùng chung (CACHE_URL); với locmem thì vẫn hỏi DB (xem users.W001).
+    scope['user'] là AnonymousUser khi thiếu hoặc sai token.
+    """
+
+    async def __call__(self, scope, receive, send):
+        scope = dict(scope)
+        raw_token, subprotocol = get_raw_token(scope)
+        scope['user'] = await get_user(raw_token) if raw_token else AnonymousUser()
+        scope['auth_subprotocol'] = subprotocol
+        return await super().__call__(scope, receive, send)
+
+
+def JWTAuthMiddlewareStack(inner):
+    return JWTAuthMiddleware(inner)
@@ -19,4 +19,63 @@ class User(AbstractUser):
     def fullname(self, value):
         parts = value.strip().split(' ', 1)
         self.first_name = parts[0]
-        self.last_name = parts[1] if len(parts) > 1 else ''
\ No newline at end of file
+        self.last_name = parts[1] if len(parts) > 1 else ''
+
+
+class TokenClaimsUser(User):
+    """
+    User dựng từ claim của access token (xem users.authentication), không đọc DB.
+
+    Các field không có trong claim được để deferred; lần đầu view cần tới
+    (vd. email, password) thì nạp toàn bộ field còn thiếu bằng một query.
+
+    Giá trị lấy từ claim có thể đã cũ so với DB nên save() chỉ ghi các field được
+    chỉ định rõ qua update_fields và không bao giờ ghi lại field từ claim. View cần
+    sửa user thì đọc User thật: User.objects.get(pk=request.user.pk).
+    """
+    CLAIM_FIELDS = frozenset({'username', 'user_type', 'is_active'})
+
+    class Meta:
+        proxy = True
+
+    @classmethod
+    def from_claims(cls, token):
+        claims = {
+            'id': token['user_id'],
+            'username': token.get('username'),
+            'user_type': token['user_type'],
+            'is_active': True,
+        }
+        names = [f.attname for f in cls._meta.concrete_fields if f.attname in claims]
+        user = cls.from_db('default', names, [claims[name] for name in names])
+        user.patient_profile_id = token.get('patient_profile_id')
+        user.doctor_profile_id = token.get('doctor_profile_id')
+        return user
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or self.CLAIM_FIELDS.intersection(update_fields):
+            raise ValueError(
+                "TokenClaimsUser chỉ lưu được với update_fields không gồm field từ claim "
+                f"({', '.join(sorted(self.CLAIM_FIELDS))}); hãy đọc User từ DB trước khi sửa."
+            )
+        super().save(*args, **kwargs)
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        deferred = self.get_deferred_fields()
+        if fields is not None and deferred.intersection(fields):
+            fields = deferred
+        super().refresh_from_db(using, fields, from_queryset)
+
+class UserCounter(models.Model):
+    """
+    Bộ đếm duy trì tăng dần cho dashboard, tránh COUNT(*) mỗi lần tải trang.
+    Cập nhật qua users.counters; có thể đồng bộ lại bằng `manage.py reconcile_counters`.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='counters')
+    unread_notifications = models.IntegerField(default=0)
+    pending_appointments = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Counters của {self.user_id}"
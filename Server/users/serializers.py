@@ -1,14 +1,18 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
 from patients.serializers import PatientProfileSerializer
 from doctors.serializers import DoctorProfileSerializer
 
 User = get_user_model()
 
 class DoctorForPatientSerializer(serializers.ModelSerializer):
-    profile = serializers.SerializerMethodField()
-    doctor_profile_id = serializers.SerializerMethodField()  # Thêm trường này
+    # Queryset cần select_related('doctor_profile') để không phát sinh query theo từng dòng.
+    # Doctor chưa có profile -> None (allow_null).
+    profile = DoctorProfileSerializer(source='doctor_profile', read_only=True, allow_null=True)
+    doctor_profile_id = serializers.IntegerField(source='doctor_profile.id', read_only=True, allow_null=True)
 
     class Meta:
         model = User
@@ -21,16 +25,6 @@ class DoctorForPatientSerializer(serializers.ModelSerializer):
             'doctor_profile_id'  # Thêm vào fields
         ]
 
-    def get_profile(self, obj):
-        if hasattr(obj, 'doctor_profile'):
-            return DoctorProfileSerializer(obj.doctor_profile).data
-        return None
-
-    def get_doctor_profile_id(self, obj):
-        if hasattr(obj, 'doctor_profile'):
-            return obj.doctor_profile.id
-        return None
-
 class MeSerializer(serializers.ModelSerializer):
     profile = serializers.SerializerMethodField()
     # fullname = serializers.CharField()
@@ -80,3 +74,23 @@ class RegisterSerializer(serializers.ModelSerializer):
             PatientProfile.objects.create(user=user)
 
         return user
+
+
+class ClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    # thêm user_type + profile id vào token (xem users.authentication.ClaimsJWTAuthentication)
+    @classmethod
+    def get_token(cls, user):
+        from .authentication import token_claims
+        token = super().get_token(user)
+        for claim, value in token_claims(user).items():
+            token[claim] = value
+        return token
+
+
+class ClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    def validate(self, attrs):
+        # access token không còn đọc DB, nên chặn user bị khoá ngay từ lúc đổi token
+        refresh = self.token_class(attrs['refresh'])
+        if not User.objects.filter(pk=refresh.get(api_settings.USER_ID_CLAIM), is_active=True).exists():
+            raise AuthenticationFailed("User is inactive", code="user_inactive")
+        return super().validate(attrs)
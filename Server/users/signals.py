@@ -0,0 +1,22 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .authentication import restore_user_tokens, revoke_user_tokens
+from .models import TokenClaimsUser, User
+
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=TokenClaimsUser)
+def sync_token_revocation(sender, instance, raw=False, **kwargs):
+    # access token không đọc DB nên khoá user phải đánh dấu thu hồi trong cache
+    if raw:
+        return
+    if instance.is_active:
+        restore_user_tokens(instance.pk)
+    else:
+        revoke_user_tokens(instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def revoke_deleted_user_tokens(sender, instance, **kwargs):
+    revoke_user_tokens(instance.pk)
@@ -1,3 +1,368 @@
-from django.test import TestCase
+import asyncio
+import time
+from unittest import mock
+from io import StringIO
+from datetime import datetime, timedelta, timezone as dt_timezone
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import path
+from rest_framework import generics, permissions
+from rest_framework.response import Response
+from rest_framework.test import APITestCase
+from rest_framework.views import APIView
+from rest_framework_simplejwt.tokens import AccessToken
+
+from appointments.models import Appointment
+from config.testing import ProfileCacheTestMixin, benchmark, shared_revocation_cache
+from doctors.models import DoctorProfile
+from notifications.models import Notification
+from notifications.serializers import NotificationSerializer
+from notifications.services import notify_many
+from notifications.views import NotificationListView
+from patients.models import PatientProfile
+from patients.views import PatientDashboardView
+from .checks import check_revocation_cache
+from .counters import get_counters
+from .permissions import IsPatient
+from .models import TokenClaimsUser, User, UserCounter
+from .serializers import ClaimsTokenObtainPairSerializer
+
+SLOT = datetime(2099, 11, 2, 9, 0, tzinfo=dt_timezone.utc)
+
+
+class CounterTestMixin:
+    def setUp(self):
+        cache.clear()
+        self.patient = PatientProfile.objects.create(
+            user=User.objects.create_user(username='pat', user_type='patient'))
+        self.doctor = DoctorProfile.objects.create(
+            user=User.objects.create_user(username='doc', user_type='doctor'), specialty='Nhi')
+
+    def counters(self, user):
+        return UserCounter.objects.values('unread_notifications', 'pending_appointments').get(user=user)
+
+
+class UserCounterTests(CounterTestMixin, TestCase):
+    def test_first_read_computes_from_source(self):
+        Appointment.objects.create(patient=self.patient, doctor=self.doctor, timeslot=SLOT, reason='x')
+        Notification.objects.create(recipient=self.patient.user, message='a')
+        self.assertEqual(get_counters(self.patient.user.id),
+                         {'unread_notifications': 1, 'pending_appointments': 1})
+        self.assertTrue(UserCounter.objects.filter(user=self.patient.user).exists())
+
+    def test_counters_follow_appointment_and_notification_changes(self):
+        get_counters(self.patient.user.id)
+        get_counters(self.doctor.user.id)
+
+        appt = Appointment.objects.create(patient=self.patient, doctor=self.doctor, timeslot=SLOT, reason='x')
+        Appointment.objects.create(patient=self.patient, doctor=self.doctor,
+                                   timeslot=SLOT + timedelta(hours=1), reason='x', status='confirmed')
+        self.assertEqual(self.counters(self.patient.user)['pending_appointments'], 1)
+        self.assertEqual(self.counters(self.doctor.user)['pending_appointments'], 1)
+
+        appt.status = 'confirmed'
+        appt.save()
+        appt.save()
+        self.assertEqual(self.counters(self.patient.user)['pending_appointments'], 0)
+        self.assertEqual(self.counters(self.doctor.user)['pending_appointments'], 0)
+
+        appt = Appointment.objects.get(pk=appt.pk)
+        appt.status = 'pending'
+        appt.save()
+        appt.delete()
+        self.assertEqual(self.counters(self.doctor.user)['pending_appointments'], 0)
+
+        notify_many([(self.patient.user, 'a'), (self.patient.user, 'b')])
+        notification = Notification.objects.create(recipient=self.patient.user, message='c')
+        self.assertEqual(self.counters(self.patient.user)['unread_notifications'], 3)
+        notification.read = True
+        notification.save()
+        self.assertEqual(self.counters(self.patient.user)['unread_notifications'], 2)
+
+    def test_reconcile_command_repairs_drift(self):
+        Notification.objects.create(recipient=self.patient.user, message='a')
+        get_counters(self.patient.user.id)
+        UserCounter.objects.update(unread_notifications=42, pending_appointments=-3)
+        call_command('reconcile_counters', stdout=StringIO())
+        self.assertEqual(self.counters(self.patient.user),
+                         {'unread_notifications': 1, 'pending_appointments': 0})
+
+
+class PatientDashboardTests(CounterTestMixin, APITestCase):
+    def test_dashboard_reads_counters_without_counting(self):
+        self.client.force_authenticate(self.patient.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            Appointment.objects.create(patient=self.patient, doctor=self.doctor, timeslot=SLOT, reason='x')
+            notify_many([(self.patient.user, 'a')])
+
+        response = self.client.get('/api/patients/dashboard/')
+        self.assertEqual(response.data, {'upcoming_appointments': 1, 'unread_notifications': 1})
+        # lần sau đọc thẳng từ cache
+        with self.assertNumQueries(0):
+            self.client.get('/api/patients/dashboard/')
+
+        notification = Notification.objects.get(recipient=self.patient.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/notifications/{notification.id}/read/')
+        response = self.client.get('/api/patients/dashboard/')
+        self.assertEqual(response.data['unread_notifications'], 0)
+
+
+@shared_revocation_cache()
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ClaimsJWTAuthenticationTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='doc', password='s3cret-pass', email='doc@example.com',
+                                             user_type='doctor')
+        self.profile = DoctorProfile.objects.create(user=self.user, specialty='Nhi')
+
+    def login(self):
+        response = self.client.post('/api/users/login/', {'username': 'doc', 'password': 's3cret-pass'})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def use(self, token):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def user_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        return response, [q['sql'] for q in ctx.captured_queries if '"users_user"' in q['sql']]
+
+    def test_access_token_carries_claims(self):
+        token = AccessToken(self.login()['access'])
+        self.assertEqual(token['user_type'], 'doctor')
+        self.assertEqual(token['doctor_profile_id'], self.profile.id)
+        self.assertIsNone(token['patient_profile_id'])
+
+    def test_authenticated_request_does_not_read_user_table(self):
+        self.use(self.login()['access'])
+        response, queries = self.user_queries('/api/notifications/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(queries, [])
+
+    def test_full_user_is_loaded_lazily_in_one_query(self):
+        self.use(ClaimsTokenObtainPairSerializer.get_token(self.user).access_token)
+        response, queries = self.user_queries('/api/users/profile/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['email'], 'doc@example.com')
+        self.assertEqual(len(queries), 1)
+
+    def test_claims_user_behaves_like_user(self):
+        token = ClaimsTokenObtainPairSerializer.get_token(self.user).access_token
+        user = TokenClaimsUser.from_claims(token)
+        self.assertEqual(user, self.user)
+        self.assertEqual(user.doctor_profile_id, self.profile.id)
+        self.assertTrue(DoctorProfile.objects.filter(user=user).exists())
+        user.set_password('another-pass')
+        user.save(update_fields=['password'])
+        self.assertTrue(User.objects.get(pk=self.user.pk).check_password('another-pass'))
+        # field từ claim có thể đã cũ: không được ghi đè DB
+        with self.assertRaises(ValueError):
+            user.save()
+        with self.assertRaises(ValueError):
+            user.save(update_fields=['username', 'password'])
+
+    def test_profile_update_then_change_password_keeps_new_username(self):
+        patient = User.objects.create_user(username='bob', password='s3cret-pass', user_type='patient')
+        PatientProfile.objects.create(user=patient)
+        self.use(ClaimsTokenObtainPairSerializer.get_token(patient).access_token)
+        response = self.client.put('/api/patients/profile/', {'username': 'bob_new'}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        response = self.client.post('/api/users/changepassword/',
+                                    {'old_password': 's3cret-pass', 'new_password': 'An0ther-pass!'})
+        self.assertEqual(response.status_code, 200, response.data)
+        patient.refresh_from_db()
+        self.assertEqual(patient.username, 'bob_new')
+        self.assertTrue(patient.check_password('An0ther-pass!'))
+
+    def test_doctor_profile_update_saves_real_user(self):
+        self.user.first_name = 'Lan'
+        self.user.save()
+        token = ClaimsTokenObtainPairSerializer.get_token(self.user).access_token
+        User.objects.filter(pk=self.user.pk).update(username='doc_renamed')
+        self.use(token)
+        response = self.client.patch('/api/doctors/profile/', {'specialty': 'Tim mạch'}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(User.objects.get(pk=self.user.pk).username, 'doc_renamed')
+
+    def test_deactivation_revokes_outstanding_tokens(self):
+        tokens = self.login()
+        self.use(tokens['access'])
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get('/api/notifications/').status_code, 401)
+        refresh = self.client.post('/api/users/token/refresh/', {'refresh': tokens['refresh']})
+        self.assertEqual(refresh.status_code, 401)
+
+        self.user.is_active = True
+        self.user.save()
+        self.assertEqual(self.client.get('/api/notifications/').status_code, 200)
+
+    def test_local_cache_checks_user_in_db(self):
+        self.use(self.login()['access'])
+        with mock.patch('users.authentication.revocation_is_shared', return_value=False):
+            self.assertEqual(self.client.get('/api/notifications/').status_code, 200)
+            # khoá ở worker khác: dấu thu hồi trong locmem của worker đó không tới được đây
+            User.objects.filter(pk=self.user.pk).update(is_active=False)
+            self.assertEqual(self.client.get('/api/notifications/').status_code, 401)
+
+    def test_tokens_without_claims_fall_back_to_db(self):
+        self.use(AccessToken.for_user(self.user))
+        response, queries = self.user_queries('/api/notifications/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(queries), 1)
+
+    def test_startup_warning_without_shared_cache(self):
+        # class đang giả lập cache dùng chung
+        self.assertEqual(check_revocation_cache(None), [])
+        with mock.patch('users.authentication.revocation_is_shared', return_value=False):
+            self.assertEqual([w.id for w in check_revocation_cache(None)], ['users.W001'])
+
+
+class AsyncProfileCacheMissTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.patient = PatientProfile.objects.create(user=User.objects.create_user(username='pat', user_type='patient'))
+        for i in range(3):
+            doctor = DoctorProfile.objects.create(
+                user=User.objects.create_user(username=f'doc{i}', user_type='doctor', first_name=f'Bs{i}'),
+                specialty='Nhi')
+            Appointment.objects.create(patient=cls.patient, doctor=doctor, timeslot=SLOT + timedelta(hours=i),
+                                       reason='x')
+
+    @override_settings(DOCTOR_PROFILE_CACHE_SIZE=1)
+    async def test_serializer_reads_prefetched_profiles_not_cache(self):
+        # LRU chỉ giữ 1 profile: sau aprepare_objects, 2 profile đã bị đẩy ra khỏi cache
+        token = ClaimsTokenObtainPairSerializer.get_token(self.patient.user).access_token
+        for url in ('/api/patients/appointments/', '/api/appointments/'):
+            response = await self.async_client.get(url, headers={'authorization': f'Bearer {token}'})
+            self.assertEqual(response.status_code, 200, url)
+            self.assertEqual([a['doctor_name'] for a in response.json()['results']], ['Bs0', 'Bs1', 'Bs2'])
+
+
+class AsyncViewTests(ProfileCacheTestMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.patient = PatientProfile.objects.create(
+            user=User.objects.create_user(username='pat', user_type='patient', first_name='An'))
+        cls.doctor = DoctorProfile.objects.create(
+            user=User.objects.create_user(username='doc', user_type='doctor', first_name='Binh'), specialty='Nhi')
+        Appointment.objects.create(patient=cls.patient, doctor=cls.doctor, timeslot=SLOT, reason='x')
+        Notification.objects.create(recipient=cls.patient.user, message='a')
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def headers(self, user):
+        token = ClaimsTokenObtainPairSerializer.get_token(user).access_token
+        return {'authorization': f'Bearer {token}'}
+
+    async def test_read_endpoints_run_on_event_loop(self):
+        # chạy dưới ASGI: handler async mà gọi ORM sync sẽ lỗi SynchronousOnlyOperation
+        headers = self.headers(self.patient.user)
+        for url in ('/api/patients/dashboard/', '/api/users/profile/', '/api/notifications/',
+                    '/api/appointments/', '/api/patients/appointments/'):
+            response = await self.async_client.get(url, headers=headers)
+            self.assertEqual(response.status_code, 200, url)
+
+        response = await self.async_client.get('/api/patients/appointments/', headers=headers)
+        self.assertEqual(response.json()['results'][0]['doctor_name'], 'Binh')
+        response = await self.async_client.get('/api/users/profile/', headers=self.headers(self.doctor.user))
+        self.assertEqual(response.json()['profile']['specialty'], 'Nhi')
+
+    async def test_unauthenticated_and_forbidden(self):
+        self.assertEqual((await self.async_client.get('/api/notifications/')).status_code, 401)
+        response = await self.async_client.get('/api/patients/dashboard/', headers=self.headers(self.doctor.user))
+        self.assertEqual(response.status_code, 403)
+
+    @shared_revocation_cache()
+    def test_me_reads_user_and_profile_in_one_query(self):
+        self.client.defaults['HTTP_AUTHORIZATION'] = self.headers(self.patient.user)['authorization']
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/users/profile/')
+        self.assertEqual(response.data['profile']['fullname'], 'An')
+
+    def test_write_handlers_stay_sync(self):
+        self.client.defaults['HTTP_AUTHORIZATION'] = self.headers(self.doctor.user)['authorization']
+        appointment = Appointment.objects.get()
+        response = self.client.post(f'/api/appointments/{appointment.id}/confirm/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], 'confirmed')
+
+
+class SyncPatientDashboardView(APIView):
+    permission_classes = [permissions.IsAuthenticated, IsPatient]
+
+    def get(self, request):
+        counters = get_counters(request.user.id)
+        return Response({
+            'upcoming_appointments': counters['pending_appointments'],
+            'unread_notifications': counters['unread_notifications'],
+        })
+
+
+class SyncNotificationListView(generics.ListAPIView):
+    serializer_class = NotificationSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    ordering = ('-created_at', '-id')
+
+    def get_queryset(self):
+        return Notification.objects.filter(recipient=self.request.user)
+
+
+# bản sync/async của cùng endpoint để so sánh dưới ASGI
+urlpatterns = [
+    path('sync/dashboard/', SyncPatientDashboardView.as_view()),
+    path('async/dashboard/', PatientDashboardView.as_view()),
+    path('sync/notifications/', SyncNotificationListView.as_view()),
+    path('async/notifications/', NotificationListView.as_view()),
+]
+
+
+@benchmark
+@override_settings(ROOT_URLCONF=__name__)
+class AsyncViewBenchmark(TestCase):
+    REQUESTS = 200
+    CONCURRENCY = 50
+    BUDGET_P99_MS = 1000
+
+    @classmethod
+    def setUpTestData(cls):
+        users = User.objects.bulk_create([User(username=f'p{i}', user_type='patient') for i in range(20)])
+        Notification.objects.bulk_create([
+            Notification(recipient=user, message=f'n{i}') for user in users for i in range(30)
+        ])
+        cls.headers = [
+            {'authorization': f'Bearer {ClaimsTokenObtainPairSerializer.get_token(user).access_token}'}
+            for user in users
+        ]
+
+    async def measure(self, url):
+        semaphore = asyncio.Semaphore(self.CONCURRENCY)
+        latencies = []
+
+        async def one(i):
+            async with semaphore:
+                started = time.perf_counter()
+                response = await self.async_client.get(url, headers=self.headers[i % len(self.headers)])
+                latencies.append(time.perf_counter() - started)
+                return response.status_code
+
+        statuses = await asyncio.gather(*(one(i) for i in range(self.REQUESTS)))
+        self.assertEqual(set(statuses), {200})
+        latencies.sort()
+        return latencies[int(len(latencies) * 0.99) - 1] * 1000
+
+    async def test_sync_vs_async(self):
+        for name in ('dashboard', 'notifications'):
+            for mode in ('sync', 'async'):
+                with self.subTest(mode=mode, endpoint=name):
+                    await self.measure(f'/{mode}/{name}/')  # warm cache
+                    self.assertLess(await self.measure(f'/{mode}/{name}/'), self.BUDGET_P99_MS)
@@ -14,6 +14,7 @@ from .serializers import MeSerializer
 
 from .serializers import RegisterSerializer, UserSerializer
 from .permissions import IsAdmin  # permission riêng cho admin
+from config.async_views import AsyncAPIViewMixin
 
 User = get_user_model()
 
@@ -26,15 +27,17 @@ class RegisterView(generics.CreateAPIView):
 
 
 # Lấy thông tin user hiện tại
-class MeView(APIView):
+class MeView(AsyncAPIViewMixin, APIView):
     permission_classes = [IsAuthenticated]
 
-    def get(self, request):
+    async def get(self, request):
         """
         GET /api/users/me/
         Trả về thông tin chung của user + nested profile nếu là doctor/patient.
         """
-        serializer = MeSerializer(request.user, context={'request': request})
+        # request.user chỉ dựng từ claim; đọc user + profile trong một query bằng async ORM
+        user = await User.objects.select_related('patient_profile', 'doctor_profile').aget(pk=request.user.pk)
+        serializer = MeSerializer(user, context={'request': request})
         return Response(serializer.data)
     
 
@@ -43,6 +46,7 @@ class MeView(APIView):
 class DoctorListView(generics.ListAPIView):
     serializer_class = UserSerializer
     permission_classes = [permissions.IsAuthenticated, IsAdmin]
+    ordering = ('id',)
 
     def get_queryset(self):
         return User.objects.filter(user_type='doctor')
@@ -52,6 +56,7 @@ class DoctorListView(generics.ListAPIView):
 class PatientListView(generics.ListAPIView):
     serializer_class = UserSerializer
     permission_classes = [permissions.IsAuthenticated, IsAdmin]
+    ordering = ('id',)
 
     def get_queryset(self):
         return User.objects.filter(user_type='patient')
@@ -61,7 +66,8 @@ class ChangePasswordView(APIView):
     permission_classes = [IsAuthenticated]
 
     def post(self, request):
-        user = request.user
+        # request.user chỉ dựng từ claim (có thể cũ), đọc user thật trước khi ghi
+        user = User.objects.get(pk=request.user.pk)
         old_password = request.data.get('old_password')
         new_password = request.data.get('new_password')
 
@@ -19,7 +19,7 @@ export async function updateDoctorProfile(payload: {
   
 export async function getDoctorAppointments() {
     const res = await api.get("/doctors/appointments/")
-    return res.data
+    return res.data.results
 }
   
 export async function confirmAppointment(id: number) {
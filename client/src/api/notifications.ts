@@ -2,5 +2,5 @@ import api from "@/lib/api"
 
 export async function getAllNotifications() {
     const res = await api.get("/notifications/")
-    return res.data
+    return res.data.results
   }
\ No newline at end of file
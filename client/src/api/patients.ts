@@ -49,7 +49,7 @@ export async function updatePatientProfile(payload: {
   
 export async function getDoctorsForPatients() {
     const res = await api.get("/patients/doctors/")
-    return res.data
+    return res.data.results
 }
   
 export async function getPatientDashboard() {
@@ -59,12 +59,12 @@ export async function getPatientDashboard() {
   
 export async function getMedicalRecords() {
     const res = await api.get("/patients/medical-records/")
-    return res.data
+    return res.data.results
 }
   
 export async function getAppointments(query: string) {
     const res = await api.get(`/patients/appointments/?${query}`)
-    return res.data
+    return res.data.results
 }
   
 export async function getAppointmentDetail(id: number) {
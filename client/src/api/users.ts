@@ -33,5 +33,5 @@ export async function getUserProfile() {
 
 export async function getAllDoctors() {
     const res = await api.get("/users/admin/doctors/")
-    return res.data
+    return res.data.results
 }
\ No newline at end of file